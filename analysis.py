@@ -0,0 +1,544 @@
+from intbase import InterpreterBase
+from element import INLINE_DEF, INLINE_ARG_DEF, INVARIANT_DEF
+
+# Static analyses over the parsed program, shared by the execution engines.
+
+
+def bodies(ast):
+    """Every FUNC_DEF and LAMBDA_DEF in the program, outer ones first."""
+    result = []
+
+    def visit(node):
+        if isinstance(node, list):
+            for n in node:
+                visit(n)
+            return
+        if not hasattr(node, 'elem_type'):
+            return
+        if node.elem_type == InterpreterBase.FUNC_DEF or node.elem_type == InterpreterBase.LAMBDA_DEF:
+            result.append(node)
+        for value in node.dict.values():
+            visit(value)
+
+    visit(ast.get('functions'))
+    return result
+
+
+def referenced_names(func):
+    """
+    Names that func's body looks up or assigns in the environment: variables,
+    objects whose fields or methods it uses and the names it calls (a
+    variable of that name would be called instead). Nested lambdas are
+    bodies of their own and are not included.
+    """
+    names = set()
+
+    def expr(node):
+        kind = node.elem_type
+        if kind == InterpreterBase.VAR_DEF:
+            names.add(node.get('name').split('.')[0])
+        elif kind == InterpreterBase.FCALL_DEF:
+            names.add(node.get('name'))
+            for a in node.get('args'):
+                expr(a)
+        elif kind == InterpreterBase.MCALL_DEF:
+            names.add(node.get('objref'))
+            for a in node.get('args'):
+                expr(a)
+        elif kind == INLINE_DEF:
+            for a in node.get('args'):
+                expr(a)
+            if node.get('expression') is not None:
+                expr(node.get('expression'))
+        elif kind == INVARIANT_DEF:
+            expr(node.get('expression'))
+        elif kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            expr(node.get('op1'))
+        elif node.get('op2') is not None:
+            expr(node.get('op1'))
+            expr(node.get('op2'))
+
+    def block(statements):
+        for s in statements or []:
+            kind = s.elem_type
+            if kind == '=':
+                names.add(s.get('name').split('.')[0])
+                expr(s.get('expression'))
+            elif kind == InterpreterBase.IF_DEF or kind == InterpreterBase.WHILE_DEF:
+                expr(s.get('condition'))
+                block(s.get('statements'))
+                block(s.get('else_statements'))
+            elif kind == InterpreterBase.RETURN_DEF:
+                if s.get('expression') is not None:
+                    expr(s.get('expression'))
+            else:
+                expr(s)
+
+    block(func.get('statements'))
+    return names
+
+
+def dynamic_names(ast):
+    """
+    Names that may be resolved through a caller's frame: everything any
+    function or lambda references other than its own parameters. main only
+    counts if something can call it, since otherwise it runs on the global
+    scope that no frame ever hides.
+    """
+    all_bodies = bodies(ast)
+    referenced = [referenced_names(func) for func in all_bodies]
+    main_called = any('main' in names for names in referenced)
+    result = set()
+    for func, names in zip(all_bodies, referenced):
+        if func.get('name') == 'main' and not main_called:
+            continue
+        result |= names - {p.get('name') for p in func.get('args')}
+    return result
+
+
+def resolve_slots(func):
+    """
+    Scope resolution for a FUNC_DEF: maps id() of each variable read and
+    assignment in its body that must find one of its own parameters to that
+    parameter's index. Other names can't be resolved statically, since
+    scoping is dynamic. Inside the second and later arguments of a call the
+    callee's frame already holds the parameters bound before them, so reads
+    there are left unresolved as well.
+    """
+    slots = {p.get('name'): i for i, p in enumerate(func.get('args'))}
+    slots.pop('this', None)
+    resolved = {}
+
+    def expr(node, shadowed):
+        kind = node.elem_type
+        if kind == InterpreterBase.VAR_DEF:
+            name = node.get('name')
+            if name in slots and not shadowed:
+                resolved[id(node)] = slots[name]
+        elif kind == InterpreterBase.FCALL_DEF:
+            builtin = node.get('name') in ('print', 'inputi', 'inputs')
+            for i, a in enumerate(node.get('args')):
+                expr(a, shadowed or (i > 0 and not builtin))
+        elif kind == InterpreterBase.MCALL_DEF:
+            for a in node.get('args'):
+                expr(a, shadowed)
+        elif kind == INLINE_DEF:
+            for a in node.get('args'):
+                expr(a, shadowed)
+            if node.get('expression') is not None:
+                expr(node.get('expression'), shadowed)
+        elif kind == INVARIANT_DEF:
+            expr(node.get('expression'), shadowed)
+        elif kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            expr(node.get('op1'), shadowed)
+        elif node.get('op2') is not None:
+            expr(node.get('op1'), shadowed)
+            expr(node.get('op2'), shadowed)
+
+    def block(statements):
+        for s in statements or []:
+            kind = s.elem_type
+            if kind == '=':
+                if s.get('name') in slots:
+                    resolved[id(s)] = slots[s.get('name')]
+                expr(s.get('expression'), False)
+            elif kind == InterpreterBase.IF_DEF or kind == InterpreterBase.WHILE_DEF:
+                expr(s.get('condition'), False)
+                block(s.get('statements'))
+                block(s.get('else_statements'))
+            elif kind == InterpreterBase.RETURN_DEF:
+                if s.get('expression') is not None:
+                    expr(s.get('expression'), False)
+            else:
+                expr(s, False)
+
+    if slots:
+        block(func.get('statements'))
+    return resolved
+
+
+def makes_calls(func):
+    """Whether func's body (nested lambdas aside) calls any function or method."""
+    found = []
+
+    def visit(node):
+        if isinstance(node, list):
+            for n in node:
+                visit(n)
+            return
+        if not hasattr(node, 'elem_type') or node.elem_type == InterpreterBase.LAMBDA_DEF:
+            return
+        if node.elem_type == InterpreterBase.MCALL_DEF:
+            found.append(node)
+        elif node.elem_type == InterpreterBase.FCALL_DEF and node.get('name') not in ('print', 'inputi', 'inputs'):
+            found.append(node)
+        for value in node.dict.values():
+            visit(value)
+
+    visit(func.get('statements'))
+    return len(found) > 0
+
+
+def lambda_captures(ast):
+    """
+    Maps id() of each LAMBDA_DEF to the names its closure has to capture:
+    the free names its body references, those captured by lambdas created in
+    it, and if it calls anything, every name a callee could look up through
+    the lambda's scope.
+    """
+    dynamic = None
+    captures = {}
+
+    def capture(lam):
+        nonlocal dynamic
+        names = referenced_names(lam)
+        for nested in bodies_in(lam):
+            names |= capture(nested)
+        if makes_calls(lam):
+            if dynamic is None:
+                dynamic = dynamic_names(ast)
+            names |= dynamic
+        names -= {p.get('name') for p in lam.get('args')}
+        captures[id(lam)] = frozenset(names)
+        return names
+
+    for func in bodies(ast):
+        if func.elem_type == InterpreterBase.LAMBDA_DEF and id(func) not in captures:
+            capture(func)
+    return captures
+
+
+def bodies_in(func):
+    """The lambdas defined directly in func's body, not inside other lambdas."""
+    result = []
+
+    def visit(node):
+        if isinstance(node, list):
+            for n in node:
+                visit(n)
+            return
+        if not hasattr(node, 'elem_type'):
+            return
+        if node.elem_type == InterpreterBase.LAMBDA_DEF:
+            result.append(node)
+            return
+        for value in node.dict.values():
+            visit(value)
+
+    visit(func.get('statements'))
+    return result
+
+
+def has_ref_params(ast):
+    """Whether any function or lambda in the program takes a ref parameter."""
+    return any(p.elem_type == InterpreterBase.REFARG_DEF for func in bodies(ast) for p in func.get('args'))
+
+
+def infer_types(func, function_names, ref_params=True):
+    """
+    Flow-sensitive type inference for a FUNC_DEF: maps id() of each
+    expression in its body whose Value type is the same on every evaluation
+    to that type. Variables are tracked through assignments, merged where
+    branches meet and iterated to a fixpoint around loops. Any call may
+    reassign any variable the callee can see, which is all of them, so a call
+    forgets every variable's type. Reads inside call arguments may find the
+    callee's bindings instead and are never typed, and neither are names that
+    a function name shadows.
+
+    ref_params says whether the program has ref parameters (see
+    has_ref_params). Through those two names, here or in any caller seen by
+    dynamic scoping, can share one box, so then every assignment forgets the
+    other variables' types, and ref parameters are never typed.
+    """
+    refs = {p.get('name') for p in func.get('args') if p.elem_type == InterpreterBase.REFARG_DEF}
+    types = {}
+    recording = True
+    inline_args = []  # types of the arguments of the inlined call being evaluated
+    # the state maps each variable known to exist to (depth of the innermost
+    # block it is sure to outlive, its type or None); None when unreachable
+
+    def record(node, t):
+        if t is not None and recording:
+            types[id(node)] = t
+        return t
+
+    def forget(state):
+        return {name: (depth, None) for name, (depth, _) in state.items()}
+
+    def join(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        result = {}
+        for name, (depth, t) in a.items():
+            if name in b:
+                other_depth, other_t = b[name]
+                result[name] = (max(depth, other_depth), t if t == other_t else None)
+        return result
+
+    def leave(state, depth):
+        # the variables created in the block being left are gone
+        if state is None:
+            return None
+        return {name: fact for name, fact in state.items() if fact[0] <= depth}
+
+    def expr(node, state, in_args):
+        # returns the state after evaluating node and the type of its value
+        nonlocal inline_args
+        kind = node.elem_type
+        if kind == InterpreterBase.INT_DEF:
+            return state, record(node, 'int')
+        if kind == InterpreterBase.STRING_DEF:
+            return state, record(node, 'string')
+        if kind == InterpreterBase.NIL_DEF:
+            return state, record(node, 'nil')
+        if kind == InterpreterBase.VAR_DEF:
+            name = node.get('name')
+            if in_args or '.' in name or name in function_names or name not in state:
+                return state, None
+            return state, record(node, state[name][1])
+        if kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            name = node.get('name')
+            builtin = kind == InterpreterBase.FCALL_DEF and name in ('print', 'inputi', 'inputs')
+            for a in node.get('args'):
+                state, _ = expr(a, state, in_args or not builtin)
+            if not builtin:
+                return forget(state), None
+            if name == 'inputi':
+                return state, record(node, 'int')
+            if name == 'inputs':
+                return state, record(node, 'string')
+            return state, record(node, 'nil')
+        if kind == INLINE_DEF:
+            arg_types = []
+            for a in node.get('args'):
+                state, t = expr(a, state, in_args)
+                arg_types.append(t)
+            if node.get('expression') is None:
+                return state, record(node, 'nil')
+            inline_args = arg_types
+            state, t = expr(node.get('expression'), state, in_args)
+            return state, record(node, t)
+        if kind == INVARIANT_DEF:
+            # evaluated at most once, but it assigns nothing either way
+            _, t = expr(node.get('expression'), state, in_args)
+            return state, record(node, t)
+        if kind == INLINE_ARG_DEF:
+            if node.get('field') is not None:
+                return state, None
+            return state, record(node, inline_args[node.get('index')])
+        if kind == InterpreterBase.LAMBDA_DEF:
+            return state, record(node, 'lambda')
+        if kind == InterpreterBase.OBJ_DEF:
+            return state, record(node, 'object')
+        if kind == InterpreterBase.NEG_DEF:
+            state, _ = expr(node.get('op1'), state, in_args)
+            return state, record(node, 'int')
+        if kind == InterpreterBase.NOT_DEF:
+            state, _ = expr(node.get('op1'), state, in_args)
+            return state, record(node, 'bool')
+        if node.get('op2') is None:
+            return state, None
+        state, t1 = expr(node.get('op1'), state, in_args)
+        state, t2 = expr(node.get('op2'), state, in_args)
+        if kind == '+':
+            if t1 == 'string' and t2 == 'string':
+                return state, record(node, 'string')
+            if t1 is None and t2 is None or t1 == 'string' or t2 == 'string':
+                return state, None
+            return state, record(node, 'int')
+        if kind in ('-', '*', '/'):
+            return state, record(node, 'int')
+        return state, record(node, 'bool')
+
+    def block(statements, state, depth):
+        for s in statements or []:
+            if state is None:
+                break
+            kind = s.elem_type
+            if kind == '=':
+                name = s.get('name')
+                state, t = expr(s.get('expression'), state, False)
+                if '.' not in name:
+                    state = forget(state) if ref_params else dict(state)
+                    if name in refs:
+                        t = None
+                    # an assigned variable is either one that was visible
+                    # already or a new one in the current block
+                    state[name] = (state[name][0] if name in state else depth, t)
+            elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+                state, _ = expr(s, state, False)
+            elif kind == InterpreterBase.IF_DEF:
+                state, _ = expr(s.get('condition'), state, False)
+                then_state = leave(block(s.get('statements'), state, depth + 1), depth)
+                else_state = leave(block(s.get('else_statements'), state, depth + 1), depth)
+                state = join(then_state, else_state)
+            elif kind == InterpreterBase.WHILE_DEF:
+                state = loop(s, state, depth)
+            elif kind == InterpreterBase.RETURN_DEF:
+                if s.get('expression') is not None:
+                    expr(s.get('expression'), state, False)
+                state = None
+        return state
+
+    def loop(statement, entry, depth):
+        nonlocal recording
+        outer = recording
+        recording = False
+        head = entry
+        while True:
+            after_cond, _ = expr(statement.get('condition'), head, False)
+            back = leave(block(statement.get('statements'), after_cond, depth + 1), depth)
+            new_head = join(entry, back)
+            if new_head == head:
+                break
+            head = new_head
+        recording = outer
+        after_cond, _ = expr(statement.get('condition'), head, False)
+        block(statement.get('statements'), after_cond, depth + 1)
+        return after_cond
+
+    block(func.get('statements'), {p.get('name'): (0, None) for p in func.get('args')}, 0)
+    return types
+
+
+def unscoped_blocks(ast):
+    """
+    The ids of the blocks (the statement lists of IF_DEFs and WHILE_DEFs)
+    that can run without a scope of their own because they never create a
+    variable: every variable they assign is sure to exist by then, as a
+    parameter or a variable assigned earlier in an enclosing block of the
+    same body. A callee binds its variables in scopes of its own, so calls
+    don't count, and neither do nested blocks, which create theirs in their
+    own scope unless they create nothing either.
+    """
+    result = set()
+
+    def block(statements, known):
+        # whether statements create a variable; known holds the names sure to exist
+        creates = False
+        for s in statements:
+            kind = s.elem_type
+            if kind == '=' and '.' not in s.get('name'):
+                if s.get('name') not in known:
+                    creates = True
+                    known.add(s.get('name'))
+            elif kind == InterpreterBase.IF_DEF or kind == InterpreterBase.WHILE_DEF:
+                for nested in (s.get('statements'), s.get('else_statements')):
+                    if nested is not None and not block(nested, set(known)):
+                        result.add(id(nested))
+        return creates
+
+    for func in bodies(ast):
+        block(func.get('statements'), {p.get('name') for p in func.get('args')})
+    return frozenset(result)
+
+
+def bound_names(ast):
+    """Every name the program assigns as a variable or binds as a parameter."""
+    names = set()
+
+    def visit(node):
+        if isinstance(node, list):
+            for n in node:
+                visit(n)
+            return
+        if not hasattr(node, 'elem_type'):
+            return
+        if node.elem_type == '=' and '.' not in node.get('name'):
+            names.add(node.get('name'))
+        elif node.elem_type == InterpreterBase.FUNC_DEF or node.elem_type == InterpreterBase.LAMBDA_DEF:
+            names.update(p.get('name') for p in node.get('args'))
+        for value in node.dict.values():
+            visit(value)
+
+    visit(ast.get('functions'))
+    return names
+
+
+def pure_functions(ast):
+    """
+    The ids of the FUNC_DEFs whose result only depends on their arguments and
+    that have no effect the caller could see. Such a function reads and
+    assigns nothing but its own by-value parameters, so no other frame's
+    variables matter, does no I/O, touches no objects or lambdas, and calls
+    only functions that are pure themselves. A callee must be named so that
+    no variable can stand in for it: a name the program never binds.
+    """
+    functions = {}
+    for func in ast.get('functions'):
+        functions[(func.get('name'), len(func.get('args')))] = func
+    function_names = {name for name, _ in functions}
+    bound = bound_names(ast)
+
+    def local_callees(func):
+        # the functions func calls, or None if its body is impure by itself
+        params = {p.get('name') for p in func.get('args')}
+        if any(p.elem_type == InterpreterBase.REFARG_DEF for p in func.get('args')) or params & function_names:
+            return None
+        callees = []
+
+        def expr(node):
+            kind = node.elem_type
+            if kind in (InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF,
+                        InterpreterBase.NIL_DEF):
+                return True
+            if kind == InterpreterBase.VAR_DEF:
+                return node.get('name') in params
+            if kind == InterpreterBase.FCALL_DEF:
+                name = node.get('name')
+                callee = functions.get((name, len(node.get('args'))))
+                if callee is None or name in bound:
+                    return False
+                callees.append(callee)
+                return all(expr(a) for a in node.get('args'))
+            if kind == INLINE_DEF:
+                expression = node.get('expression')
+                return all(expr(a) for a in node.get('args')) and (expression is None or expr(expression))
+            if kind == INVARIANT_DEF:
+                return expr(node.get('expression'))
+            if kind == INLINE_ARG_DEF:
+                # a field of an argument, which then is an object
+                return node.get('field') is None
+            if kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+                return expr(node.get('op1'))
+            if node.get('op2') is not None:
+                return expr(node.get('op1')) and expr(node.get('op2'))
+            # method calls, lambdas and objects
+            return False
+
+        def block(statements):
+            for s in statements or []:
+                kind = s.elem_type
+                if kind == '=':
+                    if s.get('name') not in params or not expr(s.get('expression')):
+                        return False
+                elif kind == InterpreterBase.IF_DEF or kind == InterpreterBase.WHILE_DEF:
+                    if not expr(s.get('condition')) or not block(s.get('statements')) \
+                            or not block(s.get('else_statements')):
+                        return False
+                elif kind == InterpreterBase.RETURN_DEF:
+                    if s.get('expression') is not None and not expr(s.get('expression')):
+                        return False
+                elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+                    if not expr(s):
+                        return False
+            return True
+
+        return callees if block(func.get('statements')) else None
+
+    candidates = {}
+    for func in functions.values():
+        callees = local_callees(func)
+        if callees is not None:
+            candidates[id(func)] = callees
+    # drop functions calling impure ones until none is left to drop
+    changed = True
+    while changed:
+        changed = False
+        for key, callees in list(candidates.items()):
+            if any(id(callee) not in candidates for callee in callees):
+                del candidates[key]
+                changed = True
+    return frozenset(candidates)
@@ -0,0 +1,158 @@
+"""
+Rough timing of the execution engines on a few loop- and call-heavy Brewin
+programs. Usage: python bench.py [--memoize] [engine ...]
+
+python bench.py --startup times how long a new process takes to import the
+parser and get through its first parse, with each way of building it.
+"""
+import os
+import subprocess
+import sys
+import time
+
+from interpreterv4 import Interpreter
+
+# the tree walker takes several Python frames per Brewin call
+sys.setrecursionlimit(100000)
+
+PROGRAMS = {
+    'loop': """
+func main() {
+  i = 0;
+  total = 0;
+  while (i < 3000) {
+    if (i / 2 * 2 == i) { total = total + i; } else { total = total - 1; }
+    i = i + 1;
+  }
+  print(total);
+}
+""",
+    'calls': """
+func fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main() { print(fib(18)); }
+""",
+    'objects': """
+func main() {
+  base = @;
+  base.step = 3;
+  base.add = lambda(x) { return x + this.step; };
+  o = @;
+  o.proto = base;
+  i = 0;
+  v = 0;
+  while (i < 2000) { v = o.add(v); i = i + 1; }
+  print(v);
+}
+""",
+    'protos': """
+func main() {
+  o = @;
+  o.step = 1;
+  o.f = lambda(x) { return x + 1; };
+  depth = 0;
+  while (depth < 16) { p = @; p.proto = o; o = p; depth = depth + 1; }
+  i = 0;
+  v = 0;
+  while (i < 2000) { v = o.f(v) + o.step + o.step + o.step; i = i + 1; }
+  print(v);
+}
+""",
+    'accessors': """
+func x_of(p) { return p.x; }
+func scaled(v, k) { return v * k + 1; }
+func main() {
+  p = @;
+  p.x = 3;
+  i = 0;
+  total = 0;
+  while (i < 2000) { total = total + scaled(x_of(p), i); i = i + 1; }
+  print(total);
+}
+""",
+    'invariants': """
+func main() {
+  n = 40;
+  box = @;
+  box.limit = 50;
+  i = 0;
+  total = 0;
+  while (i < 2000) { total = total + (n * n - box.limit) * (box.limit + n); i = i + 1; }
+  print(total);
+}
+""",
+    'lambdas': """
+func main() {
+  a = 1; b = 2; c = 3; d = 4; e = 5; f = 6; g = 7; h = 8;
+  i = 0;
+  total = 0;
+  while (i < 2000) {
+    add = lambda(x) { return x + a; };
+    total = add(total);
+    i = i + 1;
+  }
+  print(total);
+}
+""",
+}
+
+# code run in a new process: importing brewparse, which builds nothing until
+# the first parse; importing it and parsing SOURCE, which loads the prebuilt
+# tables; building the lexer and parser checked against the rules, as
+# importing brewparse used to; and building them from the grammar alone, as
+# when the tables are missing or out of date
+STARTUP = {
+    'import': "import brewparse",
+    'tables': "import brewparse\n"
+              "brewparse.parse_program(SOURCE)",
+    'checked': "import brewlex, brewparse\n"
+               "from ply import lex, yacc\n"
+               "lexer = lex.lex(module=brewlex)\n"
+               "yacc.yacc(module=brewparse, debug=False, write_tables=False).parse(SOURCE, lexer=lexer)",
+    'grammar': "import brewlex, brewparse\n"
+               "from ply import lex, yacc\n"
+               "lexer = lex.lex(module=brewlex)\n"
+               "yacc.yacc(module=brewparse, tabmodule='no_parsetab', debug=False,\n"
+               "          write_tables=False).parse(SOURCE, lexer=lexer)",
+}
+STARTUP_SOURCE = "func main() { print(1); }"
+
+
+def bench(engine, source, repeat=3, memoize=False):
+    best = None
+    for _ in range(repeat):
+        interpreter = Interpreter(console_output=False, engine=engine, memoize=memoize)
+        start = time.perf_counter()
+        interpreter.run(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_startup(setup, repeat=5):
+    code = f"import time\nSOURCE = {STARTUP_SOURCE!r}\nstart = time.perf_counter()\n{setup}\n" \
+           "print(time.perf_counter() - start)"
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = float(result.stdout.split()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    args = sys.argv[1:]
+    if '--startup' in args:
+        for name, setup in STARTUP.items():
+            print(f"{name:<10}{bench_startup(setup) * 1000:>10.1f}ms")
+        return
+    memoize = '--memoize' in args
+    engines = [a for a in args if a != '--memoize'] or Interpreter.ENGINES
+    print(f"{'program':<10}" + ''.join(f"{e:>12}" for e in engines))
+    for name, source in PROGRAMS.items():
+        times = [bench(e, source, memoize=memoize) for e in engines]
+        print(f"{name:<10}" + ''.join(f"{t * 1000:>10.1f}ms" for t in times))
+
+
+if __name__ == '__main__':
+    main()
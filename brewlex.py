@@ -1,4 +1,4 @@
-from ply import lex
+import sys
 
 reserved = (
     "FUNC",
@@ -126,5 +126,22 @@ def t_error(t):
     t.lexer.skip(1)
 
 
-# Build the lexer
-lex.lex()
+_lexer = []
+
+
+def lexer():
+    """
+    The lexer, built on first use from the prebuilt table in lextab.py (see
+    brewparse.build_tables) without checking the rules above again; without
+    a usable table it is built from the rules.
+    """
+    if not _lexer:
+        # ply is only imported here, as it takes as long to import as the rest
+        from ply import lex
+        lexobj = lex.Lexer()
+        try:
+            lexobj.readtab('lextab', globals())
+        except (ImportError, KeyError):
+            lexobj = lex.lex(module=sys.modules[__name__])
+        _lexer.append(lexobj)
+    return _lexer[0]
@@ -1,7 +1,15 @@
+import hashlib
+import os
+import sys
+
 from element import Element
+from flatast import FlatAST
 from brewlex import *
 from intbase import InterpreterBase
-from ply import yacc
+
+# what the rules build nodes with: Element, or FlatAST.add while
+# parse_program_flat runs, which makes node ids stand in for the nodes
+build = Element
 
 # Parsing rules
 
@@ -25,7 +33,7 @@ def collapse_items(p, group_index, singleton_index):
 
 def p_program(p):
     "program : funcs"
-    p[0] = Element(InterpreterBase.PROGRAM_DEF, functions=p[1])
+    p[0] = build(InterpreterBase.PROGRAM_DEF, functions=p[1])
 
 
 def p_funcs(p):
@@ -38,18 +46,18 @@ def p_func(p):
     """func : FUNC NAME LPAREN formal_args RPAREN LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 9:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=p[4], statements=p[7])
+        p[0] = build(InterpreterBase.FUNC_DEF, name=p[2], args=p[4], statements=p[7])
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=[], statements=p[6])
+        p[0] = build(InterpreterBase.FUNC_DEF, name=p[2], args=[], statements=p[6])
 
 
 def p_lambda(p):
     """lambda : LAMBDA LPAREN formal_args RPAREN LBRACE statements RBRACE
     | LAMBDA LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 8:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.LAMBDA_DEF, args=p[3], statements=p[6])
+        p[0] = build(InterpreterBase.LAMBDA_DEF, args=p[3], statements=p[6])
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.LAMBDA_DEF, args=[], statements=p[5])
+        p[0] = build(InterpreterBase.LAMBDA_DEF, args=[], statements=p[5])
 
 
 def p_formal_args(p):
@@ -60,12 +68,12 @@ def p_formal_args(p):
 
 def p_formal_arg(p):
     "formal_arg : NAME"
-    p[0] = Element(InterpreterBase.ARG_DEF, name=p[1])
+    p[0] = build(InterpreterBase.ARG_DEF, name=p[1])
 
 
 def p_formal_ref_arg(p):
     "formal_arg : REF NAME"
-    p[0] = Element(InterpreterBase.REFARG_DEF, name=p[2])
+    p[0] = build(InterpreterBase.REFARG_DEF, name=p[2])
 
 
 def p_statements(p):
@@ -76,7 +84,7 @@ def p_statements(p):
 
 def p_statement___assign(p):
     "statement : variable ASSIGN expression SEMI"
-    p[0] = Element("=", name=p[1], expression=p[3])
+    p[0] = build("=", name=p[1], expression=p[3])
 
 
 def p_variable(p):
@@ -93,14 +101,14 @@ def p_statement_if(p):
     | IF LPAREN expression RPAREN LBRACE statements RBRACE ELSE LBRACE statements RBRACE
     """
     if len(p) == 8:
-        p[0] = Element(
+        p[0] = build(
             InterpreterBase.IF_DEF,
             condition=p[3],
             statements=p[6],
             else_statements=None,
         )
     else:
-        p[0] = Element(
+        p[0] = build(
             InterpreterBase.IF_DEF,
             condition=p[3],
             statements=p[6],
@@ -110,7 +118,7 @@ def p_statement_if(p):
 
 def p_statement_while(p):
     "statement : WHILE LPAREN expression RPAREN LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6])
+    p[0] = build(InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6])
 
 
 def p_statement_expr(p):
@@ -125,17 +133,17 @@ def p_statement_return(p):
         expr = p[2]
     else:
         expr = None
-    p[0] = Element(InterpreterBase.RETURN_DEF, expression=expr)
+    p[0] = build(InterpreterBase.RETURN_DEF, expression=expr)
 
 
 def p_expression_not(p):
     "expression : NOT expression"
-    p[0] = Element(InterpreterBase.NOT_DEF, op1=p[2])
+    p[0] = build(InterpreterBase.NOT_DEF, op1=p[2])
 
 
 def p_expression_uminus(p):
     "expression : MINUS expression %prec UMINUS"
-    p[0] = Element(InterpreterBase.NEG_DEF, op1=p[2])
+    p[0] = build(InterpreterBase.NEG_DEF, op1=p[2])
 
 
 def p_arith_expression_binop(p):
@@ -149,7 +157,7 @@ def p_arith_expression_binop(p):
     | expression MINUS expression
     | expression MULTIPLY expression
     | expression DIVIDE expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = build(p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_group(p):
@@ -160,12 +168,12 @@ def p_expression_group(p):
 def p_expression_and_or(p):
     """expression : expression OR expression
     | expression AND expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = build(p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_number(p):
     "expression : NUMBER"
-    p[0] = Element(InterpreterBase.INT_DEF, val=p[1])
+    p[0] = build(InterpreterBase.INT_DEF, val=p[1])
 
 
 def p_expression_lambda(p):
@@ -177,47 +185,47 @@ def p_expression_bool(p):
     """expression : TRUE
     | FALSE"""
     bool_val = p[1] == InterpreterBase.TRUE_DEF
-    p[0] = Element(InterpreterBase.BOOL_DEF, val=bool_val)
+    p[0] = build(InterpreterBase.BOOL_DEF, val=bool_val)
 
 
 def p_expression_nil(p):
     "expression : NIL"
-    p[0] = Element(InterpreterBase.NIL_DEF)
+    p[0] = build(InterpreterBase.NIL_DEF)
 
 
 def p_expression_obj(
     p,
 ):  # e.g. a = @;   ### creates a new dictionary/object and stores in a
     "expression : AT"
-    p[0] = Element(InterpreterBase.OBJ_DEF)
+    p[0] = build(InterpreterBase.OBJ_DEF)
 
 
 def p_expression_string(p):
     "expression : STRING"
-    p[0] = Element(InterpreterBase.STRING_DEF, val=p[1])
+    p[0] = build(InterpreterBase.STRING_DEF, val=p[1])
 
 
 def p_expression_variable(p):
     "expression : variable"
-    p[0] = Element(InterpreterBase.VAR_DEF, name=p[1])
+    p[0] = build(InterpreterBase.VAR_DEF, name=p[1])
 
 
 def p_func_call(p):
     """expression : NAME LPAREN args RPAREN
     | NAME LPAREN RPAREN"""
     if len(p) == 5:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=p[3])
+        p[0] = build(InterpreterBase.FCALL_DEF, name=p[1], args=p[3])
     else:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=[])
+        p[0] = build(InterpreterBase.FCALL_DEF, name=p[1], args=[])
 
 
 def p_method_call(p):
     """expression : NAME DOT NAME LPAREN args RPAREN
     | NAME DOT NAME LPAREN RPAREN"""
     if len(p) == 7:
-        p[0] = Element(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=p[5])
+        p[0] = build(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=p[5])
     else:
-        p[0] = Element(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=[])
+        p[0] = build(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=[])
 
 
 def p_expression_args(p):
@@ -235,11 +243,82 @@ def p_error(p):
 
 # exported function
 def parse_program(program):
-    ast = yacc.parse(program)
+    ast = parser().parse(program, lexer=lexer())
     if ast is None:
         raise SyntaxError("Syntax error")
     return ast
 
 
-# generate our parser
-yacc.yacc()
+def parse_program_flat(program):
+    """Parses program into a FlatAST (see flatast.py) without building Elements."""
+    global build
+    flat = FlatAST()
+    build = flat.add
+    try:
+        root = parser().parse(program, lexer=lexer())
+    finally:
+        build = Element
+    if root is None:
+        raise SyntaxError("Syntax error")
+    flat.root = root
+    return flat
+
+
+_signature = []
+
+
+def grammar_signature():
+    """
+    A hash of the lexer, the grammar, their tables and the flat AST layout,
+    which together decide what a source text parses to; None if they can't
+    be read.
+    """
+    if not _signature:
+        h = hashlib.sha256()
+        try:
+            for module in ('brewlex.py', 'brewparse.py', 'flatast.py', 'lextab.py', 'parsetab.py'):
+                with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as file:
+                    h.update(file.read())
+            _signature.append(h.hexdigest())
+        except OSError:
+            _signature.append(None)
+    return _signature[0]
+
+
+_parser = []
+
+
+def parser():
+    """
+    The parser, built on first use from the prebuilt tables in parsetab.py
+    without checking the grammar again or writing any file; without usable
+    tables it is built from the grammar, in memory.
+    """
+    if not _parser:
+        from ply import yacc  # see lexer()
+        try:
+            tables = yacc.LRTable()
+            tables.read_table('parsetab')
+            tables.bind_callables(globals())
+            built = yacc.LRParser(tables, p_error)
+        except (ImportError, KeyError, yacc.YaccError):
+            built = yacc.yacc(module=sys.modules[__name__], debug=False, write_tables=False)
+        _parser.append(built)
+    return _parser[0]
+
+
+def build_tables():
+    """
+    Writes lextab.py and parsetab.py, the tables lexer() and parser() load,
+    from the token rules and the grammar. Run this module after changing
+    either.
+    """
+    import brewlex
+    from ply import lex, yacc
+    directory = os.path.dirname(os.path.abspath(__file__))
+    lex.lex(module=brewlex).writetab('lextab', directory)
+    yacc.yacc(module=sys.modules[__name__], debug=False, outputdir=directory)
+
+
+if __name__ == '__main__':
+    build_tables()
@@ -0,0 +1,370 @@
+from intbase import InterpreterBase, ErrorType
+from element import INLINE_DEF, INLINE_ARG_DEF, INVARIANT_DEF
+from runtime import Value, InlineCache
+
+# Every instruction is two integers, an opcode and an argument (0 if unused),
+# stored back to back in CodeObject.code.
+LOAD_CONST = 0          # push consts[arg]
+LOAD_VAR = 1            # push the variable names[arg]
+LOAD_FIELD = 2          # push the field consts[arg] = (object name, InlineCache for the field name)
+LOAD_FUNC = 3           # push a func value for consts[arg] = overloads of a function
+STORE_VAR = 4           # pop a value and assign it to names[arg]
+FIELD_TARGET = 5        # push the object named names[arg] that a field is assigned on
+STORE_FIELD = 6         # pop a value and an object, assign field names[arg]
+MAKE_LAMBDA = 7         # push a lambda for consts[arg] = (LAMBDA_DEF element, names it captures)
+MAKE_OBJECT = 8         # push a new object
+NEG = 9
+NOT = 10
+ADD = 11
+SUB = 12
+MUL = 13
+DIV = 14
+EQ = 15
+NE = 16
+LT = 17
+LE = 18
+GT = 19
+GE = 20
+AND = 21
+OR = 22
+CALL_BEGIN = 23         # resolve the call site consts[arg] and start binding arguments
+MCALL_BEGIN = 24        # same for the method call site consts[arg]
+BIND_ARG = 25           # pop a value into parameter arg >> 2; arg & 1 is set for variables, arg & 2 for fresh values
+CALL_END = 26           # run the callee whose arguments are bound, push its result
+PRINT = 27              # pop arg texts (see PRINT_ARG) and print them
+INPUT = 28              # call consts[arg] = (name, has prompt) of inputi/inputs
+RAISE = 29              # report the error consts[arg] = (error type, description)
+POP_TOP = 30
+JUMP = 31               # continue at arg
+IF_FALSE_JUMP = 32      # pop an 'if' condition, continue at arg if it is false
+WHILE_FALSE_JUMP = 33   # pop a 'while' condition, continue at arg if it is false
+PUSH_SCOPE = 34
+POP_SCOPE = 35
+RETURN_VALUE = 36       # pop arg >> 1 scopes and return a copy of the top of the stack, which is fresh if arg & 1
+RETURN_NIL = 37         # pop arg scopes and return nil
+RETURN_TOP = 38         # return the top of the stack as is
+AND_JUMP = 39           # pop the left operand of '&&'; if it is false, push false and continue at arg
+OR_JUMP = 40            # pop the left operand of '||'; if it is true, push true and continue at arg
+TO_BOOL = 41            # replace the right operand of the operator opcode arg (AND or OR) by its bool value
+# Quickened forms of ADD..GE, which the VM rewrites a generic instruction into
+# once it has seen two int operands there. Their argument is unused; the
+# generic instruction's argument is set once it must stay generic.
+ADD_INT = 42
+SUB_INT = 43
+MUL_INT = 44
+DIV_INT = 45
+EQ_INT = 46
+NE_INT = 47
+LT_INT = 48
+LE_INT = 49
+GT_INT = 50
+GE_INT = 51
+# Calls the optimizer inlined (see optimizer.Inliner)
+INLINE_ARGS = 52        # pop arg values as the arguments of the inlined call
+LOAD_INLINE_ARG = 53    # push inlined argument arg
+LOAD_INLINE_FIELD = 54  # push a field of an inlined argument, consts[arg] = (index, InlineCache for the field name)
+COPY_VALUE = 55         # replace the top of the stack by its copy, which is fresh if arg is set
+# Loop invariants (see optimizer.LoopInvariantCodeMotion), consts[arg] = [value or None, end of its code]
+LOAD_INVARIANT = 56     # if the invariant has a value, push it and continue at its end
+STORE_INVARIANT = 57    # keep the top of the stack as the invariant's value
+RESET_INVARIANT = 58    # forget the invariant's value
+PRINT_ARG = 59          # replace the top of the stack by the text print shows for it, before later arguments can change it
+
+OPNAMES = {op: name for name, op in globals().items() if name.isupper() and isinstance(op, int)}
+
+BINARY_OPS = {
+    '+': ADD, '-': SUB, '*': MUL, '/': DIV,
+    '==': EQ, '!=': NE, '<': LT, '<=': LE, '>': GT, '>=': GE,
+    '&&': AND, '||': OR,
+}
+OPSYMBOLS = {op: symbol for symbol, op in BINARY_OPS.items()}
+INT_OPS = {
+    ADD: ADD_INT, SUB: SUB_INT, MUL: MUL_INT, DIV: DIV_INT,
+    EQ: EQ_INT, NE: NE_INT, LT: LT_INT, LE: LE_INT, GT: GT_INT, GE: GE_INT,
+}
+GENERIC_OPS = {quick: op for op, quick in INT_OPS.items()}
+
+
+class CodeObject:
+    def __init__(self, name, params, code, consts, names):
+        self.name = name
+        self.params = params  # list of (name, is_ref) pairs
+        self.code = code
+        self.consts = consts
+        self.names = names
+
+    def __str__(self):
+        return dis(self)
+
+
+class CallSite:
+    def __init__(self, name, num_args, overloads, with_obj=False):
+        self.name = name
+        self.num_args = num_args
+        self.overloads = overloads  # the function table entry for name, if any
+        self.with_obj = with_obj    # the object bound to 'this' is on the stack
+
+
+class MethodCallSite:
+    def __init__(self, obj_name, name, num_args):
+        self.obj_name = obj_name
+        self.name = name
+        self.num_args = num_args
+        self.call_end = None  # where to continue when the method is a plain function
+        self.cache = InlineCache(name)
+
+
+def dis(code):
+    lines = [f"{code.name}({', '.join(name for name, _ in code.params)}):"]
+    for pc in range(0, len(code.code), 2):
+        op, arg = code.code[pc], code.code[pc + 1]
+        name = OPNAMES[op]
+        detail = ''
+        if op in (LOAD_VAR, STORE_VAR, FIELD_TARGET, STORE_FIELD):
+            detail = f" ({code.names[arg]})"
+        elif op in (LOAD_CONST, LOAD_FIELD, LOAD_INLINE_FIELD, INPUT, RAISE, LOAD_INVARIANT):
+            detail = f" ({code.consts[arg]})"
+        elif op in (CALL_BEGIN, MCALL_BEGIN):
+            detail = f" ({code.consts[arg].name})"
+        lines.append(f"{pc:>6} {name:<18}{arg}{detail}")
+    return '\n'.join(lines)
+
+
+class BytecodeCompiler:
+    """
+    Compiles FUNC_DEF and LAMBDA_DEF elements into CodeObjects for the VM.
+    Expressions leave their Value on the operand stack; statements leave the
+    stack as they found it.
+    """
+
+    def __init__(self, functions, captures, short_circuit=True, unscoped=frozenset()):
+        self.functions = functions
+        self.captures = captures  # see analysis.lambda_captures
+        self.short_circuit = short_circuit
+        self.unscoped = unscoped  # see analysis.unscoped_blocks
+
+    def compile_function(self, func):
+        self.code = []
+        self.consts = []
+        self.names = []
+        self.name_index = {}
+        self.depth = 0  # scopes pushed since the start of the body
+        self.invariants = {}  # name of an invariant -> its index in consts
+        for s in func.get('statements'):
+            self.compile_statement(s)
+        self.emit(RETURN_NIL, 0)
+        params = [(p.get('name'), p.elem_type == InterpreterBase.REFARG_DEF) for p in func.get('args')]
+        name = func.get('name') or InterpreterBase.LAMBDA_DEF
+        return CodeObject(name, params, self.code, self.consts, self.names)
+
+    def compile_call_node(self, func):
+        # code for calling a function stored in an object field: the tree
+        # walker uses the FUNC_DEF itself as the call node, with the object on
+        # the stack to become 'this'
+        self.code = []
+        self.consts = []
+        self.names = []
+        self.name_index = {}
+        self.depth = 0
+        self.invariants = {}
+        self.compile_fcall(func, with_obj=True)
+        self.emit(RETURN_TOP, 0)
+        return CodeObject(func.get('name'), [], self.code, self.consts, self.names)
+
+    def emit(self, op, arg=0):
+        self.code.append(op)
+        self.code.append(arg)
+        return len(self.code) - 1  # position of the argument, for patching jumps
+
+    def const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def invariant(self, name):
+        if name not in self.invariants:
+            self.invariants[name] = self.const([None, None])
+        return self.invariants[name]
+
+    def name(self, name):
+        if name not in self.name_index:
+            self.name_index[name] = len(self.names)
+            self.names.append(name)
+        return self.name_index[name]
+
+    ############################# STATEMENTS
+
+    def compile_statement(self, statement):
+        kind = statement.elem_type
+        if kind == '=':
+            symbol = statement.get('name')
+            if '.' in symbol:
+                obj_name, field_name = symbol.split('.')
+                self.emit(FIELD_TARGET, self.name(obj_name))
+                self.compile_expr(statement.get('expression'))
+                self.emit(STORE_FIELD, self.name(field_name))
+            else:
+                self.compile_expr(statement.get('expression'))
+                self.emit(STORE_VAR, self.name(symbol))
+        elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            self.compile_expr(statement)
+            self.emit(POP_TOP)
+        elif kind == InterpreterBase.IF_DEF:
+            self.compile_if(statement)
+        elif kind == InterpreterBase.WHILE_DEF:
+            self.compile_while(statement)
+        elif kind == InterpreterBase.RETURN_DEF:
+            expr = statement.get('expression')
+            if expr is None:
+                self.emit(RETURN_NIL, self.depth)
+            else:
+                self.compile_expr(expr)
+                self.emit(RETURN_VALUE, self.depth << 1 | self.fresh(expr))
+        # any other expression statement is never evaluated
+
+    def compile_block(self, statements):
+        if id(statements) in self.unscoped:
+            # the block creates no variables, so it needs no scope
+            for s in statements:
+                self.compile_statement(s)
+            return
+        self.emit(PUSH_SCOPE)
+        self.depth += 1
+        for s in statements:
+            self.compile_statement(s)
+        self.depth -= 1
+        self.emit(POP_SCOPE)
+
+    def compile_if(self, statement):
+        self.compile_expr(statement.get('condition'))
+        to_else = self.emit(IF_FALSE_JUMP)
+        self.compile_block(statement.get('statements'))
+        else_statements = statement.get('else_statements')
+        if else_statements:
+            to_end = self.emit(JUMP)
+            self.code[to_else] = len(self.code)
+            self.compile_block(else_statements)
+            self.code[to_end] = len(self.code)
+        else:
+            self.code[to_else] = len(self.code)
+
+    def compile_while(self, statement):
+        for name in statement.get('invariants') or ():
+            self.emit(RESET_INVARIANT, self.invariant(name))
+        start = len(self.code)
+        self.compile_expr(statement.get('condition'))
+        to_end = self.emit(WHILE_FALSE_JUMP)
+        self.compile_block(statement.get('statements'))
+        self.emit(JUMP, start)
+        self.code[to_end] = len(self.code)
+
+    ############################# EXPRESSIONS
+
+    def compile_expr(self, expr):
+        kind = expr.elem_type
+
+        if kind == InterpreterBase.NIL_DEF:
+            self.emit(LOAD_CONST, self.const(Value('nil', None)))
+        elif kind == InterpreterBase.BOOL_DEF:
+            self.emit(LOAD_CONST, self.const(Value('nil', expr.get('val'))))
+        elif kind == InterpreterBase.INT_DEF:
+            self.emit(LOAD_CONST, self.const(Value('int', expr.get('val'))))
+        elif kind == InterpreterBase.STRING_DEF:
+            self.emit(LOAD_CONST, self.const(Value('string', expr.get('val'))))
+        elif kind == InterpreterBase.VAR_DEF:
+            name = expr.get('name')
+            if '.' in name:
+                obj_name, field_name = name.split('.')
+                self.emit(LOAD_FIELD, self.const((obj_name, InlineCache(field_name))))
+            elif name in self.functions:
+                # function names shadow variables
+                self.emit(LOAD_FUNC, self.const(self.functions[name]))
+            else:
+                self.emit(LOAD_VAR, self.name(name))
+        elif kind == InterpreterBase.FCALL_DEF:
+            self.compile_fcall(expr)
+        elif kind == InterpreterBase.MCALL_DEF:
+            self.compile_mcall(expr)
+        elif kind == INLINE_DEF:
+            # a call the optimizer replaced by the callee's return expression
+            for a in expr.get('args'):
+                self.compile_expr(a)
+            self.emit(INLINE_ARGS, len(expr.get('args')))
+            body = expr.get('expression')
+            if body is None:
+                self.emit(LOAD_CONST, self.const(Value('nil', None)))
+            else:
+                self.compile_expr(body)
+                self.emit(COPY_VALUE, int(self.fresh(body)))
+        elif kind == INLINE_ARG_DEF:
+            if expr.get('field') is None:
+                self.emit(LOAD_INLINE_ARG, expr.get('index'))
+            else:
+                self.emit(LOAD_INLINE_FIELD, self.const((expr.get('index'), InlineCache(expr.get('field')))))
+        elif kind == INVARIANT_DEF:
+            index = self.invariant(expr.get('name'))
+            self.emit(LOAD_INVARIANT, index)
+            self.compile_expr(expr.get('expression'))
+            self.emit(STORE_INVARIANT, index)
+            self.consts[index][1] = len(self.code)
+        elif kind == InterpreterBase.LAMBDA_DEF:
+            self.emit(MAKE_LAMBDA, self.const((expr, self.captures[id(expr)])))
+        elif kind == InterpreterBase.OBJ_DEF:
+            self.emit(MAKE_OBJECT)
+        elif kind == InterpreterBase.NEG_DEF:
+            self.compile_expr(expr.get('op1'))
+            self.emit(NEG)
+        elif kind == InterpreterBase.NOT_DEF:
+            self.compile_expr(expr.get('op1'))
+            self.emit(NOT)
+        elif (kind == '&&' or kind == '||') and self.short_circuit:
+            self.compile_expr(expr.get('op1'))
+            to_end = self.emit(AND_JUMP if kind == '&&' else OR_JUMP)
+            self.compile_expr(expr.get('op2'))
+            self.emit(TO_BOOL, BINARY_OPS[kind])
+            self.code[to_end] = len(self.code)
+        else:
+            self.compile_expr(expr.get('op1'))
+            self.compile_expr(expr.get('op2'))
+            self.emit(BINARY_OPS[kind])
+
+    def compile_fcall(self, expr, with_obj=False):
+        name = expr.get('name')
+        args = expr.get('args')
+        if name == 'print':
+            for a in args:
+                self.compile_expr(a)
+                self.emit(PRINT_ARG)
+            self.emit(PRINT, len(args))
+            return
+        if name == 'inputi' or name == 'inputs':
+            if len(args) > 1:
+                self.emit(RAISE, self.const((ErrorType.NAME_ERROR, f"Invalid number of arguments provided for '{name}' function.")))
+            elif len(args) == 1:
+                self.compile_expr(args[0])
+            self.emit(INPUT, self.const((name, len(args) == 1)))
+            return
+        site = CallSite(name, len(args), self.functions.get(name), with_obj)
+        self.emit(CALL_BEGIN, self.const(site))
+        self.compile_args(args)
+        self.emit(CALL_END)
+
+    def compile_mcall(self, expr):
+        args = expr.get('args')
+        site = MethodCallSite(expr.get('objref'), expr.get('name'), len(args))
+        self.emit(MCALL_BEGIN, self.const(site))
+        self.compile_args(args)
+        site.call_end = len(self.code)
+        self.emit(CALL_END)
+
+    def compile_args(self, args):
+        for i, a in enumerate(args):
+            self.compile_expr(a)
+            # only variable arguments can be bound to a 'ref' parameter
+            self.emit(BIND_ARG, i << 2 | self.fresh(a) << 1 | (a.elem_type == InterpreterBase.VAR_DEF))
+
+    def fresh(self, expr):
+        # whether expr evaluates to a new box that nothing else holds; constants
+        # are shared by every execution of their instruction
+        return expr.elem_type not in (InterpreterBase.VAR_DEF, InterpreterBase.NIL_DEF, InterpreterBase.BOOL_DEF,
+                                      InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, INLINE_ARG_DEF,
+                                      INVARIANT_DEF)
@@ -0,0 +1,683 @@
+import operator
+from intbase import InterpreterBase, ErrorType
+from element import INLINE_DEF, INLINE_ARG_DEF, INVARIANT_DEF
+from runtime import Value, Lambda, Object, InlineCache, SPECIALIZED_OPS, to_bool, to_int, copy_value
+from analysis import resolve_slots, infer_types
+
+
+ARITHMETIC = {
+    '-': lambda x, y: x - y,
+    '*': lambda x, y: x * y,
+    '/': lambda x, y: x // y,
+}
+
+COMPARISON = {
+    '<': lambda x, y: x < y,
+    '<=': lambda x, y: x <= y,
+    '>': lambda x, y: x > y,
+    '>=': lambda x, y: x >= y,
+}
+
+# operators on two operands proven to be ints, which need no checks
+INT_ARITHMETIC = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.floordiv,
+}
+INT_COMPARISON = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+class FunctionCode:
+    def __init__(self, params, body):
+        self.params = params  # list of (name, is_ref) pairs
+        self.body = body
+
+
+class ClosureCompiler:
+    """
+    Execution engine that compiles each Element tree once into nested Python
+    closures, one specialized callable per node kind, and then runs those
+    instead of re-dispatching on elem_type at every visit.
+
+    Statements compile to callables returning None or the Value produced by a
+    'return'; expressions compile to callables returning a Value. The runtime
+    objects (Environment, Value, Lambda, Object) are the same ones the tree
+    walker uses, so both engines share scoping, closures and objects.
+
+    Reads and assignments that resolve_slots ties to one of the running
+    function's parameters go straight to that parameter's box in the current
+    frame, a list of the boxes the call bound, instead of searching the scopes.
+    Operations and conditions whose operand types infer_types proves skip
+    their runtime type checks.
+    """
+
+    def __init__(self, interpreter, functions):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.functions = functions
+        self.code = {}  # id(func or lambda element) -> (element, FunctionCode)
+        self.slots = {}  # resolve_slots() of the body being compiled
+        self.types = {}  # infer_types() of the body being compiled
+        self.inline_args = [None]  # argument values of the inlined call being evaluated
+        self.invariants = {}  # name of an invariant -> cell holding its value since its loop started
+        self.frames = [[]]  # parameter boxes of each running function, innermost last
+
+    def run(self, main):
+        # a run that ended in an error can leave the frames of its calls
+        del self.frames[1:]
+        self.function_code(main).body()
+
+    def error(self, error_type, description):
+        self.interpreter.error(error_type, description)
+
+    def get_function(self, func_name, num_args):
+        if func_name not in self.functions:
+            self.error(ErrorType.NAME_ERROR, f"Function {func_name} was not found.")
+        if num_args not in self.functions[func_name]:
+            self.error(ErrorType.NAME_ERROR, f"Function {func_name} taking {num_args} arguments was not found.")
+        return self.functions[func_name][num_args]
+
+    def function_code(self, func):
+        # function bodies are compiled lazily, the first time they are called;
+        # the element is kept in the entry so its id can't be reused
+        entry = self.code.get(id(func))
+        if entry is None:
+            params = [(p.get('name'), p.elem_type == InterpreterBase.REFARG_DEF) for p in func.get('args')]
+            # lambda parameters live in the closure, which recursive calls
+            # rebind, so only functions get frames
+            if func.elem_type == InterpreterBase.FUNC_DEF:
+                self.slots = resolve_slots(func)
+                self.types = infer_types(func, self.functions, self.interpreter.ref_params)
+            entry = (func, FunctionCode(params, self.compile_block(func.get('statements'))))
+            self.slots = {}
+            self.types = {}
+            self.code[id(func)] = entry
+        return entry[1]
+
+    ############################# STATEMENTS
+
+    def compile_block(self, statements):
+        compiled = []
+        for s in statements:
+            stmt = self.compile_statement(s)
+            if stmt is not None:
+                compiled.append(stmt)
+
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def run_block():
+            for stmt in compiled:
+                result = stmt()
+                if result is not None:
+                    return result
+            return None
+        return run_block
+
+    def compile_scoped_block(self, statements):
+        # a block run in a scope of its own, unless it creates no variables
+        body = self.compile_block(statements)
+        if id(statements) in self.interpreter.unscoped:
+            return body
+        env = self.env
+
+        def run_scoped():
+            env.push()
+            result = body()
+            env.pop()
+            return result
+        return run_scoped
+
+    def compile_statement(self, statement):
+        kind = statement.elem_type
+        if kind == '=':
+            if '.' in statement.get('name'):
+                return self.compile_field_assignment(statement)
+            return self.compile_assignment(statement)
+        if kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            call = self.compile_expr(statement)
+
+            def run_call():
+                call()
+            return run_call
+        if kind == InterpreterBase.IF_DEF:
+            return self.compile_if(statement)
+        if kind == InterpreterBase.WHILE_DEF:
+            return self.compile_while(statement)
+        if kind == InterpreterBase.RETURN_DEF:
+            return self.compile_return(statement)
+        # any other expression statement is never evaluated
+        return None
+
+    def compile_assignment(self, statement):
+        symbol = statement.get('name')
+        expr = self.compile_expr(statement.get('expression'))
+        env_set = self.env.set
+
+        if id(statement) in self.slots:
+            slot = self.slots[id(statement)]
+            frames = self.frames
+
+            def assign_param():
+                val = expr()
+                box = frames[-1][slot]
+                box.v = val.v
+                box.t = val.t
+            return assign_param
+
+        def run_assignment():
+            val = expr()
+            env_set(symbol, val.v, val.t)
+        return run_assignment
+
+    def compile_field_assignment(self, statement):
+        obj_name, field_name = statement.get('name').split('.')
+        expr = self.compile_expr(statement.get('expression'))
+        env_get = self.env.get
+        error = self.error
+
+        def run_field_assignment():
+            obj = env_get(obj_name)
+            if obj is None:
+                error(ErrorType.NAME_ERROR, "Object not found.")
+            if obj.type() != 'object':
+                error(ErrorType.TYPE_ERROR, "Attempting to assign a field to a non-object.")
+            obj = obj.v
+            val = expr()
+            if field_name == 'proto':
+                if val.t == 'nil':
+                    return
+                if val.t != 'object':
+                    error(ErrorType.TYPE_ERROR, "Attempting to specify non-object as prototype.")
+                obj.set_proto(val.v)
+                return
+            obj.set(field_name, val.t, val.v)
+        return run_field_assignment
+
+    def compile_condition(self, expr, statement):
+        # a callable returning the Python bool of an 'if' or 'while' condition
+        condition = self.compile_expr(expr)
+        if self.types.get(id(expr)) == 'bool':
+            return lambda: condition().v
+        error = self.error
+
+        def check_condition():
+            cond = to_bool(condition().v)
+            if cond is None:
+                error(ErrorType.TYPE_ERROR, f"Incorrect condition type for '{statement}' statement.")
+            return cond
+        return check_condition
+
+    def compile_if(self, statement):
+        condition = self.compile_condition(statement.get('condition'), 'if')
+        body = self.compile_scoped_block(statement.get('statements'))
+        else_statements = statement.get('else_statements')
+        else_body = self.compile_scoped_block(else_statements) if else_statements else None
+
+        def run_if():
+            if condition():
+                return body()
+            if else_body is not None:
+                return else_body()
+            return None
+        return run_if
+
+    def compile_while(self, statement):
+        condition = self.compile_condition(statement.get('condition'), 'while')
+        body = self.compile_block(statement.get('statements'))
+        env = self.env
+        invariants = [self.invariants.setdefault(name, [None]) for name in statement.get('invariants') or ()]
+
+        if id(statement.get('statements')) in self.interpreter.unscoped:
+            def run_unscoped_while():
+                for cell in invariants:
+                    cell[0] = None
+                while condition():
+                    result = body()
+                    if result is not None:
+                        return result
+                return None
+            return run_unscoped_while
+
+        def run_while():
+            scope = {}
+            for cell in invariants:
+                cell[0] = None
+            while True:
+                if not condition():
+                    return None
+                env.push_scope(scope)
+                result = body()
+                env.pop()
+                if result is not None:
+                    return result
+                scope.clear()
+        return run_while
+
+    def compile_return(self, statement):
+        expr = statement.get('expression')
+        if expr is None:
+            return lambda: Value('nil', None)
+        fresh = expr.elem_type != InterpreterBase.VAR_DEF and expr.elem_type != INVARIANT_DEF
+        expr = self.compile_expr(expr)
+        return lambda: copy_value(expr(), fresh)
+
+    ############################# EXPRESSIONS
+
+    def compile_expr(self, expr):
+        kind = expr.elem_type
+
+        if kind == InterpreterBase.NIL_DEF:
+            return lambda: Value('nil', None)
+        if kind == InterpreterBase.BOOL_DEF:
+            val = expr.get('val')
+            return lambda: Value('nil', val)
+        if kind == InterpreterBase.INT_DEF:
+            val = expr.get('val')
+            return lambda: Value('int', val)
+        if kind == InterpreterBase.STRING_DEF:
+            val = expr.get('val')
+            return lambda: Value('string', val)
+        if kind == InterpreterBase.VAR_DEF:
+            return self.compile_var(expr)
+        if kind == InterpreterBase.FCALL_DEF:
+            return self.compile_fcall(expr)
+        if kind == INLINE_DEF:
+            return self.compile_inline(expr)
+        if kind == INLINE_ARG_DEF:
+            return self.compile_inline_arg(expr)
+        if kind == INVARIANT_DEF:
+            return self.compile_invariant(expr)
+        if kind == InterpreterBase.MCALL_DEF:
+            return self.compile_mcall(expr)
+        if kind == InterpreterBase.LAMBDA_DEF:
+            get_closure = self.env.get_closure
+            names = self.interpreter.captures[id(expr)]
+            return lambda: Value('lambda', Lambda(get_closure(names), expr))
+        if kind == InterpreterBase.OBJ_DEF:
+            return lambda: Value('object', Object())
+        if kind == InterpreterBase.NEG_DEF and self.types.get(id(expr.get('op1'))) == 'int':
+            op1 = self.compile_expr(expr.get('op1'))
+            return lambda: Value('int', -op1().v)
+        if kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            return self.compile_unary(kind, self.compile_expr(expr.get('op1')))
+        op1 = self.compile_expr(expr.get('op1'))
+        op2 = self.compile_expr(expr.get('op2'))
+        if self.types.get(id(expr.get('op1'))) == 'int' and self.types.get(id(expr.get('op2'))) == 'int':
+            if kind in INT_ARITHMETIC:
+                fn = INT_ARITHMETIC[kind]
+                return lambda: Value('int', fn(op1().v, op2().v))
+            if kind in INT_COMPARISON:
+                fn = INT_COMPARISON[kind]
+                return lambda: Value('bool', fn(op1().v, op2().v))
+        return self.compile_binary(kind, op1, op2)
+
+    def compile_inline(self, expr):
+        # a call the optimizer replaced by the callee's return expression; its
+        # body can't make calls, so one set of arguments is live at a time
+        arg_fns = [self.compile_expr(a) for a in expr.get('args')]
+        body = expr.get('expression')
+        if body is None:
+            def inline_nil():
+                for arg in arg_fns:
+                    arg()
+                return Value('nil', None)
+            return inline_nil
+        fresh = body.elem_type not in (InterpreterBase.VAR_DEF, INLINE_ARG_DEF, INVARIANT_DEF)
+        body = self.compile_expr(body)
+        inline_args = self.inline_args
+
+        def inline():
+            inline_args[0] = [arg() for arg in arg_fns]
+            return copy_value(body(), fresh)
+        return inline
+
+    def compile_inline_arg(self, expr):
+        index = expr.get('index')
+        field_name = expr.get('field')
+        inline_args = self.inline_args
+        if field_name is None:
+            return lambda: inline_args[0][index]
+        error = self.error
+        cache = InlineCache(field_name)
+
+        def read_arg_field():
+            obj = inline_args[0][index]
+            if obj.t != 'object':
+                error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
+            field = cache.get(obj.v)
+            if field is None:
+                error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
+            return field
+        return read_arg_field
+
+    def compile_invariant(self, expr):
+        cell = self.invariants.setdefault(expr.get('name'), [None])
+        value = self.compile_expr(expr.get('expression'))
+
+        def invariant():
+            val = cell[0]
+            if val is None:
+                val = cell[0] = value()
+            return val
+        return invariant
+
+    def compile_var(self, expr):
+        var_name = expr.get('name')
+        env_get = self.env.get
+        error = self.error
+
+        if '.' in var_name:
+            obj_name, field_name = var_name.split('.')
+            cache = InlineCache(field_name)
+
+            def read_field():
+                obj = env_get(obj_name)
+                if obj is None or obj.type() != 'object':
+                    error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
+                field = cache.get(obj.v)
+                if field is None:
+                    error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
+                return field
+            return read_field
+
+        # function names shadow variables, and the function table is fixed for a run
+        if var_name in self.functions:
+            overloads = self.functions[var_name]
+            if len(overloads) > 1:
+                return lambda: error(ErrorType.NAME_ERROR, "Cannot return or assign overloaded function name.")
+            func = list(overloads.values())[0]
+            return lambda: Value('func', func)
+
+        if id(expr) in self.slots:
+            slot = self.slots[id(expr)]
+            frames = self.frames
+            return lambda: frames[-1][slot]
+
+        def read_var():
+            val = env_get(var_name)
+            if val is None:
+                error(ErrorType.NAME_ERROR, f"Variable {var_name} was not found.")
+            return val
+        return read_var
+
+    def compile_unary(self, op, op1):
+        error = self.error
+        if op == InterpreterBase.NEG_DEF:
+            def negate():
+                val = op1()
+                if val.t != 'int':
+                    error(ErrorType.TYPE_ERROR, f"Non-integer value cannot be negated with '-'.")
+                return Value('int', -1 * val.v)
+            return negate
+
+        def logical_not():
+            val = to_bool(op1().v)
+            if val is None:
+                error(ErrorType.TYPE_ERROR, f"Non-integer or non-boolean value cannot be negated with '!'.")
+            return Value('bool', not val)
+        return logical_not
+
+    def compile_binary(self, op, op1, op2):
+        if (op == '||' or op == '&&') and self.interpreter.short_circuit:
+            return self.compile_short_circuit(op, op1, op2)
+        generic = self.compile_operation(op)
+        quick = None  # (left type, right type, specialized op); False once deoptimized
+
+        # the first evaluation quickens the node into the operation
+        # specialized for the operand types it sees; if they ever change it
+        # goes back to the generic one for good
+        def binary():
+            nonlocal quick
+            a = op1()
+            b = op2()
+            if quick:
+                if a.t == quick[0] and b.t == quick[1]:
+                    return quick[2](a, b)
+                quick = False
+            elif quick is None:
+                special = SPECIALIZED_OPS.get((op, a.t, b.t))
+                if special is not None:
+                    quick = (a.t, b.t, special)
+                    return special(a, b)
+                quick = False
+            return generic(a, b)
+        return binary
+
+    def compile_short_circuit(self, op, op1, op2):
+        error = self.error
+        is_or = op == '||'
+
+        def short_circuit():
+            x = to_bool(op1().v)
+            if x is None:
+                error(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation.")
+            if x == is_or:
+                return Value('bool', x)
+            y = to_bool(op2().v)
+            if y is None:
+                error(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation.")
+            return Value('bool', y)
+        return short_circuit
+
+    def compile_operation(self, op):
+        # the generic operation on two evaluated operands, any types
+        error = self.error
+
+        if op == '+':
+            def add(a, b):
+                if a.t == 'string' and b.t == 'string':
+                    return Value('string', a.v + b.v)
+                x = to_int(a.v)
+                y = to_int(b.v)
+                if x is None or y is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for '+' operation.")
+                return Value('int', x + y)
+            return add
+
+        if op in ARITHMETIC:
+            fn = ARITHMETIC[op]
+
+            def arithmetic(a, b):
+                x = to_int(a.v)
+                y = to_int(b.v)
+                if x is None or y is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for '{op}' operation.")
+                return Value('int', fn(x, y))
+            return arithmetic
+
+        if op == '==' or op == '!=':
+            negate = op == '!='
+
+            def equality(a, b):
+                if a.t == b.t:
+                    return Value('bool', (a.v == b.v) != negate)
+                x = to_bool(a.v)
+                y = to_bool(b.v)
+                if x is None or y is None:
+                    return Value('bool', negate)
+                return Value('bool', (x == y) != negate)
+            return equality
+
+        if op == '||' or op == '&&':
+            is_or = op == '||'
+
+            def logical(a, b):
+                x = to_bool(a.v)
+                y = to_bool(b.v)
+                if x is None or y is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation.")
+                return Value('bool', (x or y) if is_or else (x and y))
+            return logical
+
+        fn = COMPARISON.get(op)
+
+        def comparison(a, b):
+            if a.t != 'int' or b.t != 'int':
+                error(ErrorType.TYPE_ERROR, f"Incompatible types for '{op}' operation.")
+            return Value('bool', fn(a.v, b.v))
+        return comparison
+
+    ############################# CALLS
+
+    def compile_fcall(self, expr):
+        name = expr.get('name')
+        args = expr.get('args')
+        if name == 'inputi' or name == 'inputs':
+            return self.compile_input(name, args)
+        if name == 'print':
+            return self.compile_print(args)
+        return self.make_call(name, [self.compile_expr(a) for a in args], self.refable(args))
+
+    def refable(self, args):
+        # only variable arguments can be bound to a 'ref' parameter
+        return [a.elem_type == InterpreterBase.VAR_DEF for a in args]
+
+    def make_call(self, name, arg_fns, refable):
+        env_get = self.env.get
+        error = self.error
+        invoke = self.invoke
+        num_args = len(arg_fns)
+        overloads = self.functions.get(name)
+        target = overloads.get(num_args) if overloads is not None else None
+
+        def call(obj=None):
+            alias = env_get(name)
+            if alias:
+                if alias.t == 'func':
+                    func = alias.v
+                    func = self.get_function(func.get('name'), len(func.get('args')))
+                    return invoke(func, arg_fns, refable, obj)
+                if alias.t == 'lambda':
+                    return self.invoke_lambda(alias, arg_fns, refable)
+                error(ErrorType.TYPE_ERROR, f"Variable is not callable.")
+            if target is None:
+                self.get_function(name, num_args)
+            return invoke(target, arg_fns, refable, obj)
+        return call
+
+    def invoke(self, func, arg_fns, refable, obj=None):
+        code = self.function_code(func)
+        params = code.params
+        if len(params) != len(arg_fns):
+            self.error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to function.")
+        env = self.env
+        env.push()
+        if obj is not None:
+            env.create('this', obj)
+        frame = []
+        for (param_name, is_ref), arg, is_var in zip(params, arg_fns, refable):
+            box = arg() if is_ref and is_var else copy_value(arg(), not is_var)
+            env.create(param_name, box)
+            frame.append(box)
+        key = None
+        if obj is None and id(func) in self.interpreter.pure:
+            key = self.interpreter.memo.key(func, frame)
+            if key is not None:
+                result = self.interpreter.memo.get(key)
+                if result is not None:
+                    env.pop()
+                    return result
+        self.frames.append(frame)
+        result = code.body()
+        self.frames.pop()
+        env.pop()
+        if result is None:
+            result = Value('nil', None)
+        if key is not None:
+            self.interpreter.memo.put(key, result)
+        return result
+
+    def invoke_lambda(self, lambda_val, arg_fns, refable, obj=None):
+        closure = lambda_val.v.closure
+        code = self.function_code(lambda_val.v.func)
+        params = code.params
+        if len(params) != len(arg_fns):
+            self.error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to lambda function.")
+        env = self.env
+        for (param_name, is_ref), arg, is_var in zip(params, arg_fns, refable):
+            if is_ref and is_var:
+                env.bind(closure, param_name, arg())
+            else:
+                env.bind(closure, param_name, copy_value(arg(), not is_var))
+        env.push_closure(closure)
+        if obj is not None:
+            env.create('this', obj)
+        result = code.body()
+        env.pop()
+        return result if result is not None else Value('nil', None)
+
+    def compile_mcall(self, expr):
+        obj_name = expr.get('objref')
+        method_name = expr.get('name')
+        args = expr.get('args')
+        arg_fns = [self.compile_expr(a) for a in args]
+        refable = self.refable(args)
+        env_get = self.env.get
+        error = self.error
+        cache = InlineCache(method_name)
+
+        def mcall():
+            obj = env_get(obj_name)
+            if obj is None:
+                error(ErrorType.NAME_ERROR, "Object name not found.")
+            if obj.type() != 'object':
+                error(ErrorType.TYPE_ERROR, "Attempting to call method from a non-object.")
+            method = cache.get(obj.v)
+            if method is None:
+                error(ErrorType.NAME_ERROR, "Attempting to call a method that does not exist in an object.")
+            if method.type() == 'lambda':
+                if len(args) != len(method.v.func.get('args')):
+                    error(ErrorType.NAME_ERROR, "Attempting to call a method with incorrect number of arguments.")
+                return self.invoke_lambda(method, arg_fns, refable, obj)
+            if method.type() == 'func':
+                return self.call_func_method(method.v, obj)
+            error(ErrorType.TYPE_ERROR, "Attempting to call a method in an object which is not a function.")
+        return mcall
+
+    def call_func_method(self, func, obj):
+        # a function stored in a field is called with its own definition as the
+        # call node, just like the tree walker does; the argument nodes are its
+        # formal parameters, so they are only compiled if they are evaluated
+        name = func.get('name')
+        args = func.get('args')
+        if name == 'inputi' or name == 'inputs' or name == 'print':
+            return self.compile_fcall(func)()
+        arg_fns = [lambda a=a: self.compile_expr(a)() for a in args]
+        return self.make_call(name, arg_fns, self.refable(args))(obj)
+
+    ############################# BUILT-INS
+
+    def compile_input(self, name, args):
+        interpreter = self.interpreter
+        error = self.error
+        prompt = self.compile_expr(args[0]) if len(args) == 1 else None
+
+        def call_input():
+            if len(args) > 1:
+                error(ErrorType.NAME_ERROR, f"Invalid number of arguments provided for '{name}' function.")
+            if prompt is not None:
+                val = prompt()
+                if val.t != 'string':
+                    error(ErrorType.TYPE_ERROR, f"Invalid argument type provided for '{name}' function.")
+                interpreter.output(val.v)
+            if name == 'inputi':
+                return Value('int', int(interpreter.get_input()))
+            return Value('string', interpreter.get_input())
+        return call_input
+
+    def compile_print(self, args):
+        interpreter = self.interpreter
+        arg_fns = [self.compile_expr(a) for a in args]
+
+        def call_print():
+            result = ''
+            for arg in arg_fns:
+                msg = arg().v
+                if msg == True or msg == False:
+                    msg = str(msg).lower()
+                result += str(msg)
+            interpreter.output(result)
+            return Value('nil', None)
+        return call_print
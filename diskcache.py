@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+import time
+
+# the user's cache directory, as the XDG base directory spec has it
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'brewin')
+
+
+def digest(*parts):
+    """The hex SHA-256 of the strings in parts, kept apart so they can't run together."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode('utf-8')
+        h.update(len(data).to_bytes(8, 'little'))
+        h.update(data)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed files in a directory shared by any number of
+    processes: entry key (see digest) is the file key + suffix. An entry is
+    written to a temporary file and renamed into place, so readers never
+    see a partial one and writers racing on a key just replace each other's
+    equal content. Reading an entry touches its mtime; once the entries
+    with this suffix outgrow max_bytes, the least recently used ones are
+    removed until they fit in three quarters of it. Rather than scanning
+    the directory on every write, a process only does so on its first one
+    and once what it has written since would take the size seen by the
+    last scan past max_bytes. The cache only ever costs speed: a missing,
+    unreadable or read-only directory is a miss.
+    """
+
+    STALE_TEMP_SECONDS = 3600  # temporary files older than this were left by a writer that died
+    sizes = {}  # (directory, suffix) -> bytes of its entries at the last scan plus those written since
+
+    def __init__(self, directory, suffix, max_bytes=64 << 20):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """The bytes stored under key, or None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp, self.path(key))
+        except OSError:
+            if tmp is not None:
+                self.remove(tmp)
+            return
+        size = self.sizes.get((self.directory, self.suffix))
+        if size is None or size + len(data) > self.max_bytes:
+            self.evict()
+        else:
+            self.sizes[(self.directory, self.suffix)] = size + len(data)
+
+    def evict(self):
+        entries = []
+        total = 0
+        now = time.time()
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if entry.name.endswith(self.suffix):
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+                    elif entry.name.endswith('.tmp') and stat.st_mtime < now - self.STALE_TEMP_SECONDS:
+                        self.remove(entry.path)
+        except OSError:
+            return
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * 3 // 4:
+                    break
+                # another process may have removed it already
+                self.remove(path)
+                total -= size
+        self.sizes[(self.directory, self.suffix)] = total
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,18 +1,45 @@
+from collections.abc import MutableMapping
+
+
 class Element:
+    """
+    A node of the parsed program. Element(kind, **fields) builds an instance
+    of the node class for that kind (see NODE_CLASSES), which keeps its
+    fields in slots rather than a dict. Every field name any kind uses reads
+    as None on nodes without it, so node.statements, like node.get('statements'),
+    works on any node; dict is a mapping view of the node's own fields.
+    """
+    __slots__ = ('elem_type',)
+    fields = ()
+    optional = ()  # fields the parser never sets, which str() leaves out while they are None
+
+    def __new__(cls, elem_type=None, **kwargs):
+        if cls is Element:
+            cls = NODE_CLASSES.get(elem_type, GenericElement)
+        return object.__new__(cls)
+
     def __init__(self, elem_type, **kwargs):
         self.elem_type = elem_type
-        self.dict = {}
-        for key, value in kwargs.items():
-            self.dict[key] = value
+        for field in self.fields:
+            setattr(self, field, kwargs.pop(field, None))
+        if kwargs:
+            raise TypeError(f"'{elem_type}' nodes have no field {', '.join(kwargs)}")
 
     def get(self, key):
-        if key not in self.dict:
-            return None
-        return self.dict[key]
+        return getattr(self, key, None)
+
+    @property
+    def dict(self):
+        return Fields(self)
+
+    def field_names(self):
+        return self.fields
 
     def __str__(self):
         s = f"{self.elem_type}: "
         for key, value in self.dict.items():
+            if value is None and key in self.optional:
+                continue
             s += key + ": " + self.__val(value) + ", "
         return s[0:-2]
 
@@ -27,3 +54,168 @@ class Element:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
         return str(v)
+
+
+class Fields(MutableMapping):
+    """The fields of a node as a mapping, for code written against Element.dict."""
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, key):
+        if key not in self.node.field_names():
+            raise KeyError(key)
+        return getattr(self.node, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.node.field_names():
+            raise KeyError(f"'{self.node.elem_type}' nodes have no field {key}")
+        setattr(self.node, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("node fields can't be removed")
+
+    def __iter__(self):
+        return iter(self.node.field_names())
+
+    def __len__(self):
+        return len(self.node.field_names())
+
+
+class GenericElement(Element):
+    # a node of a kind without a class of its own, with whatever fields it is given
+    __slots__ = ('__dict__',)
+
+    def __init__(self, elem_type, **kwargs):
+        self.elem_type = elem_type
+        self.__dict__.update(kwargs)
+
+    def field_names(self):
+        return tuple(self.__dict__)
+
+
+# node kinds the optimizer adds to the parsed program
+INLINE_DEF = "inline"          # name, args, expression: a call replaced by the callee's return expression (see optimizer.Inliner)
+INLINE_ARG_DEF = "inline_arg"  # index, field: in such an expression, a parameter's value or one of its fields
+INVARIANT_DEF = "invariant"    # name, expression: a loop-invariant expression evaluated once per run of its loop (see optimizer.LoopInvariantCodeMotion)
+# a WHILE_DEF with invariants lists their names in 'invariants'; their values are forgotten whenever it starts
+
+BINARY_OPS = ('+', '-', '*', '/', '==', '!=', '<', '<=', '>', '>=', '&&', '||')
+
+
+class ProgramNode(Element):
+    __slots__ = fields = ('functions',)
+
+
+class FuncNode(Element):
+    # original is the function as written, which its values print, once the
+    # optimizer has rewritten it (see optimizer.PassManager)
+    __slots__ = ('name', 'args', 'statements', 'original')
+    fields = ('name', 'args', 'statements')
+
+    def __str__(self):
+        original = self.get('original')
+        return super().__str__() if original is None else str(original)
+
+
+class LambdaNode(Element):
+    __slots__ = fields = ('args', 'statements')
+
+
+class ArgNode(Element):
+    # ARG_DEF and REFARG_DEF
+    __slots__ = fields = ('name',)
+
+
+class AssignNode(Element):
+    __slots__ = fields = ('name', 'expression')
+
+
+class IfNode(Element):
+    __slots__ = fields = ('condition', 'statements', 'else_statements')
+
+
+class WhileNode(Element):
+    __slots__ = fields = ('condition', 'statements', 'invariants')
+    optional = ('invariants',)
+
+
+class ReturnNode(Element):
+    __slots__ = fields = ('expression',)
+
+
+class UnaryNode(Element):
+    # NEG_DEF and NOT_DEF
+    __slots__ = fields = ('op1',)
+
+
+class BinaryNode(Element):
+    # the operators in BINARY_OPS
+    __slots__ = fields = ('op1', 'op2')
+
+
+class ValueNode(Element):
+    # INT_DEF, STRING_DEF and BOOL_DEF literals
+    __slots__ = fields = ('val',)
+
+
+class EmptyNode(Element):
+    # NIL_DEF and OBJ_DEF
+    __slots__ = fields = ()
+
+
+class VarNode(Element):
+    __slots__ = fields = ('name',)
+
+
+class FCallNode(Element):
+    __slots__ = fields = ('name', 'args')
+
+
+class MCallNode(Element):
+    __slots__ = fields = ('objref', 'name', 'args')
+
+
+class InlineNode(Element):
+    __slots__ = fields = ('name', 'args', 'expression')
+
+
+class InlineArgNode(Element):
+    __slots__ = fields = ('index', 'field')
+
+
+class InvariantNode(Element):
+    __slots__ = fields = ('name', 'expression')
+
+
+NODE_CLASSES = {
+    'program': ProgramNode,
+    'func': FuncNode,
+    'lambda': LambdaNode,
+    'arg': ArgNode,
+    'refarg': ArgNode,
+    '=': AssignNode,
+    'if': IfNode,
+    'while': WhileNode,
+    'return': ReturnNode,
+    'neg': UnaryNode,
+    '!': UnaryNode,
+    'int': ValueNode,
+    'string': ValueNode,
+    'bool': ValueNode,
+    'nil': EmptyNode,
+    '@': EmptyNode,
+    'var': VarNode,
+    'fcall': FCallNode,
+    'mcall': MCallNode,
+    INLINE_DEF: InlineNode,
+    INLINE_ARG_DEF: InlineArgNode,
+    INVARIANT_DEF: InvariantNode,
+}
+NODE_CLASSES.update((op, BinaryNode) for op in BINARY_OPS)
+
+# fields read as None on nodes that don't have them
+for _field in {field for cls in NODE_CLASSES.values() for field in cls.fields}:
+    setattr(Element, _field, None)
+del _field
@@ -0,0 +1,388 @@
+"""
+Flat, array-backed form of the parsed program: struct-of-arrays columns
+indexed by integer node ids instead of a tree of Element objects. Building
+one appends to a handful of arrays, and the arrays can be saved to a file
+and memory-mapped back without parsing or unpickling anything.
+"""
+import hashlib
+import mmap
+import struct
+from array import array
+from collections.abc import Mapping
+
+from element import Element, NODE_CLASSES
+
+# every node kind, by its code in the kinds column
+KINDS = tuple(NODE_CLASSES)
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# how each field is stored in its column
+NODE = 0    # a node id, or NONE
+LIST = 1    # the offset of a length-prefixed run of node ids in items, or NONE
+STR = 2     # an index into the string table, or NONE
+INT = 3     # an index into numbers, -2 - (index into the string table) for an int too big for it, or NONE
+BOOL = 4    # 0 or 1
+STRS = 5    # the offset of a length-prefixed run of string indices in items, or NONE
+
+NONE = -1
+
+FIELD_TYPES = {
+    'functions': LIST, 'args': LIST, 'statements': LIST, 'else_statements': LIST,
+    'name': STR, 'objref': STR, 'field': STR,
+    'expression': NODE, 'condition': NODE, 'op1': NODE, 'op2': NODE,
+    'index': INT, 'invariants': STRS,
+}
+VAL_TYPES = {'int': INT, 'string': STR, 'bool': BOOL}
+
+# the (name, type) of each kind's fields, in column order
+SCHEMA = tuple(
+    tuple((field, VAL_TYPES[kind] if field == 'val' else FIELD_TYPES[field]) for field in NODE_CLASSES[kind].fields)
+    for kind in KINDS
+)
+MAX_FIELDS = 3
+
+MAGIC = b'BRFA'
+VERSION = 1
+HEADER = struct.Struct('<4sIqqqqqq')  # magic, version, nodes, items, numbers, strings, string bytes, root
+
+
+class FlatAST:
+    """
+    Node n's kind is kinds[n] (a code into KINDS) and its fields are
+    field0[n], field1[n] and field2[n], stored as SCHEMA says. Lists of
+    nodes live in items. Children are added before their parents, so the
+    root has the highest id.
+
+    Traversal: kind(n), get(n, field), children(n) and walk(). node(n) is
+    a read-only view of node n with the read side of the Element interface
+    (elem_type, get, attributes, dict), for reading a program without
+    building its tree. Views and their lists are created once per node, so
+    id() keyed results stay valid as long as the FlatAST lives. The
+    optimizer and the engines need ordinary Elements, which to_tree() builds.
+    """
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.field0 = array('i')
+        self.field1 = array('i')
+        self.field2 = array('i')
+        self.items = array('i')
+        self.numbers = array('q')
+        self.strings = []
+        self.string_index = {}
+        self.root = NONE
+        self.views = {}
+        self.lists = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    ############################# BUILDING
+
+    def add(self, kind, **fields):
+        """Appends a node, with node fields given as ids, and returns its id."""
+        code = KIND_CODES.get(kind)
+        if code is None:
+            raise ValueError(f"Flat ASTs have no '{kind}' nodes.")
+        values = [NONE] * MAX_FIELDS
+        for i, (field, field_type) in enumerate(SCHEMA[code]):
+            value = fields.pop(field, None)
+            if value is not None:
+                values[i] = self.encode(field_type, value)
+        if fields:
+            raise TypeError(f"'{kind}' nodes have no field {', '.join(fields)}")
+        self.kinds.append(code)
+        self.field0.append(values[0])
+        self.field1.append(values[1])
+        self.field2.append(values[2])
+        return len(self.kinds) - 1
+
+    def encode(self, field_type, value):
+        if field_type == NODE or field_type == BOOL:
+            return int(value)
+        if field_type == STR:
+            return self.string(value)
+        if field_type == INT:
+            if -2 ** 63 <= value < 2 ** 63:
+                self.numbers.append(value)
+                return len(self.numbers) - 1
+            return -2 - self.string(str(value))
+        offset = len(self.items)
+        self.items.append(len(value))
+        self.items.extend(value if field_type == LIST else [self.string(s) for s in value])
+        return offset
+
+    def string(self, s):
+        index = self.string_index.get(s)
+        if index is None:
+            index = self.string_index[s] = len(self.strings)
+            self.strings.append(s)
+        return index
+
+    @classmethod
+    def from_tree(cls, element):
+        """A FlatAST holding a copy of the Element tree."""
+        flat = cls()
+
+        def add(node):
+            fields = {}
+            for field, value in node.dict.items():
+                field_type = FIELD_TYPES.get(field)
+                if value is None:
+                    continue
+                if field_type == NODE:
+                    value = add(value)
+                elif field_type == LIST:
+                    value = [add(n) for n in value]
+                fields[field] = value
+            return flat.add(node.elem_type, **fields)
+
+        flat.root = add(element)
+        return flat
+
+    ############################# TRAVERSAL
+
+    def kind(self, n):
+        return KINDS[self.kinds[n]]
+
+    def raw(self, n, i):
+        # the stored value of node n's field i
+        return (self.field0, self.field1, self.field2)[i][n]
+
+    def get(self, n, field):
+        """Node n's field: ids for nodes and lists of nodes, Python values otherwise."""
+        for i, (name, field_type) in enumerate(SCHEMA[self.kinds[n]]):
+            if name == field:
+                return self.decode(field_type, self.raw(n, i))
+        return None
+
+    def decode(self, field_type, value):
+        if field_type == BOOL:
+            return bool(value)
+        if value == NONE:
+            return None
+        if field_type == NODE:
+            return value
+        if field_type == STR:
+            return self.strings[value]
+        if field_type == INT:
+            return self.numbers[value] if value >= 0 else int(self.strings[-2 - value])
+        values = self.items[value + 1:value + 1 + self.items[value]]
+        return list(values) if field_type == LIST else [self.strings[s] for s in values]
+
+    def children(self, n):
+        """The ids of node n's child nodes, in field order."""
+        result = []
+        for i, (_, field_type) in enumerate(SCHEMA[self.kinds[n]]):
+            value = self.raw(n, i)
+            if value == NONE:
+                continue
+            if field_type == NODE:
+                result.append(value)
+            elif field_type == LIST:
+                result.extend(self.items[value + 1:value + 1 + self.items[value]])
+        return result
+
+    def walk(self, n=None):
+        """The ids of n's subtree, the whole program by default, parents first."""
+        stack = [self.root if n is None else n]
+        while stack:
+            n = stack.pop()
+            yield n
+            stack.extend(reversed(self.children(n)))
+
+    def node(self, n):
+        view = self.views.get(n)
+        if view is None:
+            view = self.views[n] = FlatNode(self, n)
+        return view
+
+    def node_list(self, n, field, ids):
+        # the list of views for a list field, kept so its id() stays the same
+        key = (n, field)
+        nodes = self.lists.get(key)
+        if nodes is None:
+            nodes = self.lists[key] = [self.node(i) for i in ids]
+        return nodes
+
+    def to_tree(self, n=None):
+        """The Element tree of n, the whole program by default."""
+        n = self.root if n is None else n
+        fields = {}
+        for i, (field, field_type) in enumerate(SCHEMA[self.kinds[n]]):
+            value = self.decode(field_type, self.raw(n, i))
+            if value is not None and field_type == NODE:
+                value = self.to_tree(value)
+            elif value is not None and field_type == LIST:
+                value = [self.to_tree(child) for child in value]
+            fields[field] = value
+        return Element(self.kind(n), **fields)
+
+    ############################# FILES
+
+    def columns(self):
+        strings = [s.encode('utf-8') for s in self.strings]
+        offsets = array('q', [0])
+        for s in strings:
+            offsets.append(offsets[-1] + len(s))
+        return [self.kinds, self.field0, self.field1, self.field2, self.items, self.numbers, offsets,
+                b''.join(strings)]
+
+    def digest(self):
+        """A hash of the program's contents."""
+        h = hashlib.sha256()
+        for column in self.columns():
+            h.update(bytes(column))
+        return h.hexdigest()
+
+    def to_bytes(self):
+        """The header and the columns, each 8-byte aligned, as save() writes them."""
+        columns = self.columns()
+        parts = [HEADER.pack(MAGIC, VERSION, len(self.kinds), len(self.items), len(self.numbers),
+                             len(self.strings), len(columns[-1]), self.root)]
+        for column in columns:
+            data = bytes(column)
+            parts.append(data)
+            parts.append(b'\0' * (-len(data) % 8))
+        return b''.join(parts)
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """
+        A FlatAST whose columns are memoryviews of buffer, laid out as
+        to_bytes() makes it. Strings are decoded right away, and a buffer
+        whose columns don't hold a flat AST raises ValueError (see check).
+        """
+        if len(buffer) < HEADER.size:
+            raise ValueError("Truncated flat AST.")
+        magic, version, nodes, items, numbers, strings, string_bytes, root = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a flat AST of version {VERSION}.")
+        layout = (('B', nodes), ('i', nodes), ('i', nodes), ('i', nodes), ('i', items),
+                  ('q', numbers), ('q', strings + 1), ('B', string_bytes))
+        sizes = [count * array(typecode).itemsize for typecode, count in layout]
+        if HEADER.size + sum(size + (-size % 8) for size in sizes) != len(buffer):
+            raise ValueError("Truncated flat AST.")
+        view = memoryview(buffer)
+        offset = HEADER.size
+        columns = []
+        for (typecode, _), size in zip(layout, sizes):
+            columns.append(view[offset:offset + size].cast(typecode))
+            offset += size + (-size % 8)
+        flat = cls()
+        flat.kinds, flat.field0, flat.field1, flat.field2, flat.items, flat.numbers, offsets, blob = columns
+        if any(offsets[i] > offsets[i + 1] for i in range(strings)) or offsets[0] != 0 \
+                or offsets[strings] != string_bytes:
+            raise ValueError("Damaged flat AST: bad string offsets.")
+        flat.strings = [bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(strings)]
+        flat.string_index = {s: i for i, s in enumerate(flat.strings)}
+        flat.root = root
+        flat.check()
+        return flat
+
+    def check(self):
+        """
+        Raises ValueError unless every kind is known, every string, number
+        and items index is in range, and every child of a node was added
+        before it, which rules out cycles.
+        """
+        nodes, items, numbers, strings = len(self.kinds), len(self.items), len(self.numbers), len(self.strings)
+        if not 0 <= self.root < nodes:
+            raise ValueError("Damaged flat AST: no root.")
+
+        def run(offset):
+            # the items of the length-prefixed run at offset
+            if not 0 <= offset < items or not 0 <= self.items[offset] <= items - offset - 1:
+                raise ValueError("Damaged flat AST: bad items offset.")
+            return self.items[offset + 1:offset + 1 + self.items[offset]]
+
+        for n in range(nodes):
+            if self.kinds[n] >= len(KINDS):
+                raise ValueError("Damaged flat AST: unknown node kind.")
+            for i, (_, field_type) in enumerate(SCHEMA[self.kinds[n]]):
+                value = self.raw(n, i)
+                if value == NONE or field_type == BOOL:
+                    continue
+                if field_type == NODE:
+                    ok = 0 <= value < n
+                elif field_type == LIST:
+                    ok = all(0 <= child < n for child in run(value))
+                elif field_type == STRS:
+                    ok = all(0 <= s < strings for s in run(value))
+                elif field_type == STR:
+                    ok = 0 <= value < strings
+                else:
+                    ok = 0 <= value < numbers or 0 <= -2 - value < strings
+                if not ok:
+                    raise ValueError(f"Damaged flat AST: bad field in node {n}.")
+
+    @classmethod
+    def load(cls, path):
+        """
+        A FlatAST backed by the memory-mapped file, so nodes are only paged
+        in when they are read.
+        """
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(data)
+
+
+class FlatNode:
+    """A read-only Element-like view of one node of a FlatAST."""
+    __slots__ = ('ast', 'id')
+
+    def __init__(self, ast, n):
+        self.ast = ast
+        self.id = n
+
+    @property
+    def elem_type(self):
+        return self.ast.kind(self.id)
+
+    def get(self, key):
+        value = self.ast.get(self.id, key)
+        if value is None:
+            return None
+        field_type = FIELD_TYPES.get(key)
+        if field_type == NODE:
+            return self.ast.node(value)
+        if field_type == LIST:
+            return self.ast.node_list(self.id, key, value)
+        return value
+
+    def __getattr__(self, key):
+        if key in FIELD_TYPES or key == 'val':
+            return self.get(key)
+        raise AttributeError(key)
+
+    def field_names(self):
+        return tuple(field for field, _ in SCHEMA[self.ast.kinds[self.id]])
+
+    @property
+    def dict(self):
+        return FlatFields(self)
+
+    def __str__(self):
+        return str(self.ast.to_tree(self.id))
+
+
+class FlatFields(Mapping):
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, key):
+        if key not in self.node.field_names():
+            raise KeyError(key)
+        return self.node.get(key)
+
+    def __iter__(self):
+        return iter(self.node.field_names())
+
+    def __len__(self):
+        return len(self.node.field_names())
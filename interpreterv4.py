@@ -1,103 +1,25 @@
-from brewparse import parse_program
+from brewparse import parse_program, parse_program_flat, grammar_signature
 from intbase import InterpreterBase, ErrorType
-from element import Element
-from copy import deepcopy, copy
-
-class Environment:
-    def __init__(self):
-        self.env = [{}]
-
-    def get(self, symbol):
-        for e in reversed(self.env):
-            if symbol in e:
-                return e[symbol]
-        return None
-    
-    def set(self, symbol, value, type):
-        for e in reversed(self.env):
-            if symbol in e:
-                e[symbol].set_value(value)
-                e[symbol].set_type(type)
-                return
-        self.env[-1][symbol] = Value(type, value)
-
-    def create(self, symbol, box):
-        self.env[-1][symbol] = box
-
-    def push(self):
-        self.env.append({})
-
-    def push_closure(self, closure):
-        self.env.append(closure)
-
-    def pop(self):
-        self.env.pop()
-
-    def get_closure(self):
-        closure = {}
-        for scope in self.env:
-            for key, value in scope.items():
-                if value.type() == 'object' or value.type() == 'lambda':
-                    closure[key] = value
-                else:
-                    closure[key] = deepcopy(value)
-        return closure
-
-
-class Value:
-    def __init__(self, type, value):
-        self.t = type
-        self.v = value
-
-    def value(self):
-        return self.v
-    
-    def set_value(self, value):
-        self.v = value
-    
-    def type(self):
-        return self.t
-    
-    def set_type(self, type):
-        self.t = type
-
-class Lambda:
-    def __init__(self, closure, func):
-        self.closure = closure
-        self.func = func
-
-class Object:
-    def __init__(self):
-        self.fields = {}
-        self.proto = None
-
-    def get(self, symbol):
-        if symbol == 'proto':
-            if self.proto is not None:
-                return self.proto
-            else:
-                return None
-        if symbol in self.fields:
-            return self.fields[symbol]
-        prototype = self.proto
-        while prototype is not None:
-            proto_fields = prototype.get_fields()
-            if symbol in proto_fields:
-                return proto_fields[symbol]
-            else:
-                prototype = prototype.proto
-        return None
-    
-    def set(self, symbol, type, value):
-        self.fields[symbol] = Value(type, value)
-
-    def get_fields(self):
-        return self.fields
-
-    def set_proto(self, proto):
-        self.proto = proto
-        
-
+from element import INLINE_DEF, INLINE_ARG_DEF, INVARIANT_DEF
+from runtime import Environment, Value, Lambda, Object, InlineCache, MemoTable, ProgramCache, PreparedProgram, estimate_size, SPECIALIZED_OPS, copy_value
+from closurecompiler import ClosureCompiler
+from vm import VM
+from transpiler import PythonEngine, DEFAULT_CACHE_DIR
+from analysis import dynamic_names, lambda_captures, pure_functions, unscoped_blocks, has_ref_params
+from optimizer import PassManager, DEFAULT_PASSES
+from flatast import FlatAST
+from diskcache import DiskCache, digest
+import sys
+
+class Frame:
+    # a call whose arguments are bound: the body to run, its scope (detached
+    # from the environment until it runs) and the object bound to 'this'.
+    # A body returns one instead of a value for a call in tail position.
+    def __init__(self, statements, scope, obj = None, memo_key = None):
+        self.statements = statements
+        self.scope = scope
+        self.obj = obj
+        self.memo_key = memo_key  # set for calls of pure functions when memoizing
 
 class Interpreter(InterpreterBase):
 
@@ -115,20 +37,113 @@ class Interpreter(InterpreterBase):
             return val
         return None
 
-    def __init__(self, console_output = True, inp = None, trace_output = False):
+    # execution engines: 'tree' walks the AST directly, 'compiled' first turns
+    # it into closures (see closurecompiler.py) and 'vm' into bytecode for a
+    # stack machine (see bytecode.py and vm.py); 'python' translates it to
+    # Python source whose code objects are cached in cache_dir (see
+    # transpiler.py). Parsed programs are cached there too, for every engine;
+    # None disables both caches
+    ENGINES = ('tree', 'compiled', 'vm', 'python')
+    # roughly how many times the size of its AST a prepared program holds,
+    # analyses and compiled code included (measured with tracemalloc)
+    PROGRAM_SIZE_FACTORS = {'tree': 3, 'compiled': 8, 'vm': 4, 'python': 6}
+
+    # short_circuit skips the right operand of && and || when the left one
+    # decides the result; without it both operands are always evaluated.
+    # memoize remembers the results of pure functions (see
+    # analysis.pure_functions) for up to memo_size distinct calls. passes
+    # names the optimizations run on the AST first (see optimizer.py).
+    # Programs stay prepared for running again, up to program_cache_entries
+    # of them in program_cache_bytes (see runtime.ProgramCache)
+    def __init__(self, console_output = True, inp = None, trace_output = False, engine = 'tree', cache_dir = DEFAULT_CACHE_DIR,
+                 short_circuit = True, memoize = False, memo_size = 4096, passes = DEFAULT_PASSES,
+                 program_cache_entries = 32, program_cache_bytes = 64 << 20):
         super().__init__(console_output, inp)
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(self.ENGINES)}.")
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.short_circuit = short_circuit
+        self.memoize = memoize
+        self.memo_size = memo_size
+        self.passes = tuple(passes)
+        self.optimizer = PassManager(self.passes)
+        self.programs = ProgramCache(program_cache_entries, program_cache_bytes)
         self.env = Environment()
 
     def run(self, program):
-        ast = parse_program(program)
+        # program is Brewin source or a FlatAST, which the caches then know
+        # by its digest
+        key = program
+        if isinstance(program, FlatAST):
+            key = (FlatAST, program.digest())
+        prepared = self.programs.get(key)
+        if prepared is None:
+            if isinstance(program, FlatAST):
+                prepared = self.__prepare(key[1], program.to_tree())
+            else:
+                prepared = self.__prepare(program, self.__parse(program))
+            self.programs.put(key, prepared)
+        self.functions = prepared.functions
+        self.captures = prepared.captures
+        self.unscoped = prepared.unscoped
+        self.pure = prepared.pure
+        self.ref_params = prepared.ref_params
+        self.inline_caches = {}  # id(dotted VAR_DEF or MCALL_DEF) -> InlineCache
+        self.quickened = {}  # id(binary operator) -> (left type, right type, specialized op)
+        self.memo = MemoTable(self.memo_size) if self.memoize else None
+        if self.engine == 'compiled':
+            if prepared.engine is None:
+                prepared.engine = ClosureCompiler(self, self.functions)
+            prepared.engine.run(prepared.main)
+            return
+        if self.engine == 'vm':
+            if prepared.engine is None:
+                prepared.engine = VM(self, self.functions)
+            prepared.engine.run(prepared.main)
+            return
+        if self.engine == 'python':
+            if prepared.engine is None:
+                prepared.engine = PythonEngine(self, self.functions, self.cache_dir)
+            prepared.engine.run(prepared.source, prepared.ast, prepared.main)
+            return
+        self.dynamic_names = prepared.dynamic_names
+        self.frame_base = None  # index of the running function's scope, None in main
+        self.inline_args = None  # argument values of the inlined call being evaluated
+        self.invariants = {}  # name of an invariant -> its value since its loop started
+        self.__run_statements(prepared.main.statements)
+
+    def __prepare(self, source, ast):
+        ast = self.optimizer.run(ast)
         main = self.__init_functions(ast)
-        self.__run_statements(main.get('statements'))
+        return PreparedProgram(source, ast, self.functions, main, lambda_captures(ast), unscoped_blocks(ast),
+                               pure_functions(ast) if self.memoize else frozenset(), has_ref_params(ast),
+                               dynamic_names(ast) if self.engine == 'tree' else None,
+                               sys.getsizeof(source) + estimate_size(ast) * self.PROGRAM_SIZE_FACTORS[self.engine])
+
+    def __parse(self, program):
+        # parsed programs are kept as flat ASTs, keyed by the source and the
+        # grammar, so running the same source again skips lexing and parsing
+        signature = grammar_signature()
+        if self.cache_dir is None or signature is None:
+            return parse_program(program)
+        cache = DiskCache(self.cache_dir, '.brewast')
+        key = digest(signature, program)
+        data = cache.get(key)
+        if data is not None:
+            try:
+                return FlatAST.from_buffer(data).to_tree()
+            except Exception:
+                pass  # a damaged entry, whatever it fails with, is just a miss
+        flat = parse_program_flat(program)
+        cache.put(key, flat.to_bytes())
+        return flat.to_tree()
 
     def __init_functions(self, ast):
         self.functions = {}
-        for func in ast.get('functions'):
-            func_name = func.get('name')
-            num_args = len(func.get('args'))
+        for func in ast.functions:
+            func_name = func.name
+            num_args = len(func.args)
             if func_name in self.functions:
                 if num_args in self.functions[func_name]:
                     super().error(ErrorType.NAME_ERROR, f"Duplicate functions for {func_name} are not allowed.") 
@@ -170,17 +185,17 @@ class Interpreter(InterpreterBase):
                 return return_val
 
     def __run_assignment(self, statement):
-        symbol = statement.get('name')
+        symbol = statement.name
         # handle objects
         if '.' in symbol:
             self.__run_field_assignment(statement)
             return
-        expr = statement.get('expression')
+        expr = statement.expression
         val = self.__eval_expr(expr)
         self.env.set(symbol, val.value(), val.type())
 
     def __run_field_assignment(self, statement):
-        symbol = statement.get('name')
+        symbol = statement.name
         obj_name, field_name = symbol.split('.')
         # get the value node holding the object
         obj = self.env.get(obj_name)
@@ -190,7 +205,7 @@ class Interpreter(InterpreterBase):
             super().error(ErrorType.TYPE_ERROR, "Attempting to assign a field to a non-object.")
         # get the object node
         obj = obj.value()
-        expr = statement.get('expression')
+        expr = statement.expression
         val = self.__eval_expr(expr)
         if field_name == 'proto':
             if val.type() == 'nil':
@@ -204,9 +219,8 @@ class Interpreter(InterpreterBase):
 
 
     def __run_function(self, statement, obj = None):
-        name = statement.get('name')
-        args = statement.get('args')
-        num_args = len(args)
+        name = statement.name
+        args = statement.args
 
         if name == 'inputi':
             return self.__call_inputi(args)
@@ -215,38 +229,72 @@ class Interpreter(InterpreterBase):
         if name == 'print':
             return self.__call_print(args)
         
+        return self.__run_frame(self.__prepare_function(name, args, obj))
+
+    def __prepare_function(self, name, args, obj = None):
+        num_args = len(args)
         alias = self.env.get(name)
         if alias:
             if alias.type() == 'func':
-                name = alias.value().get('name')
-                num_args = len(alias.value().get('args'))
+                name = alias.value().name
+                num_args = len(alias.value().args)
             elif alias.type() == 'lambda':
-                return self.__run_lambda(alias, args)
+                return self.__prepare_lambda(alias, args)
             else:
                 super().error(ErrorType.TYPE_ERROR, f"Variable is not callable.")
 
         func = self.__get_function(name, num_args)
-        params = func.get('args')
+        params = func.args
         if len(params) != len(args):
             super().error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to function.")
         self.env.push()
         if obj is not None:
             self.env.create('this', obj)
         for p, a in zip(params, args):
-            param_name = p.get('name')
+            param_name = p.name
             if p.elem_type == 'refarg' and a.elem_type == 'var':
                 arg_val = self.__eval_expr(a)
             else:
-                arg_val = deepcopy(self.__eval_expr(a))
+                arg_val = copy_value(self.__eval_expr(a), a.elem_type != 'var')
             self.env.create(param_name, arg_val)
-        return_val = self.__run_statements(func.get('statements'))
-        self.env.pop()
-        return return_val if return_val is not None else Value('nil', None)
-    
+        scope = self.env.pop()
+        memo_key = None
+        if obj is None and id(func) in self.pure:
+            memo_key = self.memo.key(func, scope.values())
+        return Frame(func.statements, scope, memo_key = memo_key)
+
+    def __run_frame(self, frame):
+        # runs calls until one returns something other than a tail call,
+        # each reusing the Python frame of the one before it
+        frame_base = self.frame_base
+        memo_keys = []
+        while True:
+            if frame.memo_key is not None:
+                return_val = self.memo.get(frame.memo_key)
+                if return_val is not None:
+                    break
+                memo_keys.append(frame.memo_key)
+            self.env.push_scope(frame.scope)
+            if frame.obj is not None:
+                self.env.create('this', frame.obj)
+            self.frame_base = len(self.env.env) - 1
+            return_val = self.__run_statements(frame.statements)
+            self.env.pop()
+            if not isinstance(return_val, Frame):
+                break
+            frame = return_val
+        self.frame_base = frame_base
+        if return_val is None:
+            return_val = Value('nil', None)
+        # a tail call's result is also that of every call it replaced
+        for key in memo_keys:
+            self.memo.put(key, return_val)
+        return return_val
+
     def __run_method(self, statement):
-        obj_name = statement.get('objref')
-        method_name = statement.get('name')
-        args = statement.get('args')
+        obj_name = statement.objref
+        method_name = statement.name
+        args = statement.args
 
         obj = self.env.get(obj_name)
         if obj is None:
@@ -255,11 +303,11 @@ class Interpreter(InterpreterBase):
             super().error(ErrorType.TYPE_ERROR, "Attempting to call method from a non-object.")
         obj_node = obj.value()
         
-        method = obj_node.get(method_name)
+        method = self.__inline_cache(statement, method_name).get(obj_node)
         if method is None:
             super().error(ErrorType.NAME_ERROR, "Attempting to call a method that does not exist in an object.")
         if method.type() == 'lambda':
-            if len(args) != len(method.value().func.get('args')):
+            if len(args) != len(method.value().func.args):
                 super().error(ErrorType.NAME_ERROR, "Attempting to call a method with incorrect number of arguments.")
             return self.__run_lambda(method, args, obj)
         if method.type() == 'func':
@@ -268,24 +316,22 @@ class Interpreter(InterpreterBase):
 
 
     def __run_lambda(self, lambda_func, args, obj = None):
+        return self.__run_frame(self.__prepare_lambda(lambda_func, args, obj))
+
+    def __prepare_lambda(self, lambda_func, args, obj = None):
         closure = lambda_func.value().closure
         func = lambda_func.value().func
-        params = func.get('args')
+        params = func.args
         if len(params) != len(args):
             super().error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to lambda function.")
         for p, a in zip(params, args):
-            param_name = p.get('name')
+            param_name = p.name
             if p.elem_type == 'refarg' and a.elem_type == 'var':
                 arg_val = self.__eval_expr(a)
             else:
-                arg_val = deepcopy(self.__eval_expr(a))
-            closure[param_name] = arg_val
-        self.env.push_closure(closure)
-        if obj is not None:
-            self.env.create('this', obj)
-        return_val = self.__run_statements(func.get('statements'))
-        self.env.pop()
-        return return_val if return_val is not None else Value('nil', None)
+                arg_val = copy_value(self.__eval_expr(a), a.elem_type != 'var')
+            self.env.bind(closure, param_name, arg_val)
+        return Frame(func.statements, closure, obj)
     
     def __eval_expr(self, expr):
         elem_type = expr.elem_type
@@ -293,29 +339,19 @@ class Interpreter(InterpreterBase):
         if elem_type == 'nil':
             return Value('nil', None)
         if elem_type == 'bool':
-            return Value('nil', expr.get('val'))
+            return Value('nil', expr.val)
         if elem_type == 'int':
-            return Value('int', expr.get('val'))
+            return Value('int', expr.val)
         if elem_type == 'string':
-            return Value('string', expr.get('val'))
+            return Value('string', expr.val)
         
         if elem_type == 'var':
-            var_name = expr.get('name')
+            var_name = expr.name
 
             if '.' in var_name:
                 obj_name, field_name = var_name.split('.')
                 # get the value node holding the object
-                obj = self.env.get(obj_name)
-                if obj is None or obj.type() != 'object':
-                    super().error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
-                # get the object node:
-                obj = obj.value()
-                # get the particular field of the object:
-                field = obj.get(field_name)
-                if field is None:
-                    super().error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
-                # return the field:
-                return field
+                return self.__read_field(self.env.get(obj_name), expr, field_name)
 
             if var_name in self.functions:
                 if len(self.functions[var_name].keys()) > 1:
@@ -329,63 +365,162 @@ class Interpreter(InterpreterBase):
         
         if elem_type == 'fcall':
             return self.__run_function(expr)
+
+        if elem_type == INLINE_DEF:
+            return self.__run_inline(expr)
+
+        if elem_type == INVARIANT_DEF:
+            val = self.invariants.get(expr.name)
+            if val is None:
+                val = self.invariants[expr.name] = self.__eval_expr(expr.expression)
+            return val
+
+        if elem_type == INLINE_ARG_DEF:
+            val = self.inline_args[expr.index]
+            if expr.field is None:
+                return val
+            return self.__read_field(val, expr, expr.field)
         
         if elem_type == 'mcall':
             return self.__run_method(expr)
 
         if elem_type == 'lambda':
-            return Value('lambda', Lambda(self.env.get_closure(), expr))
+            return Value('lambda', Lambda(self.env.get_closure(self.captures[id(expr)]), expr))
         
         if elem_type == '@':
             return Value('object', Object())
 
         if elem_type == 'neg' or elem_type == '!':
-            op1 = self.__eval_expr(expr.get('op1'))
+            op1 = self.__eval_expr(expr.op1)
             return self.__unary_ops(elem_type, op1.value(), op1.type())
         
+        if (elem_type == '&&' or elem_type == '||') and self.short_circuit:
+            return self.__short_circuit(elem_type, expr)
+
         else:
-            op1 = self.__eval_expr(expr.get('op1'))
-            op2 = self.__eval_expr(expr.get('op2'))
+            op1 = self.__eval_expr(expr.op1)
+            op2 = self.__eval_expr(expr.op2)
+            quick = self.quickened.get(id(expr))
+            if quick is not None and quick[0] == op1.t and quick[1] == op2.t:
+                return quick[2](op1, op2)
+            self.__quicken(expr, op1.t, op2.t, quick)
             return self.__binary_ops(elem_type, op1.value(), op1.type(), op2.value(), op2.type())
         
 
+    def __read_field(self, obj, site, field_name):
+        if obj is None or obj.type() != 'object':
+            super().error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
+        # get the object node:
+        obj = obj.value()
+        # get the particular field of the object:
+        field = self.__inline_cache(site, field_name).get(obj)
+        if field is None:
+            super().error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
+        # return the field:
+        return field
+
+    def __run_inline(self, expr):
+        # a call the optimizer replaced by the callee's return expression; its
+        # body can't make calls, so one set of arguments is live at a time
+        args = [self.__eval_expr(a) for a in expr.args]
+        body = expr.expression
+        if body is None:
+            return Value('nil', None)
+        self.inline_args = args
+        result = self.__eval_expr(body)
+        return copy_value(result, body.elem_type not in ('var', INLINE_ARG_DEF, INVARIANT_DEF))
+
+    def __quicken(self, expr, op1type, op2type, quick):
+        # the first evaluation picks an operation specialized for the operand
+        # types it sees; if the types ever change the generic one is kept
+        if quick is None:
+            op = SPECIALIZED_OPS.get((expr.elem_type, op1type, op2type))
+            if op is not None:
+                self.quickened[id(expr)] = (op1type, op2type, op)
+                return
+        self.quickened[id(expr)] = (None, None, None)
+
+    def __short_circuit(self, op, expr):
+        op1val = self.__to_bool(self.__eval_expr(expr.op1).value())
+        if op1val is None:
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation.")
+        if op1val == (op == '||'):
+            return Value('bool', op1val)
+        op2val = self.__to_bool(self.__eval_expr(expr.op2).value())
+        if op2val is None:
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation.")
+        return Value('bool', op2val)
+
+    def __inline_cache(self, site, symbol):
+        cache = self.inline_caches.get(id(site))
+        if cache is None:
+            cache = self.inline_caches[id(site)] = InlineCache(symbol)
+        return cache
+
     def __run_if(self, statement):
-        condition = self.__eval_expr(statement.get('condition')).value()
+        condition = self.__eval_expr(statement.condition).value()
         condition = self.__to_bool(condition)
         if condition is None:
             super().error(ErrorType.TYPE_ERROR, "Incorrect condition type for 'if' statement.")
-        else_statements = statement.get('else_statements')
+        statements = statement.statements if condition else statement.else_statements
+        if not statements:
+            return None
+        # blocks that create no variables run in the enclosing scope
+        if id(statements) in self.unscoped:
+            return self.__run_statements(statements)
         self.env.push()
-        return_val = None
-        if condition:
-            return_val = self.__run_statements(statement.get('statements'))
-        elif else_statements:
-            return_val = self.__run_statements(else_statements) 
+        return_val = self.__run_statements(statements)
         self.env.pop()
         return return_val
     
     def __run_while(self, statement):
-        condition = self.__eval_expr(statement.get('condition')).value()
-        condition = self.__to_bool(condition)
-        if condition is None:
-            super().error(ErrorType.TYPE_ERROR, "Incorrect condition type for 'while' statement.")
-        return_val = None
-        if condition:
-            self.env.push()
-            return_val = self.__run_statements(statement.get('statements'))
+        # every iteration runs in the same scope dict, emptied in between,
+        # unless the body creates no variables and needs none
+        scope = {}
+        statements = statement.statements
+        scoped = id(statements) not in self.unscoped
+        for name in statement.invariants or ():
+            self.invariants.pop(name, None)
+        while True:
+            condition = self.__eval_expr(statement.condition).value()
+            condition = self.__to_bool(condition)
+            if condition is None:
+                super().error(ErrorType.TYPE_ERROR, "Incorrect condition type for 'while' statement.")
+            if not condition:
+                return None
+            if not scoped:
+                return_val = self.__run_statements(statements)
+                if return_val:
+                    return return_val
+                continue
+            self.env.push_scope(scope)
+            return_val = self.__run_statements(statements)
+            self.env.pop()
             if return_val:
-                self.env.pop()
                 return return_val
-            self.env.pop()
-            self.__run_while(statement)
-        return return_val
+            scope.clear()
 
     def __run_return(self, statement):
-        return_val = statement.get('expression')
+        return_val = statement.expression
         if return_val is None:
             return Value('nil', None)
+        if return_val.elem_type == 'fcall' and self.__can_tail_call(return_val):
+            # the caller's frame is left for __run_frame to replace
+            return self.__prepare_function(return_val.name, return_val.args)
         result = self.__eval_expr(return_val)
-        return deepcopy(result)
+        return copy_value(result, return_val.elem_type not in ('var', INVARIANT_DEF))
+
+    def __can_tail_call(self, call):
+        # dropping the running function's scopes early is only invisible if no
+        # code can look up any name bound in them
+        if self.frame_base is None:
+            return False
+        if call.name in ('inputi', 'inputs', 'print'):
+            return False
+        for scope in self.env.env[self.frame_base:]:
+            if not self.dynamic_names.isdisjoint(scope):
+                return False
+        return True
 
 
     ############################# HELPER FUNCTIONS
@@ -402,6 +537,22 @@ class Interpreter(InterpreterBase):
         return Value('bool', not opval)
 
 
+    ARITHMETIC_OPS = {
+        '-': lambda x, y: x - y,
+        '*': lambda x, y: x * y,
+        '/': lambda x, y: x // y,
+    }
+    LOGICAL_OPS = {
+        '||': lambda x, y: x or y,
+        '&&': lambda x, y: x and y
+    }
+    COMPARISON_OPS = {
+        '<': lambda x, y: x < y,
+        '<=': lambda x, y: x <= y,
+        '>': lambda x, y: x > y,
+        '>=': lambda x, y: x >= y,
+    }
+
     def __binary_ops(self, op, op1val, op1type, op2val, op2type):
         if op == '+':
             if op1type == 'string' and op2type == 'string':
@@ -416,12 +567,7 @@ class Interpreter(InterpreterBase):
             op2val = self.__to_int(op2val)
             if op1val is None or op2val is None:
                 super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{op}' operation.")
-            dict = {
-                '-': lambda x, y: x - y,
-                '*': lambda x, y: x * y,
-                '/': lambda x, y: x // y,
-            }
-            return Value('int', dict[op](op1val, op2val))
+            return Value('int', self.ARITHMETIC_OPS[op](op1val, op2val))
         if op == '==':
             if op1type == op2type:
                 return Value('bool', op1val == op2val)
@@ -443,21 +589,11 @@ class Interpreter(InterpreterBase):
             op2val = self.__to_bool(op2val)
             if op1val is None or op2val is None:
                 super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation.")
-            dict = {
-                '||': lambda x, y: x or y,
-                '&&': lambda x, y: x and y
-            }
-            return Value('bool', dict[op](op1val, op2val))
+            return Value('bool', self.LOGICAL_OPS[op](op1val, op2val))
         # comparison operators
         if op1type != 'int' or op2type != 'int':
             super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{op}' operation.")
-        dict = {
-            '<': lambda x, y: x < y,
-            '<=': lambda x, y: x <= y,
-            '>': lambda x, y: x > y,
-            '>=': lambda x, y: x >= y,
-        }
-        return Value('bool', dict[op](op1val, op2val))
+        return Value('bool', self.COMPARISON_OPS[op](op1val, op2val))
             
     def __call_inputi(self, args):
         if len(args) > 1:
@@ -0,0 +1,582 @@
+from copy import deepcopy
+
+from intbase import InterpreterBase
+from element import Element, INLINE_DEF, INLINE_ARG_DEF, INVARIANT_DEF
+from runtime import to_bool, to_int
+from analysis import bound_names, has_ref_params
+
+# AST-to-AST optimization passes, run on the parsed program before any engine
+# sees it. Every pass must leave the program's output and errors unchanged.
+
+LITERALS = (InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.NIL_DEF)
+EXECUTED = ('=', InterpreterBase.FCALL_DEF, InterpreterBase.MCALL_DEF, InterpreterBase.IF_DEF,
+            InterpreterBase.WHILE_DEF, InterpreterBase.RETURN_DEF)
+
+
+def literal_value(node):
+    # the (type, value) a literal evaluates to; true and false are nil-typed
+    if node.elem_type == InterpreterBase.INT_DEF:
+        return 'int', node.get('val')
+    if node.elem_type == InterpreterBase.STRING_DEF:
+        return 'string', node.get('val')
+    if node.elem_type == InterpreterBase.BOOL_DEF:
+        return 'nil', node.get('val')
+    return 'nil', None
+
+
+def literal(t, val, boolean):
+    # a literal evaluating to Value(t, val), or None if there is none; a
+    # bool-typed result only has one where just its truth value matters
+    if t == 'int':
+        return Element(InterpreterBase.INT_DEF, val=val)
+    if t == 'string':
+        return Element(InterpreterBase.STRING_DEF, val=val)
+    if t == 'bool' and boolean:
+        return Element(InterpreterBase.BOOL_DEF, val=val)
+    return None
+
+
+def fold(op, a, b):
+    # the (type, value) of a binary operation on two constants, or None if
+    # it would report an error, which is left for run time
+    (ta, x), (tb, y) = a, b
+    if op == '+' and ta == 'string' and tb == 'string':
+        return 'string', x + y
+    if op in ('+', '-', '*', '/'):
+        x = to_int(x)
+        y = to_int(y)
+        if x is None or y is None or (op == '/' and y == 0):
+            return None
+        return 'int', {'+': x + y, '-': x - y, '*': x * y, '/': x // y if y else 0}[op]
+    if op == '==' or op == '!=':
+        if ta == tb:
+            result = x == y
+        else:
+            x = to_bool(x)
+            y = to_bool(y)
+            result = x == y if x is not None and y is not None else False
+        return 'bool', result if op == '==' else not result
+    if op == '&&' or op == '||':
+        x = to_bool(x)
+        y = to_bool(y)
+        if x is None or y is None:
+            return None
+        return 'bool', (x and y) if op == '&&' else (x or y)
+    if ta != 'int' or tb != 'int':
+        return None
+    return 'bool', {'<': x < y, '<=': x <= y, '>': x > y, '>=': x >= y}[op]
+
+
+def truth(node):
+    # the truth value of a constant condition, or None
+    if node.elem_type != InterpreterBase.INT_DEF and node.elem_type != InterpreterBase.BOOL_DEF:
+        return None
+    return to_bool(node.get('val'))
+
+
+def always_returns(statements):
+    for s in statements or []:
+        if s.elem_type == InterpreterBase.RETURN_DEF:
+            return True
+        if s.elem_type == InterpreterBase.IF_DEF:
+            if truth(s.get('condition')) is True and always_returns(s.get('statements')):
+                return True
+            if always_returns(s.get('statements')) and always_returns(s.get('else_statements')):
+                return True
+    return False
+
+
+class Pass:
+    """
+    One optimization. run() rewrites the program in place and returns
+    whether it changed anything, so the pipeline knows when to stop.
+    """
+    name = None
+
+    def run(self, ast):
+        self.changed = False
+        for func in ast.get('functions'):
+            self.body(func)
+        return self.changed
+
+    def body(self, func):
+        func.dict['statements'] = self.block(func.get('statements'))
+
+    def block(self, statements):
+        for s in statements:
+            self.statement(s)
+        return statements
+
+    def statement(self, s):
+        kind = s.elem_type
+        if kind == '=':
+            s.dict['expression'] = self.expr(s.get('expression'), False)
+        elif kind == InterpreterBase.IF_DEF or kind == InterpreterBase.WHILE_DEF:
+            s.dict['condition'] = self.expr(s.get('condition'), True)
+            s.dict['statements'] = self.block(s.get('statements'))
+            if s.get('else_statements') is not None:
+                s.dict['else_statements'] = self.block(s.get('else_statements'))
+        elif kind == InterpreterBase.RETURN_DEF:
+            if s.get('expression') is not None:
+                s.dict['expression'] = self.expr(s.get('expression'), False)
+        elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            self.expr(s, False)
+
+    def expr(self, node, boolean):
+        # returns the node to use instead; boolean is set where only the
+        # truth value of the result matters
+        kind = node.elem_type
+        if kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            node.dict['args'] = [self.expr(a, False) for a in node.get('args')]
+        elif kind == INLINE_DEF:
+            node.dict['args'] = [self.expr(a, False) for a in node.get('args')]
+            if node.get('expression') is not None:
+                node.dict['expression'] = self.expr(node.get('expression'), False)
+        elif kind == INVARIANT_DEF:
+            node.dict['expression'] = self.expr(node.get('expression'), False)
+        elif kind == InterpreterBase.LAMBDA_DEF:
+            self.body(node)
+        elif kind == InterpreterBase.NEG_DEF:
+            node.dict['op1'] = self.expr(node.get('op1'), False)
+        elif kind == InterpreterBase.NOT_DEF:
+            node.dict['op1'] = self.expr(node.get('op1'), True)
+        elif node.get('op2') is not None:
+            logical = kind == '&&' or kind == '||'
+            node.dict['op1'] = self.expr(node.get('op1'), logical)
+            node.dict['op2'] = self.expr(node.get('op2'), logical)
+        return node
+
+
+class Inliner(Pass):
+    """
+    Replaces calls of small functions whose body is a single 'return' of an
+    expression without calls or lambdas by that expression, reading the
+    parameters straight from the evaluated arguments (an INLINE_DEF node).
+    Such a body assigns nothing and lets nothing see its scope, so neither
+    the scope nor copies of the arguments are needed, and the result is
+    copied just like a returned value. The copies could only be told apart
+    from the arguments by comparing a parameter with '==' or '!=', so such
+    functions are not inlined. A call is only inlined if no variable
+    can stand in for the function (the program never binds its name) and
+    none of its arguments after the first, which would run with earlier
+    parameters in scope, reads one of them or makes calls. Calls that are
+    statements are left alone, since only calls are run as statements.
+    """
+    name = 'inline'
+
+    MAX_SIZE = 16  # nodes in the inlined expression
+
+    def run(self, ast):
+        self.changed = False
+        bound = bound_names(ast)
+        function_names = {func.get('name') for func in ast.get('functions')}
+        self.candidates = {}
+        for func in ast.get('functions'):
+            name = func.get('name')
+            params = [p.get('name') for p in func.get('args')]
+            statements = func.get('statements')
+            if name in bound or name in ('print', 'inputi', 'inputs') or set(params) & function_names:
+                continue
+            if len(statements) != 1 or statements[0].elem_type != InterpreterBase.RETURN_DEF:
+                continue
+            expr = statements[0].get('expression')
+            if expr is None or (self.inlinable(expr, self.MAX_SIZE) is not None
+                                and not self.compares(expr, params)):
+                self.candidates[(name, len(params))] = (params, expr)
+        if self.candidates:
+            for func in ast.get('functions'):
+                self.body(func)
+        return self.changed
+
+    def inlinable(self, expr, budget):
+        # the budget left after expr, or None if expr is too big or has a
+        # node that can't be inlined
+        budget -= 1
+        if budget < 0:
+            return None
+        kind = expr.elem_type
+        if kind in LITERALS or kind == InterpreterBase.VAR_DEF or kind == InterpreterBase.OBJ_DEF:
+            return budget
+        if kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            return self.inlinable(expr.get('op1'), budget)
+        if kind in (InterpreterBase.FCALL_DEF, InterpreterBase.MCALL_DEF, InterpreterBase.LAMBDA_DEF,
+                    INLINE_DEF, INLINE_ARG_DEF) or expr.get('op2') is None:
+            return None
+        budget = self.inlinable(expr.get('op1'), budget)
+        return self.inlinable(expr.get('op2'), budget) if budget is not None else None
+
+    def compares(self, expr, params):
+        # whether expr compares a parameter, or a field of one, for equality
+        if expr.get('op2') is None:
+            return expr.get('op1') is not None and self.compares(expr.get('op1'), params)
+        if expr.elem_type == '==' or expr.elem_type == '!=':
+            for operand in (expr.get('op1'), expr.get('op2')):
+                if operand.elem_type == InterpreterBase.VAR_DEF and operand.get('name').split('.')[0] in params:
+                    return True
+        return self.compares(expr.get('op1'), params) or self.compares(expr.get('op2'), params)
+
+    def reads(self, expr, names):
+        # whether expr makes calls, creates lambdas or reads one of names
+        if isinstance(expr, list):
+            return any(self.reads(e, names) for e in expr)
+        if not hasattr(expr, 'elem_type'):
+            return False
+        kind = expr.elem_type
+        if kind in (InterpreterBase.FCALL_DEF, InterpreterBase.MCALL_DEF, InterpreterBase.LAMBDA_DEF):
+            return True
+        if kind == InterpreterBase.VAR_DEF and expr.get('name').split('.')[0] in names:
+            return True
+        return any(self.reads(value, names) for value in expr.dict.values())
+
+    def substitute(self, expr, params):
+        # a copy of expr reading the parameters from the inlined call's arguments
+        if expr.elem_type == InterpreterBase.VAR_DEF:
+            name, _, field = expr.get('name').partition('.')
+            if name in params:
+                return Element(INLINE_ARG_DEF, index=params.index(name), field=field or None)
+            return deepcopy(expr)
+        copy = Element(expr.elem_type, **expr.dict)
+        for key in ('op1', 'op2'):
+            if copy.get(key) is not None:
+                copy.dict[key] = self.substitute(copy.get(key), params)
+        return copy
+
+    def statement(self, s):
+        if s.elem_type == InterpreterBase.FCALL_DEF or s.elem_type == InterpreterBase.MCALL_DEF:
+            # the call itself stays, only its arguments can be inlined
+            super().expr(s, False)
+        else:
+            super().statement(s)
+
+    def expr(self, node, boolean):
+        node = super().expr(node, boolean)
+        if node.elem_type != InterpreterBase.FCALL_DEF:
+            return node
+        args = node.get('args')
+        candidate = self.candidates.get((node.get('name'), len(args)))
+        if candidate is None:
+            return node
+        params, body = candidate
+        for i, a in enumerate(args[1:], 1):
+            if self.reads(a, params[:i]):
+                return node
+        self.changed = True
+        body = self.substitute(body, params) if body is not None else None
+        return Element(INLINE_DEF, name=node.get('name'), args=args, expression=body)
+
+
+class ConstantFolding(Pass):
+    """Evaluates operators whose operands are literals."""
+    name = 'fold'
+
+    def expr(self, node, boolean):
+        node = super().expr(node, boolean)
+        kind = node.elem_type
+        result = None
+        if kind == InterpreterBase.NEG_DEF:
+            if node.get('op1').elem_type == InterpreterBase.INT_DEF:
+                result = 'int', -node.get('op1').get('val')
+        elif kind == InterpreterBase.NOT_DEF:
+            if node.get('op1').elem_type in LITERALS:
+                x = to_bool(literal_value(node.get('op1'))[1])
+                if x is not None:
+                    result = 'bool', not x
+        elif node.get('op2') is not None and kind not in (InterpreterBase.FCALL_DEF, InterpreterBase.MCALL_DEF):
+            if node.get('op1').elem_type in LITERALS and node.get('op2').elem_type in LITERALS:
+                result = fold(kind, literal_value(node.get('op1')), literal_value(node.get('op2')))
+        if result is None:
+            return node
+        folded = literal(result[0], result[1], boolean)
+        if folded is None:
+            return node
+        self.changed = True
+        return folded
+
+
+class ConstantPropagation(Pass):
+    """
+    Replaces reads of a variable by the literal it holds. With dynamic
+    scoping any function may see any variable, so this only applies to a
+    variable the whole program assigns exactly once, from a literal, and
+    never binds as a parameter, passes as an argument (a ref parameter would
+    share its box) or shadows with a function. Every box of that name then
+    holds the literal; only reads that follow the assignment in its own body
+    are replaced, since earlier ones would fail to find it.
+    """
+    name = 'propagate'
+
+    def run(self, ast):
+        self.changed = False
+        assignments = {}
+        excluded = {func.get('name') for func in ast.get('functions')}
+
+        def visit(node):
+            if isinstance(node, list):
+                for n in node:
+                    visit(n)
+                return
+            if not hasattr(node, 'elem_type'):
+                return
+            kind = node.elem_type
+            if kind == '=':
+                assignments.setdefault(node.get('name'), []).append(node)
+            elif kind == InterpreterBase.FUNC_DEF or kind == InterpreterBase.LAMBDA_DEF:
+                excluded.update(p.get('name') for p in node.get('args'))
+            elif kind == InterpreterBase.MCALL_DEF or (kind == InterpreterBase.FCALL_DEF
+                                                        and node.get('name') not in ('print', 'inputi', 'inputs')):
+                excluded.update(a.get('name') for a in node.get('args') if a.elem_type == InterpreterBase.VAR_DEF)
+            for value in node.dict.values():
+                visit(value)
+
+        visit(ast.get('functions'))
+        self.constants = {}
+        for name, nodes in assignments.items():
+            if len(nodes) == 1 and name not in excluded and '.' not in name \
+                    and nodes[0].get('expression').elem_type in LITERALS:
+                self.constants[id(nodes[0])] = name
+        if self.constants:
+            for func in ast.get('functions'):
+                self.body(func)
+        return self.changed
+
+    def body(self, func):
+        self.known = {}  # constant name -> its literal, once assigned
+        self.depth = 0
+        super().body(func)
+
+    def block(self, statements):
+        # only a body's own top-level assignments count, which the rest of
+        # the body always follows
+        top = self.depth == 0
+        self.depth += 1
+        for s in statements:
+            self.statement(s)
+            if top and s.elem_type == '=' and id(s) in self.constants:
+                self.known[self.constants[id(s)]] = s.get('expression')
+        self.depth -= 1
+        return statements
+
+    def expr(self, node, boolean):
+        if node.elem_type == InterpreterBase.LAMBDA_DEF:
+            # the lambda's body runs in a frame of its own
+            known, depth = self.known, self.depth
+            self.body(node)
+            self.known, self.depth = known, depth
+            return node
+        if node.elem_type == InterpreterBase.VAR_DEF and node.get('name') in self.known:
+            self.changed = True
+            value = self.known[node.get('name')]
+            return Element(value.elem_type, **value.dict)
+        return super().expr(node, boolean)
+
+
+class DeadBranchElimination(Pass):
+    """
+    Drops the branch of an 'if' that a constant condition never takes, and
+    loops whose condition is constantly false. The branch that is taken
+    stays in its 'if', which gives it its block scope.
+    """
+    name = 'branches'
+
+    def block(self, statements):
+        result = []
+        for s in statements:
+            self.statement(s)
+            kind = s.elem_type
+            if kind == InterpreterBase.IF_DEF:
+                taken = truth(s.get('condition'))
+                live = s.get('statements') if taken else s.get('else_statements')
+                if taken is not None and not live:
+                    self.changed = True
+                    continue
+                if taken is False or (taken and s.get('else_statements') is not None):
+                    self.changed = True
+                    s = Element(InterpreterBase.IF_DEF, condition=Element(InterpreterBase.BOOL_DEF, val=True),
+                                statements=live, else_statements=None)
+            elif kind == InterpreterBase.WHILE_DEF and truth(s.get('condition')) is False:
+                self.changed = True
+                continue
+            result.append(s)
+        return result
+
+
+class UnreachableCodeElimination(Pass):
+    """
+    Drops statements that can never run: those after a statement that
+    always returns, and expression statements, which are never evaluated.
+    """
+    name = 'unreachable'
+
+    def block(self, statements):
+        result = []
+        for s in statements:
+            if s.elem_type not in EXECUTED:
+                self.changed = True
+                continue
+            self.statement(s)
+            result.append(s)
+            if always_returns([s]):
+                break
+        if len(result) < len(statements):
+            self.changed = True
+        return result
+
+
+class LoopInvariantCodeMotion(Pass):
+    """
+    Evaluates expressions that can't change while a loop runs once per run of
+    the loop instead of once per iteration: each is wrapped in an
+    INVARIANT_DEF that keeps its first value until the loop starts again.
+    Since the first evaluation stays where it was, an expression that fails,
+    or that a short-circuit or a loop that never iterates skips, behaves
+    as before. Any call may reassign any variable through dynamic scoping,
+    so only loops without calls are considered, and in them expressions
+    made of operators, literals and variables the loop never assigns. A
+    field read also needs the loop to assign no field of that name and no
+    prototype, on any object, since any object may be the one read. In a
+    program with ref parameters any two names may share a box, so there
+    reading a variable also needs the loop to assign no variable at all.
+    Each expression is moved to the outermost loop it is invariant in.
+    """
+    name = 'licm'
+
+    def run(self, ast):
+        self.changed = False
+        self.count = self.first_free(ast)
+        self.aliasing = has_ref_params(ast)
+        self.loops = []  # (names assigned, field names assigned, new invariants) of the enclosing loops
+        self.kept = set()  # names of the invariants still in the program
+        for func in ast.get('functions'):
+            self.body(func)
+        return self.changed
+
+    def first_free(self, ast):
+        # the lowest number no invariant in the program is named after yet
+        numbers = [-1]
+
+        def visit(node):
+            if isinstance(node, list):
+                for n in node:
+                    visit(n)
+                return
+            if not hasattr(node, 'elem_type'):
+                return
+            if node.elem_type == INVARIANT_DEF:
+                numbers.append(int(node.get('name')[len('$licm'):]))
+            for value in node.dict.values():
+                visit(value)
+
+        visit(ast.get('functions'))
+        return max(numbers) + 1
+
+    def effects(self, node, assigned, fields):
+        # collects the names and field names node assigns; False if it makes calls
+        if isinstance(node, list):
+            return all(self.effects(n, assigned, fields) for n in node)
+        if not hasattr(node, 'elem_type') or node.elem_type == InterpreterBase.LAMBDA_DEF:
+            return True
+        kind = node.elem_type
+        if kind == InterpreterBase.MCALL_DEF or (kind == InterpreterBase.FCALL_DEF
+                                                  and node.get('name') not in ('print', 'inputi', 'inputs')):
+            return False
+        if kind == '=':
+            name, _, field = node.get('name').partition('.')
+            if field:
+                fields.add(field)
+            else:
+                assigned.add(name)
+        return all(self.effects(value, assigned, fields) for value in node.dict.values())
+
+    def invariant(self, node, assigned, fields):
+        kind = node.elem_type
+        if kind in LITERALS:
+            return True
+        if kind == InterpreterBase.VAR_DEF:
+            name, _, field = node.get('name').partition('.')
+            if field and (field in fields or 'proto' in fields):
+                return False
+            return not assigned if self.aliasing else name not in assigned
+        if kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            return self.invariant(node.get('op1'), assigned, fields)
+        if kind in (InterpreterBase.FCALL_DEF, InterpreterBase.MCALL_DEF, INLINE_DEF, INLINE_ARG_DEF,
+                    INVARIANT_DEF) or node.get('op2') is None:
+            return False
+        return self.invariant(node.get('op1'), assigned, fields) and self.invariant(node.get('op2'), assigned, fields)
+
+    def statement(self, s):
+        if s.elem_type != InterpreterBase.WHILE_DEF:
+            return super().statement(s)
+        assigned, fields = set(), set()
+        if self.effects([s.get('condition'), s.get('statements')], assigned, fields):
+            self.loops.append((assigned, fields, []))
+        else:
+            self.loops.append(None)
+        super().statement(s)
+        loop = self.loops.pop()
+        invariants = [name for name in s.get('invariants') or () if name in self.kept]
+        if loop is not None and loop[2]:
+            self.changed = True
+            invariants += loop[2]
+        if invariants or s.get('invariants') is not None:
+            s.dict['invariants'] = invariants
+
+    def expr(self, node, boolean):
+        kind = node.elem_type
+        if kind == InterpreterBase.LAMBDA_DEF:
+            # the lambda's body runs whenever it is called, not in the loop
+            loops, self.loops = self.loops, []
+            self.body(node)
+            self.loops = loops
+            return node
+        # a lone variable or literal is no cheaper to keep than to evaluate
+        worth = node.get('op1') is not None or (kind == InterpreterBase.VAR_DEF and '.' in node.get('name'))
+        if worth:
+            for loop in self.loops:
+                if loop is not None and self.invariant(node, loop[0], loop[1]):
+                    name = f'$licm{self.count}'
+                    self.count += 1
+                    loop[2].append(name)
+                    self.kept.add(name)
+                    return Element(INVARIANT_DEF, name=name, expression=node)
+        if kind == INVARIANT_DEF:
+            if node.get('expression').elem_type in LITERALS:
+                # folded since it was moved
+                self.changed = True
+                return node.get('expression')
+            self.kept.add(node.get('name'))
+            return node
+        return super().expr(node, boolean)
+
+
+PASSES = {p.name: p for p in (Inliner, ConstantFolding, ConstantPropagation, DeadBranchElimination,
+                               UnreachableCodeElimination, LoopInvariantCodeMotion)}
+DEFAULT_PASSES = ('inline', 'fold', 'propagate', 'branches', 'unreachable', 'licm')
+
+
+class PassManager:
+    """
+    Runs a pipeline of passes, named as in PASSES, over a parsed program. One
+    pass can enable another (propagating a constant lets it be folded), so
+    the pipeline is repeated until nothing changes, at most max_rounds times.
+    """
+
+    def __init__(self, passes=DEFAULT_PASSES, max_rounds=4):
+        for name in passes:
+            if name not in PASSES:
+                raise ValueError(f"Unknown optimization pass '{name}', expected one of {', '.join(PASSES)}.")
+        self.passes = [PASSES[name]() for name in passes]
+        self.max_rounds = max_rounds
+
+    def run(self, ast):
+        if self.passes:
+            # printing a function value shows the function as written
+            for func in ast.get('functions'):
+                if func.get('original') is None:
+                    func.original = deepcopy(func)
+        for _ in range(self.max_rounds):
+            changed = False
+            for p in self.passes:
+                changed = p.run(ast) or changed
+            if not changed:
+                break
+        return ast
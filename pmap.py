@@ -0,0 +1,140 @@
+"""
+Persistent hash map: a hash array mapped trie (HAMT) whose updates return a
+new map sharing every node off the changed path with the old one. Copies are
+therefore free and an update costs O(log32 n).
+"""
+
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_BITS = 64
+
+
+class _Node:
+    # children are (key, value) pairs or nested nodes, in bitmap order
+    __slots__ = ('bitmap', 'children')
+
+    def __init__(self, bitmap, children):
+        self.bitmap = bitmap
+        self.children = children
+
+
+class _Collision:
+    # keys whose hashes are equal in all HASH_BITS bits
+    __slots__ = ('hash', 'pairs')
+
+    def __init__(self, hash, pairs):
+        self.hash = hash
+        self.pairs = pairs
+
+
+_EMPTY = _Node(0, ())
+
+
+def _pair_node(shift, pair1, hash1, pair2, hash2):
+    # the smallest subtree holding two pairs whose keys differ
+    if shift >= HASH_BITS:
+        return _Collision(hash1, (pair1, pair2))
+    bit1 = 1 << ((hash1 >> shift) & MASK)
+    bit2 = 1 << ((hash2 >> shift) & MASK)
+    if bit1 == bit2:
+        return _Node(bit1, (_pair_node(shift + BITS, pair1, hash1, pair2, hash2),))
+    if bit1 < bit2:
+        return _Node(bit1 | bit2, (pair1, pair2))
+    return _Node(bit1 | bit2, (pair2, pair1))
+
+
+def _set(node, shift, hash, key, value):
+    # returns the updated copy of node and whether key was added
+    if type(node) is _Collision:
+        pairs = [p for p in node.pairs if p[0] != key]
+        added = len(pairs) == len(node.pairs)
+        return _Collision(hash, tuple(pairs) + ((key, value),)), added
+    bit = 1 << ((hash >> shift) & MASK)
+    index = (node.bitmap & (bit - 1)).bit_count()
+    children = node.children
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, children[:index] + ((key, value),) + children[index:]), True
+    child = children[index]
+    if type(child) is tuple:
+        if child[0] == key:
+            if child[1] is value:
+                return node, False
+            new_child, added = (key, value), False
+        else:
+            new_child = _pair_node(shift + BITS, child, _hash(child[0]), (key, value), hash)
+            added = True
+    else:
+        new_child, added = _set(child, shift + BITS, hash, key, value)
+    return _Node(node.bitmap, children[:index] + (new_child,) + children[index + 1:]), added
+
+
+def _hash(key):
+    return hash(key) & ((1 << HASH_BITS) - 1)
+
+
+def _items(node):
+    if type(node) is _Collision:
+        yield from node.pairs
+        return
+    for child in node.children:
+        if type(child) is tuple:
+            yield child
+        else:
+            yield from _items(child)
+
+
+class PMap:
+    __slots__ = ('root', 'count')
+
+    def __init__(self, root=_EMPTY, count=0):
+        self.root = root
+        self.count = count
+
+    def get(self, key, default=None):
+        hash = _hash(key)
+        node = self.root
+        shift = 0
+        while True:
+            if type(node) is _Collision:
+                for k, v in node.pairs:
+                    if k == key:
+                        return v
+                return default
+            bit = 1 << ((hash >> shift) & MASK)
+            if not node.bitmap & bit:
+                return default
+            child = node.children[(node.bitmap & (bit - 1)).bit_count()]
+            if type(child) is tuple:
+                return child[1] if child[0] == key else default
+            node = child
+            shift += BITS
+
+    def set(self, key, value):
+        """A copy of the map with key bound to value."""
+        root, added = _set(self.root, 0, _hash(key), key, value)
+        if root is self.root:
+            return self
+        return PMap(root, self.count + 1 if added else self.count)
+
+    def update(self, items):
+        result = self
+        for key, value in items:
+            result = result.set(key, value)
+        return result
+
+    def __contains__(self, key):
+        sentinel = _EMPTY
+        return self.get(key, sentinel) is not sentinel
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for key, _ in _items(self.root):
+            yield key
+
+    def items(self):
+        return _items(self.root)
+
+    def __repr__(self):
+        return f"PMap({dict(self.items())!r})"
@@ -0,0 +1,458 @@
+import sys
+from collections import OrderedDict
+from copy import deepcopy
+from pmap import PMap
+from element import Element
+
+
+# types whose values are immutable Python objects, so a copy of their box is
+# as good as a deep copy
+PRIMITIVES = frozenset(('int', 'string', 'bool', 'nil'))
+
+
+def copy_value(val, fresh=False):
+    # the copy passed or returned by value; fresh is set when val is a new
+    # box no variable holds, and such a primitive is passed as is
+    if val.t in PRIMITIVES:
+        return val if fresh else Value(val.t, val.v)
+    return deepcopy(val)
+
+
+def _specialized_ops():
+    ops = {
+        ('+', 'int', 'int'): lambda a, b: Value('int', a.v + b.v),
+        ('+', 'string', 'string'): lambda a, b: Value('string', a.v + b.v),
+        ('-', 'int', 'int'): lambda a, b: Value('int', a.v - b.v),
+        ('*', 'int', 'int'): lambda a, b: Value('int', a.v * b.v),
+        ('/', 'int', 'int'): lambda a, b: Value('int', a.v // b.v),
+        ('<', 'int', 'int'): lambda a, b: Value('bool', a.v < b.v),
+        ('<=', 'int', 'int'): lambda a, b: Value('bool', a.v <= b.v),
+        ('>', 'int', 'int'): lambda a, b: Value('bool', a.v > b.v),
+        ('>=', 'int', 'int'): lambda a, b: Value('bool', a.v >= b.v),
+        ('&&', 'bool', 'bool'): lambda a, b: Value('bool', a.v and b.v),
+        ('||', 'bool', 'bool'): lambda a, b: Value('bool', a.v or b.v),
+    }
+    for t in PRIMITIVES:
+        ops[('==', t, t)] = lambda a, b: Value('bool', a.v == b.v)
+        ops[('!=', t, t)] = lambda a, b: Value('bool', a.v != b.v)
+    return ops
+
+
+# binary operations specialized for operand types: (operator, left type,
+# right type) -> function of the two operand Values, valid only for those types
+SPECIALIZED_OPS = _specialized_ops()
+
+
+def to_bool(val):
+    if isinstance(val, int):
+        return False if val == 0 else True
+    if isinstance(val, bool):
+        return val
+    return None
+
+
+def to_int(val):
+    if isinstance(val, bool):
+        return 1 if val else 0
+    if isinstance(val, int):
+        return val
+    return None
+
+
+class Environment:
+    """
+    Dynamic scopes: a stack of scope dicts, innermost last. Next to the stack
+    it keeps a persistent map (see pmap.py) from every visible name to its
+    innermost box, so a lookup costs the same at any depth and the map as of
+    any point can be kept for free. Popping a scope restores the map saved
+    when it was pushed.
+    """
+
+    def __init__(self):
+        self.env = [{}]
+        self.view = PMap()   # visible name -> box, for the whole stack
+        self.views = []      # views[i]: the view of self.env[0..i], saved when env[i + 1] was pushed
+        self.pushed = {}     # id(scope pushed as a dict) -> its indices in self.env
+
+    def get(self, symbol):
+        return self.view.get(symbol)
+
+    def set(self, symbol, value, type):
+        box = self.view.get(symbol)
+        if box is not None:
+            box.set_value(value)
+            box.set_type(type)
+            return
+        self.create(symbol, Value(type, value))
+
+    def create(self, symbol, box):
+        scope = self.env[-1]
+        if id(scope) in self.pushed:
+            # a lambda's closure may also be lower on the stack
+            self.bind(scope, symbol, box)
+            return
+        scope[symbol] = box
+        self.view = self.view.set(symbol, box)
+
+    def push(self):
+        self.views.append(self.view)
+        self.env.append({})
+
+    def push_scope(self, scope):
+        # push an existing scope: a loop's emptied scope, a bound call frame
+        # or a lambda's closure
+        self.views.append(self.view)
+        self.env.append(scope)
+        self.pushed.setdefault(id(scope), []).append(len(self.env) - 1)
+        if scope:
+            self.view = self.view.update(scope.items())
+
+    def push_closure(self, closure):
+        self.push_scope(closure)
+
+    def pop(self):
+        scope = self.env.pop()
+        self.view = self.views.pop()
+        indices = self.pushed.get(id(scope))
+        if indices is not None and indices[-1] == len(self.env):
+            indices.pop()
+            if not indices:
+                del self.pushed[id(scope)]
+        return scope
+
+    def bind(self, scope, symbol, box):
+        # bind a name in a lambda's closure; if a recursive call already has
+        # the closure on the stack, the views above it see the new box
+        scope[symbol] = box
+        indices = self.pushed.get(id(scope))
+        if indices is None:
+            return
+        top = len(self.env) - 1
+        visible = box
+        for i in range(indices[0], top + 1):
+            if symbol in self.env[i]:
+                visible = self.env[i][symbol]
+            if i < top:
+                self.views[i] = self.views[i].set(symbol, visible)
+            else:
+                self.view = self.view.set(symbol, visible)
+
+    def get_closure(self, names):
+        # capture the names a lambda can look up (see analysis.lambda_captures)
+        view = self.view
+        closure = {}
+        for name in names:
+            value = view.get(name)
+            if value is None:
+                continue
+            if value.type() == 'object' or value.type() == 'lambda':
+                closure[name] = value
+            else:
+                closure[name] = value.copy()
+        return closure
+
+
+class Value:
+    __slots__ = ('t', 'v')
+
+    def __init__(self, type, value):
+        self.t = type
+        self.v = value
+
+    def value(self):
+        return self.v
+    
+    def set_value(self, value):
+        self.v = value
+    
+    def type(self):
+        return self.t
+    
+    def set_type(self, type):
+        self.t = type
+
+    def copy(self):
+        return copy_value(self)
+
+    def __repr__(self):
+        return f"Value({self.t!r}, {self.v!r})"
+
+class Lambda:
+    def __init__(self, closure, func):
+        self.closure = closure
+        self.func = func
+
+    def __deepcopy__(self, memo):
+        # the lambda's AST is never mutated, so copies can share it
+        return Lambda(deepcopy(self.closure, memo), self.func)
+
+class Shape:
+    """
+    Hidden class: the field names of every object that got the same fields in
+    the same order, and the slot each one is stored in. Shapes form a tree
+    from the empty shape, one transition per added field, so objects built
+    alike share one.
+    """
+    __slots__ = ('index', 'transitions')
+
+    def __init__(self, index):
+        self.index = index      # field name -> slot
+        self.transitions = {}   # field name -> shape with that field added
+
+    def with_field(self, symbol):
+        shape = self.transitions.get(symbol)
+        if shape is None:
+            index = dict(self.index)
+            index[symbol] = len(index)
+            shape = Shape(index)
+            self.transitions[symbol] = shape
+        return shape
+
+
+EMPTY_SHAPE = Shape({})
+
+
+class Object:
+    __slots__ = ('shape', 'slots', 'proto', 'is_proto')
+
+    # bumped whenever a prototype link is set or an object serving as a
+    # prototype gains a field, which may change where an inherited field is
+    epoch = 0
+
+    def __init__(self):
+        self.shape = EMPTY_SHAPE
+        self.slots = []  # field boxes, in the order of self.shape.index
+        self.proto = None
+        self.is_proto = False
+
+    def __deepcopy__(self, memo):
+        # copies share the shape, which is never mutated
+        copy = Object.__new__(Object)
+        memo[id(self)] = copy
+        copy.shape = self.shape
+        copy.slots = deepcopy(self.slots, memo)
+        copy.proto = deepcopy(self.proto, memo)
+        copy.is_proto = self.is_proto
+        return copy
+
+    def get(self, symbol):
+        if symbol == 'proto':
+            if self.proto is not None:
+                return self.proto
+            else:
+                return None
+        slot = self.shape.index.get(symbol)
+        if slot is not None:
+            return self.slots[slot]
+        prototype = self.proto
+        while prototype is not None:
+            slot = prototype.shape.index.get(symbol)
+            if slot is not None:
+                return prototype.slots[slot]
+            prototype = prototype.proto
+        return None
+    
+    def set(self, symbol, type, value):
+        slot = self.shape.index.get(symbol)
+        if slot is None:
+            self.shape = self.shape.with_field(symbol)
+            self.slots.append(Value(type, value))
+            if self.is_proto:
+                Object.epoch += 1
+        else:
+            self.slots[slot] = Value(type, value)
+
+    def get_fields(self):
+        return {symbol: self.slots[slot] for symbol, slot in self.shape.index.items()}
+
+    def set_proto(self, proto):
+        self.proto = proto
+        proto.is_proto = True
+        Object.epoch += 1
+
+
+class InlineCache:
+    """
+    Remembers where lookups of one field at one field-read or method-call
+    site resolved, for up to MAX_ENTRIES receiver shapes. A field of the
+    receiver itself stays valid as long as the shape does; an inherited one
+    also needs the same prototype and no change to any prototype since.
+    """
+    __slots__ = ('symbol', 'entries')
+
+    MAX_ENTRIES = 4
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.entries = []  # (shape, proto, epoch, holder or None if own, slot)
+
+    def __repr__(self):
+        return f"InlineCache({self.symbol!r})"
+
+    def get(self, obj):
+        shape = obj.shape
+        for entry in self.entries:
+            if entry[0] is shape:
+                if entry[3] is None:
+                    return obj.slots[entry[4]]
+                if entry[1] is obj.proto and entry[2] == Object.epoch:
+                    return entry[3].slots[entry[4]]
+        return self.lookup(obj)
+
+    def lookup(self, obj):
+        symbol = self.symbol
+        if symbol == 'proto':
+            return obj.get(symbol)
+        slot = obj.shape.index.get(symbol)
+        holder = None
+        if slot is None:
+            holder = obj.proto
+            while holder is not None:
+                slot = holder.shape.index.get(symbol)
+                if slot is not None:
+                    break
+                holder = holder.proto
+            if holder is None:
+                return None
+        entries = self.entries
+        # drop entries for this shape that went stale
+        entries[:] = [e for e in entries if e[0] is not obj.shape]
+        if len(entries) < self.MAX_ENTRIES:
+            entries.append((obj.shape, obj.proto, Object.epoch, holder, slot))
+        return (obj if holder is None else holder).slots[slot]
+
+
+class MemoTable:
+    """
+    Results of calls to pure functions (see analysis.pure_functions), keyed
+    by the function and the types and values of its arguments. Only calls
+    whose arguments are all primitives are remembered, and only the
+    max_entries most recently used results are kept.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def key(self, func, args):
+        # None if some argument is not a primitive
+        key = [id(func)]
+        for val in args:
+            if val.t not in PRIMITIVES:
+                return None
+            key.append(val.t)
+            key.append(val.v)
+        return tuple(key)
+
+    def get(self, key):
+        # a new box holding the remembered result, or None
+        result = self.entries.get(key)
+        if result is None:
+            return None
+        self.entries.move_to_end(key)
+        return Value(result.t, result.v)
+
+    def put(self, key, result):
+        if result.t not in PRIMITIVES:
+            return
+        self.entries[key] = Value(result.t, result.v)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class PreparedProgram:
+    """
+    What Interpreter.run makes of a program before running it: the optimized
+    AST, its function table and main, the analyses the engines read, and the
+    engine that runs it (None for the tree walker), which keeps the code it
+    compiles for the next run. source is the program's source, or the digest
+    of the FlatAST it came from, and size the bytes it is estimated to hold.
+    """
+    __slots__ = ('source', 'ast', 'functions', 'main', 'captures', 'unscoped', 'pure', 'ref_params',
+                 'dynamic_names', 'engine', 'size')
+
+    def __init__(self, source, ast, functions, main, captures, unscoped, pure, ref_params, dynamic_names, size):
+        self.source = source
+        self.ast = ast
+        self.functions = functions
+        self.main = main
+        self.captures = captures
+        self.unscoped = unscoped
+        self.pure = pure
+        self.ref_params = ref_params
+        self.dynamic_names = dynamic_names
+        self.engine = None
+        self.size = size
+
+
+def estimate_size(ast):
+    # the bytes held by the nodes of ast and their lists, not counting
+    # strings, which the parser shares between nodes
+    size = 0
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        size += sys.getsizeof(node)
+        if node.get('original') is not None:
+            stack.append(node.original)  # see element.FuncNode
+        for field in node.field_names():
+            value = getattr(node, field)
+            if isinstance(value, Element):
+                stack.append(value)
+            elif isinstance(value, list):
+                size += sys.getsizeof(value)
+                stack.extend(item for item in value if isinstance(item, Element))
+    return size
+
+
+class ProgramCache:
+    """
+    PreparedPrograms by their source, so an interpreter running the same
+    source again skips parsing, optimizing, analysing and compiling it. Only
+    the max_entries most recently used programs are kept, and only as many
+    as fit in max_bytes of estimated size. hits, misses and evictions count
+    lookups and removals, for sizing the cache.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        program = self.entries.get(key)
+        if program is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return program
+
+    def put(self, key, program):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.size
+        if self.max_entries <= 0 or program.size > self.max_bytes:
+            return
+        self.entries[key] = program
+        self.bytes += program.size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
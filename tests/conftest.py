@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the interpreter's modules are at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the tree walker takes several Python frames per Brewin call
+sys.setrecursionlimit(3000)
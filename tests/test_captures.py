@@ -0,0 +1,59 @@
+import pytest
+
+from analysis import lambda_captures
+from brewparse import parse_program
+from support import ENGINES, run
+
+
+def captures_of_first_lambda(program):
+    ast = parse_program(program)
+    main = ast.functions[-1]
+    return lambda_captures(ast)[id(main.statements[-1].expression)]
+
+
+def test_lambda_captures_only_free_names():
+    program = "func main() { a = 1; b = 2; f = lambda(x) { return x + a; }; }"
+    assert captures_of_first_lambda(program) == {'a'}
+
+
+def test_lambda_that_calls_captures_what_callees_can_see():
+    program = "func peek() { return hidden; } func main() { f = lambda() { return peek(); }; }"
+    assert 'hidden' in captures_of_first_lambda(program)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_primitives_are_captured_by_value_and_objects_shared(engine):
+    program = """
+func main() {
+  n = 1;
+  o = @;
+  o.v = 1;
+  f = lambda() { n = n + 1; o.v = o.v + 1; print(n, " ", o.v); };
+  n = 10;
+  o.v = 10;
+  f();
+  f();
+  print(n, " ", o.v);
+}
+"""
+    assert run(program, engine=engine) == {'output': ['2 11', '3 12', '10 12'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_callee_sees_the_lambdas_captured_scope(engine):
+    program = """
+func peek() {
+  return hidden;
+}
+
+func make() {
+  hidden = "seen";
+  return lambda() { return peek(); };
+}
+
+func main() {
+  f = make();
+  print(f());
+}
+"""
+    assert run(program, engine=engine) == {'output': ['seen'], 'error': None}
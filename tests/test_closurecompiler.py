@@ -0,0 +1,19 @@
+import pytest
+
+from support import PROGRAMS, REFERENCE, reference, run, run_program
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_matches_tree_interpreter(name):
+    assert run_program(name, engine='compiled') == run_program(name, **REFERENCE)
+
+
+def test_calls_in_loop():
+    program = """
+func twice(x) { return x * 2; }
+func main() {
+  i = 0;
+  while (i < 3) { print(twice(i)); i = i + 1; }
+}
+"""
+    assert run(program, engine='compiled') == reference(program)
@@ -0,0 +1,84 @@
+import os
+
+from brewparse import grammar_signature
+from diskcache import DEFAULT_CACHE_DIR, DiskCache, digest
+from flatast import FlatAST
+from support import reference, run
+
+PROGRAM = "func main() { print(1 + 2); }"
+
+
+def test_default_directory_is_the_users_cache():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    assert DEFAULT_CACHE_DIR == os.path.join(base, 'brewin')
+
+
+def test_digest_keeps_parts_apart():
+    assert digest('ab', 'c') != digest('a', 'bc')
+
+
+def test_put_and_get(tmp_path):
+    cache = DiskCache(str(tmp_path), '.test')
+    assert cache.get('k') is None
+    cache.put('k', b'data')
+    assert cache.get('k') == b'data'
+    assert os.listdir(tmp_path) == ['k.test']
+
+
+def test_unwritable_directory_is_a_miss(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_bytes(b'')
+    cache = DiskCache(str(blocker / 'cache'), '.test')
+    cache.put('k', b'data')
+    assert cache.get('k') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), '.test', max_bytes=100)
+    for i, key in enumerate('abc'):
+        cache.put(key, b'x' * 30)
+        os.utime(cache.path(key), (i, i))
+    cache.get('a')
+    cache.put('d', b'x' * 30)
+    assert sorted(os.listdir(tmp_path)) == ['a.test', 'd.test']
+
+
+def test_directory_is_not_scanned_on_every_put(tmp_path, monkeypatch):
+    scans = []
+    evict = DiskCache.evict
+    monkeypatch.setattr(DiskCache, 'evict', lambda self: scans.append(1) or evict(self))
+    cache = DiskCache(str(tmp_path), '.test', max_bytes=100)
+    for i in range(10):
+        cache.put(str(i), b'x' * 5)
+    assert len(scans) == 1
+    for i in range(10, 20):
+        cache.put(str(i), b'x' * 10)
+    assert len(scans) > 1
+    assert sum(os.path.getsize(cache.path(str(i))) for i in range(20) if os.path.exists(cache.path(str(i)))) <= 100
+
+
+def test_stale_temporary_files_are_removed(tmp_path):
+    stale = tmp_path / 'old.tmp'
+    stale.write_bytes(b'partial')
+    os.utime(stale, (0, 0))
+    DiskCache(str(tmp_path), '.test').put('k', b'data')
+    assert not stale.exists()
+
+
+def test_parsed_program_cache(tmp_path):
+    first = run(PROGRAM, cache_dir=str(tmp_path))
+    assert [name.endswith('.brewast') for name in os.listdir(tmp_path)] == [True]
+    assert run(PROGRAM, cache_dir=str(tmp_path)) == first == reference(PROGRAM)
+
+
+def test_entry_too_deep_to_load_is_a_miss(tmp_path):
+    # a well-formed flat AST nested too deeply to turn into a tree
+    flat = FlatAST()
+    expression = flat.add('int', val=1)
+    for _ in range(100000):
+        expression = flat.add('neg', op1=expression)
+    call = flat.add('fcall', name='print', args=[expression])
+    main = flat.add('func', name='main', args=[], statements=[call])
+    flat.root = flat.add('program', functions=[main])
+    DiskCache(str(tmp_path), '.brewast').put(digest(grammar_signature(), PROGRAM), flat.to_bytes())
+    assert run(PROGRAM, cache_dir=str(tmp_path)) == reference(PROGRAM)
@@ -0,0 +1,78 @@
+import pytest
+
+from brewparse import parse_program
+from element import Element, FuncNode, GenericElement, VarNode, WhileNode
+from support import ENGINES, reference, run
+
+
+def test_kinds_get_node_classes():
+    assert type(Element('var', name='x')) is VarNode
+    assert type(Element('while', condition=None, statements=[])) is WhileNode
+    assert type(Element('unknown', a=1)) is GenericElement
+
+
+def test_nodes_have_no_dict():
+    node = Element('var', name='x')
+    assert not hasattr(node, '__dict__')
+    with pytest.raises(AttributeError):
+        node.extra = 1
+
+
+def test_get_reads_any_field_name():
+    node = Element('var', name='x')
+    assert node.get('name') == node.name == 'x'
+    assert node.get('statements') is None
+    assert node.statements is None
+
+
+def test_unknown_field_is_an_error():
+    with pytest.raises(TypeError):
+        Element('var', name='x', val=1)
+
+
+def test_fields_mapping():
+    node = Element('=', name='x', expression=Element('int', val=1))
+    assert list(node.dict) == ['name', 'expression']
+    node.dict['name'] = 'y'
+    assert node.name == 'y'
+    with pytest.raises(KeyError):
+        node.dict['val'] = 1
+    with pytest.raises(KeyError):
+        node.dict['val']
+    with pytest.raises(TypeError):
+        del node.dict['name']
+
+
+def test_generic_element_fields():
+    node = Element('unknown', a=1, b=2)
+    assert dict(node.dict) == {'a': 1, 'b': 2}
+    assert node.get('c') is None
+
+
+def test_str_matches_parsed_program():
+    ast = parse_program("func f(ref a) { while (a > 0) { a = a - 1; } if (a) { print(\"s\"); } } "
+                        "func main() { f(1); }")
+    assert str(ast.functions[0]) == (
+        'func: name: f, args: [refarg: name: a], statements: [while: condition: [>: op1: [var: name: a], '
+        'op2: [int: val: 0]], statements: [=: name: a, expression: [-: op1: [var: name: a], op2: [int: val: 1]]], '
+        'if: condition: [var: name: a], statements: [fcall: name: print, args: [string: val: s]], '
+        'else_statements: None]')
+    assert type(ast.functions[0]) is FuncNode
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_function_value_with_a_loop_prints_as_parsed(engine):
+    program = """
+func count(a) {
+  while (a > 0) {
+    a = a - 1;
+  }
+  return a;
+}
+
+func main() {
+  print(count);
+}
+"""
+    assert run(program, engine=engine) == reference(program)
+    assert 'invariants' not in run(program, engine=engine)['output'][0]
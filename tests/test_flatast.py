@@ -0,0 +1,87 @@
+import pytest
+
+from brewparse import parse_program, parse_program_flat
+from flatast import FlatAST, KIND_CODES, NONE
+from support import PROGRAMS, source
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_round_trip(name):
+    program = source(name)
+    flat = parse_program_flat(program)
+    assert str(flat.to_tree()) == str(parse_program(program))
+    assert str(FlatAST.from_buffer(flat.to_bytes()).to_tree()) == str(parse_program(program))
+    assert str(FlatAST.from_tree(parse_program(program)).to_tree()) == str(parse_program(program))
+
+
+def test_save_and_load(tmp_path):
+    flat = parse_program_flat(source('funcs'))
+    path = tmp_path / 'funcs.brewast'
+    flat.save(path)
+    assert FlatAST.load(path).digest() == flat.digest()
+
+
+def test_big_numbers():
+    flat = parse_program_flat("func main() { print(123456789012345678901234567890); }")
+    assert 'val: 123456789012345678901234567890' in str(FlatAST.from_buffer(flat.to_bytes()).to_tree())
+
+
+def test_children_come_before_parents():
+    flat = parse_program_flat(source('funcs'))
+    assert all(child < n for n in flat.walk() for child in flat.children(n))
+    assert next(flat.walk()) == flat.root == len(flat) - 1
+
+
+def test_views():
+    flat = parse_program_flat("func main() { x = 1; print(x); }")
+    main = flat.node(flat.root).functions[0]
+    assert main.elem_type == 'func' and main.get('name') == 'main'
+    assert main.statements is main.statements
+    assert [s.elem_type for s in main.statements] == ['=', 'fcall']
+    assert dict(main.statements[0].dict)['name'] == 'x'
+
+
+def damaged(change):
+    flat = parse_program_flat("func main() { x = 10; print(x, \"s\"); }")
+    change(flat)
+    return flat.to_bytes()
+
+
+def first(flat, kind):
+    return next(n for n in range(len(flat)) if flat.kinds[n] == KIND_CODES[kind])
+
+
+@pytest.mark.parametrize('change', [
+    lambda flat: setattr(flat, 'root', len(flat)),
+    lambda flat: flat.kinds.__setitem__(0, 255),
+    # the '=' node's expression pointing at itself, and at a later node
+    lambda flat: flat.field1.__setitem__(first(flat, '='), first(flat, '=')),
+    lambda flat: flat.field1.__setitem__(first(flat, '='), flat.root),
+    # a child of the fcall's args list that doesn't exist
+    lambda flat: flat.items.__setitem__(flat.field1[first(flat, 'fcall')] + 1, 1000),
+    lambda flat: flat.field1.__setitem__(first(flat, 'fcall'), len(flat.items)),
+    lambda flat: flat.items.__setitem__(flat.field1[first(flat, 'fcall')], 1000),
+    lambda flat: flat.field0.__setitem__(first(flat, 'var'), len(flat.strings)),
+    lambda flat: flat.field0.__setitem__(first(flat, 'int'), len(flat.numbers)),
+    lambda flat: flat.field0.__setitem__(first(flat, 'int'), -2 - len(flat.strings)),
+])
+def test_damaged_buffer(change):
+    with pytest.raises(ValueError):
+        FlatAST.from_buffer(damaged(change))
+
+
+def test_truncated_or_foreign_buffer():
+    data = parse_program_flat("func main() { print(1); }").to_bytes()
+    with pytest.raises(ValueError):
+        FlatAST.from_buffer(data[:-8])
+    with pytest.raises(ValueError):
+        FlatAST.from_buffer(b'XXXX' + data[4:])
+    with pytest.raises(ValueError):
+        FlatAST.from_buffer(b'')
+
+
+def test_missing_fields_stay_none():
+    flat = parse_program_flat("func main() { return; }")
+    ret = first(flat, 'return')
+    assert flat.field0[ret] == NONE
+    assert flat.to_tree().functions[0].statements[0].expression is None
@@ -0,0 +1,65 @@
+import pytest
+
+from runtime import InlineCache, Object
+from support import ENGINES, run
+
+
+def obj(**fields):
+    o = Object()
+    for name, value in fields.items():
+        o.set(name, 'int', value)
+    return o
+
+
+def test_cache_follows_shape_and_prototype_changes():
+    cache = InlineCache('x')
+    base = obj(x=1)
+    child = obj(y=2)
+    child.set_proto(base)
+    assert cache.get(child).v == 1
+    assert cache.get(child).v == 1
+    other = obj(x=3)
+    child.set_proto(other)
+    assert cache.get(child).v == 3
+    child.set('x', 'int', 4)
+    assert cache.get(child).v == 4
+
+
+def test_cache_keeps_a_few_shapes():
+    cache = InlineCache('x')
+    receivers = [obj(**{f"f{i}": i, 'x': i}) for i in range(InlineCache.MAX_ENTRIES + 2)]
+    for _ in range(2):
+        assert [cache.get(r).v for r in receivers] == list(range(len(receivers)))
+    assert len(cache.entries) == InlineCache.MAX_ENTRIES
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_call_sites_see_prototype_changes(engine):
+    program = """
+func describe(o) {
+  return o.name;
+}
+
+func main() {
+  base = @;
+  base.name = "base";
+  base.greet = lambda() { return "hi " + this.name; };
+  other = @;
+  other.name = "other";
+  other.greet = lambda() { return "yo " + this.name; };
+  a = @;
+  a.proto = base;
+  b = @;
+  b.extra = 1;
+  b.proto = base;
+  i = 0;
+  while (i < 3) {
+    print(a.greet(), " ", b.greet(), " ", describe(a));
+    if (i == 0) { a.proto = other; }
+    if (i == 1) { base.name = "changed"; a.proto = base; a.name = "own"; }
+    i = i + 1;
+  }
+}
+"""
+    assert run(program, engine=engine) == {
+        'output': ['hi base hi base base', 'yo other hi base other', 'hi own hi changed own'], 'error': None}
@@ -0,0 +1,18 @@
+import pytest
+
+from support import CHANGED, EXPECTED, PROGRAMS, REFERENCE, run, run_program
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_program(name):
+    assert run_program(name, short_circuit=False, **REFERENCE) == CHANGED.get(name, EXPECTED[name])
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        run("func main() { print(1); }", engine='jit')
+
+
+def test_error_type():
+    assert run("func main() { print(1 + \"a\"); }") == {'output': [], 'error': 'TYPE_ERROR'}
+    assert run("func main() { print(y); }") == {'output': [], 'error': 'NAME_ERROR'}
@@ -0,0 +1,69 @@
+import pytest
+
+from support import ENGINES, run
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_long_loop(engine):
+    program = """
+func main() {
+  i = 0;
+  total = 0;
+  while (i < 100000) {
+    total = total + i;
+    i = i + 1;
+  }
+  print(total);
+}
+"""
+    assert run(program, engine=engine) == {'output': ['4999950000'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_return_from_later_iteration(engine):
+    program = """
+func find(n) {
+  i = 0;
+  while (i < 10) {
+    if (i == n) { return i * 100; }
+    i = i + 1;
+  }
+  return -1;
+}
+
+func main() {
+  print(find(3), " ", find(20));
+}
+"""
+    assert run(program, engine=engine) == {'output': ['300 -1'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_each_iteration_starts_with_an_empty_scope(engine):
+    program = """
+func main() {
+  i = 0;
+  while (i < 3) {
+    if (i == 1) { print(z); }
+    z = i;
+    i = i + 1;
+  }
+}
+"""
+    assert run(program, engine=engine) == {'output': [], 'error': 'NAME_ERROR'}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_body_variables_end_with_the_loop(engine):
+    program = """
+func main() {
+  i = 0;
+  while (i < 2) {
+    y = 5;
+    i = i + 1;
+  }
+  print(i);
+  print(y);
+}
+"""
+    assert run(program, engine=engine) == {'output': ['2'], 'error': 'NAME_ERROR'}
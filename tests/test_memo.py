@@ -0,0 +1,85 @@
+import pytest
+
+from analysis import pure_functions
+from brewparse import parse_program
+from runtime import MemoTable, Object, Value
+from support import ENGINES, reference, run, run_program, source
+
+
+def pure_names(program):
+    ast = parse_program(program)
+    pure = pure_functions(ast)
+    return {func.get('name') for func in ast.get('functions') if id(func) in pure}
+
+
+def test_pure_functions():
+    program = """
+func fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func loud(n) { print(n); return n; }
+func calls_loud(n) { return loud(n); }
+func reads_caller(n) { return n + outside; }
+func by_ref(ref n) { return n; }
+func makes_object(n) { o = @; return n; }
+func main() { print(fib(2)); }
+"""
+    assert pure_names(program) == {'fib'}
+
+
+def test_callee_bound_as_variable_is_not_pure():
+    program = """
+func twice(n) { return helper(n) * 2; }
+func helper(n) { return n; }
+func main() { helper = lambda(n) { print(n); return n; }; }
+"""
+    assert pure_names(program) == {'helper'}
+
+
+def test_memo_table_keeps_most_recently_used():
+    memo = MemoTable(2)
+    keys = [memo.key('f', [Value('int', n)]) for n in range(3)]
+    memo.put(keys[0], Value('int', 0))
+    memo.put(keys[1], Value('int', 1))
+    assert memo.get(keys[0]).v == 0
+    memo.put(keys[2], Value('int', 2))
+    assert memo.get(keys[1]) is None
+    assert memo.get(keys[0]).v == 0
+    assert memo.get(keys[2]).v == 2
+
+
+def test_memo_table_keys_on_types_and_primitives_only():
+    memo = MemoTable(4)
+    assert memo.key('f', [Value('int', 1)]) != memo.key('f', [Value('bool', True)])
+    assert memo.key('f', [Value('object', Object())]) is None
+
+
+def test_memo_table_returns_fresh_boxes():
+    memo = MemoTable(4)
+    key = memo.key('f', [])
+    memo.put(key, Value('int', 1))
+    result = memo.get(key)
+    result.v = 2
+    assert memo.get(key).v == 1
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_memoized_program_matches_reference(engine):
+    assert run_program('memo', engine=engine, memoize=True) == reference(source('memo'))
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_memoized_fib_runs_in_linear_time(engine):
+    program = """
+func fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main() { print(fib(80)); }
+"""
+    assert run(program, engine=engine, memoize=True, memo_size=16) == {
+        'output': ['23416728348467685'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_memoized_results_depend_on_argument_types(engine):
+    program = """
+func same(a) { return a == 1; }
+func main() { print(same(1), " ", same(true), " ", same(1)); }
+"""
+    assert run(program, engine=engine, memoize=True) == reference(program)
@@ -0,0 +1,49 @@
+from copy import deepcopy
+
+from runtime import Object
+
+
+def make(*fields):
+    obj = Object()
+    for i, field in enumerate(fields):
+        obj.set(field, 'int', i)
+    return obj
+
+
+def test_objects_built_alike_share_a_shape():
+    a = make('x', 'y')
+    b = make('x', 'y')
+    c = make('y', 'x')
+    assert a.shape is b.shape
+    assert a.shape is not c.shape
+    assert a.get('y').v == 1 and c.get('y').v == 0
+
+
+def test_setting_a_field_again_keeps_the_shape():
+    a = make('x')
+    shape = a.shape
+    a.set('x', 'string', 'hi')
+    assert a.shape is shape
+    assert (a.get('x').t, a.get('x').v) == ('string', 'hi')
+
+
+def test_fields_are_inherited_through_prototypes():
+    base = make('x')
+    middle = make('y')
+    child = make('z')
+    middle.set_proto(base)
+    child.set_proto(middle)
+    assert child.get('x').v == 0
+    assert child.get('proto') is middle
+    assert child.get('missing') is None
+    base.set('w', 'int', 9)
+    assert child.get('w').v == 9
+
+
+def test_deepcopy_shares_the_shape_and_copies_the_fields():
+    a = make('x', 'y')
+    copy = deepcopy(a)
+    assert copy.shape is a.shape
+    copy.set('x', 'int', 5)
+    assert a.get('x').v == 0
+    assert copy.get_fields().keys() == a.get_fields().keys()
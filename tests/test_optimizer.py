@@ -0,0 +1,107 @@
+import pytest
+
+from brewparse import parse_program
+from optimizer import PASSES, PassManager
+from support import ENGINES, PROGRAMS, REFERENCE, reference, run, run_program
+
+FUNCTION_VALUE = """
+func foo(a) {
+  x = 5 * 60;
+  if (false) {
+    print("never");
+  }
+  return a + x;
+  print("dead");
+}
+
+func main() {
+  f = foo;
+  print(f);
+  print(f(1));
+}
+"""
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+@pytest.mark.parametrize('optimization', PASSES)
+def test_pass_keeps_output(optimization, name):
+    assert run_program(name, passes=(optimization,)) == run_program(name, **REFERENCE)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_pipeline_keeps_output(name):
+    assert run_program(name) == run_program(name, **REFERENCE)
+
+
+def test_unknown_pass():
+    with pytest.raises(ValueError):
+        PassManager(('fold', 'vectorize'))
+
+
+def test_constant_folding():
+    ast = PassManager(('fold',)).run(parse_program(FUNCTION_VALUE))
+    assignment = ast.functions[0].statements[0]
+    assert assignment.expression.elem_type == 'int' and assignment.expression.val == 300
+
+
+def test_dead_code_removed():
+    ast = PassManager(('branches', 'unreachable')).run(parse_program(FUNCTION_VALUE))
+    assert [s.elem_type for s in ast.functions[0].statements] == ['=', 'return']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('optimization', PASSES)
+def test_function_value_prints_as_written(engine, optimization):
+    assert run(FUNCTION_VALUE, engine=engine, passes=(optimization,)) == reference(FUNCTION_VALUE)
+
+
+def test_inliner_reports_only_rewrites():
+    inliner = PASSES['inline']()
+    ast = parse_program("func double(a) { return a * 2; } func main() { double(1); }")
+    assert not inliner.run(ast)
+    assert ast.functions[1].statements[0].elem_type == 'fcall'
+    ast = parse_program("func double(a) { return a * 2; } func main() { print(double(1)); }")
+    assert inliner.run(ast)
+    assert ast.functions[1].statements[0].args[0].elem_type == 'inline'
+
+
+def invariants(program):
+    ast = PassManager(('licm',)).run(parse_program(program))
+    return [s.invariants for func in ast.functions for s in func.statements if s.elem_type == 'while']
+
+
+def test_licm_hoists_unassigned_reads():
+    program = "func main() { a = 3; i = 0; while (i < a * 2) { x = 1; i = i + 1; } }"
+    assert invariants(program) == [['$licm0']]
+
+
+def test_licm_keeps_reads_that_a_ref_parameter_may_alias():
+    program = """
+func f(ref b) { b = 1; }
+func main() { a = 3; i = 0; while (i < a * 2) { x = 1; i = i + 1; } }
+"""
+    assert invariants(program) == [None]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_loop_in_callee_of_ref_parameter(engine):
+    program = """
+func g() {
+  i = 0;
+  while (i < a * 2) {
+    x = x - 1;
+    i = i + 1;
+  }
+  print(i, " ", a);
+}
+
+func f(ref a) {
+  g();
+}
+
+func main() {
+  x = 10;
+  f(x);
+}
+"""
+    assert run(program, engine=engine) == reference(program) == {'output': ['7 3'], 'error': None}
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import brewlex
+import brewparse
+import lextab
+import parsetab
+from brewparse import grammar_signature, parse_program
+from support import PROGRAMS, source
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def python(code, cwd):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE='1')
+    return subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, capture_output=True, text=True,
+                          check=True).stdout.split()
+
+
+def test_parser_is_built_on_first_parse(tmp_path):
+    code = """
+import sys
+import brewparse
+print('ply.yacc' in sys.modules)
+brewparse.parse_program("func main() { print(1); }")
+print('ply.yacc' in sys.modules)
+"""
+    assert python(code, str(tmp_path)) == ['False', 'True']
+
+
+def test_first_parse_writes_no_files(tmp_path):
+    before = sorted(os.listdir(ROOT))
+    python("import brewparse; brewparse.parse_program('func main() { print(1); }')", str(tmp_path))
+    assert os.listdir(tmp_path) == []
+    assert sorted(os.listdir(ROOT)) == before
+
+
+def test_parser_tables_match_the_grammar():
+    from ply import yacc
+    grammar = yacc.ParserReflect(vars(brewparse))
+    grammar.get_all()
+    assert grammar.signature() == parsetab._lr_signature
+
+
+def test_lexer_table_matches_the_rules():
+    from ply import lex
+    built = lex.lex(module=brewlex)
+    assert sorted(lextab._lextokens) == sorted(built.lextokens)
+    assert lextab._lexliterals == built.lexliterals
+
+
+@pytest.fixture(scope='module')
+def grammar_parser():
+    from ply import yacc
+    return yacc.yacc(module=brewparse, debug=False, write_tables=False)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_prebuilt_tables_parse_like_the_grammar(grammar_parser, name):
+    program = source(name)
+    assert str(parse_program(program)) == str(grammar_parser.parse(program, lexer=brewlex.lexer().clone()))
+
+
+def test_grammar_signature_is_stable():
+    assert grammar_signature() == grammar_signature()
+    assert len(grammar_signature()) == 64
+
+
+def test_syntax_error():
+    with pytest.raises(SyntaxError):
+        parse_program("func main() { print(1) }")
@@ -0,0 +1,90 @@
+import random
+
+from pmap import PMap
+from runtime import Environment, Value
+
+
+class Colliding:
+    # keys whose hashes are all equal
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 7
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and other.name == self.name
+
+
+def test_matches_dict():
+    rng = random.Random(1)
+    pmap = PMap()
+    expected = {}
+    for _ in range(3000):
+        key = f"k{rng.randrange(500)}"
+        pmap = pmap.set(key, rng.random())
+        expected[key] = pmap.get(key)
+    assert len(pmap) == len(expected)
+    assert dict(pmap.items()) == expected
+    assert all(pmap.get(key) == value for key, value in expected.items())
+    assert pmap.get('missing') is None
+
+
+def test_updates_leave_old_maps_alone():
+    first = PMap().set('a', 1)
+    second = first.set('a', 2).set('b', 3)
+    assert dict(first.items()) == {'a': 1}
+    assert dict(second.items()) == {'a': 2, 'b': 3}
+    assert first.set('a', 1) is first
+
+
+def test_colliding_keys():
+    keys = [Colliding(i) for i in range(5)]
+    pmap = PMap().update((key, i) for i, key in enumerate(keys))
+    pmap = pmap.set(Colliding(2), 'two')
+    assert len(pmap) == 5
+    assert [pmap.get(key) for key in keys] == [0, 1, 'two', 3, 4]
+    assert Colliding(9) not in pmap
+
+
+def test_environment_scopes():
+    env = Environment()
+    env.set('x', 1, 'int')
+    env.push()
+    env.create('x', Value('int', 2))
+    env.set('y', 3, 'int')
+    assert env.get('x').v == 2
+    env.pop()
+    assert env.get('x').v == 1
+    assert env.get('y') is None
+
+
+def test_environment_set_changes_the_innermost_box():
+    env = Environment()
+    env.set('x', 1, 'int')
+    env.push()
+    env.set('x', 5, 'int')
+    env.pop()
+    assert env.get('x').v == 5
+
+
+def test_closure_copies_primitives_and_shares_objects():
+    env = Environment()
+    env.set('n', 1, 'int')
+    env.set('o', object(), 'object')
+    closure = env.get_closure({'n', 'o', 'missing'})
+    assert set(closure) == {'n', 'o'}
+    assert closure['n'] is not env.get('n')
+    assert closure['o'] is env.get('o')
+
+
+def test_variable_created_in_a_closure_on_the_stack_twice():
+    env = Environment()
+    closure = {}
+    env.push_closure(closure)
+    env.push_closure(closure)
+    env.set('z', 5, 'int')
+    env.pop()
+    assert env.get('z').v == 5
+    env.pop()
+    assert env.get('z') is None
@@ -0,0 +1,106 @@
+import pytest
+
+from brewparse import parse_program_flat
+from interpreterv4 import Interpreter
+from runtime import ProgramCache
+from support import ENGINES, INPUTS, reference, source
+
+PROGRAM = """
+func square(n) {
+  return n * n;
+}
+
+func main() {
+  i = 0;
+  while (i < 3) {
+    print(square(i));
+    i = i + 1;
+  }
+}
+"""
+
+
+class Prepared:
+    def __init__(self, size):
+        self.size = size
+
+
+def test_least_recently_used_programs_are_evicted():
+    cache = ProgramCache(2, 1000)
+    cache.put('a', Prepared(10))
+    cache.put('b', Prepared(10))
+    assert cache.get('a') is not None
+    cache.put('c', Prepared(10))
+    assert cache.get('b') is None
+    assert len(cache) == 2
+    assert cache.stats() == {'entries': 2, 'bytes': 20, 'hits': 1, 'misses': 1, 'evictions': 1}
+
+
+def test_programs_are_evicted_to_fit_in_max_bytes():
+    cache = ProgramCache(10, 100)
+    cache.put('a', Prepared(60))
+    cache.put('b', Prepared(30))
+    cache.put('c', Prepared(30))
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 60
+    cache.put('big', Prepared(101))
+    assert cache.get('big') is None
+    assert len(cache) == 2
+
+
+def test_replacing_a_program_counts_its_size_once():
+    cache = ProgramCache(10, 100)
+    cache.put('a', Prepared(60))
+    cache.put('a', Prepared(30))
+    assert cache.stats()['bytes'] == 30
+    cache.clear()
+    assert cache.stats()['entries'] == cache.stats()['bytes'] == 0
+
+
+def test_disabled_cache_keeps_nothing():
+    cache = ProgramCache(0, 100)
+    cache.put('a', Prepared(1))
+    assert cache.get('a') is None
+
+
+def rerun(program, engine, inp=None, **options):
+    # the outputs of running program twice on one interpreter
+    interpreter = Interpreter(console_output=False, inp=inp, engine=engine, cache_dir=None, **options)
+    outputs = []
+    for _ in range(2):
+        interpreter.reset()
+        interpreter.run(program)
+        outputs.append(interpreter.get_output())
+    return interpreter, outputs
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_rerun_hits_the_cache(engine):
+    interpreter, outputs = rerun(PROGRAM, engine)
+    assert outputs == [['0', '1', '4']] * 2
+    assert interpreter.programs.stats()['hits'] == 1
+    assert interpreter.programs.stats()['misses'] == 1
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_rerun_flat_ast(engine):
+    interpreter, outputs = rerun(parse_program_flat(PROGRAM), engine)
+    assert outputs == [['0', '1', '4']] * 2
+    assert interpreter.programs.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_without_cache_every_run_prepares(engine):
+    interpreter, outputs = rerun(PROGRAM, engine, program_cache_entries=0)
+    assert outputs == [['0', '1', '4']] * 2
+    assert interpreter.programs.stats()['misses'] == 2
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name', ['funcs', 'inputs', 'lambdas', 'memo', 'refs', 'tail'])
+def test_rerun_matches_reference(engine, name):
+    program = source(name)
+    expected = reference(program, INPUTS.get(name))
+    _, outputs = rerun(program, engine, INPUTS.get(name))
+    assert expected['error'] is None
+    assert outputs == [expected['output']] * 2
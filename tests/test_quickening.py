@@ -0,0 +1,53 @@
+import pytest
+
+from runtime import SPECIALIZED_OPS, Value
+from support import ENGINES, run
+
+
+def test_specialized_ops():
+    assert SPECIALIZED_OPS[('/', 'int', 'int')](Value('int', -7), Value('int', 2)).v == -4
+    assert SPECIALIZED_OPS[('+', 'string', 'string')](Value('string', 'a'), Value('string', 'b')).v == 'ab'
+    assert SPECIALIZED_OPS[('==', 'nil', 'nil')](Value('nil', None), Value('nil', None)).v is True
+    assert ('+', 'int', 'string') not in SPECIALIZED_OPS
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_operator_sites_that_change_types(engine):
+    program = """
+func add(a, b) {
+  return a + b;
+}
+
+func less(a, b) {
+  return a < b;
+}
+
+func main() {
+  i = 0;
+  while (i < 3) {
+    print(add(i, 1), " ", less(i, 1), " ", add("s", "t"));
+    i = i + 1;
+  }
+  print(add(1, "x"));
+}
+"""
+    assert run(program, engine=engine) == {
+        'output': ['1 true st', '2 false st', '3 false st'], 'error': 'TYPE_ERROR'}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_integer_division_rounds_down(engine):
+    program = """
+func div(a, b) {
+  return a / b;
+}
+
+func main() {
+  i = 0;
+  while (i < 2) {
+    print(div(-7, 2), " ", div(7, 2));
+    i = i + 1;
+  }
+}
+"""
+    assert run(program, engine=engine) == {'output': ['-4 3', '-4 3'], 'error': None}
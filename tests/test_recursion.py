@@ -0,0 +1,89 @@
+import pytest
+
+from support import ENGINES, run
+
+DEEP = """
+func down(n) {
+  if (n == 0) { return 0; }
+  return 1 + down(n - 1);
+}
+
+func main() {
+  print(down(20000));
+}
+"""
+
+
+def test_vm_recursion_is_not_limited_by_the_python_stack():
+    assert run(DEEP, engine='vm') == {'output': ['20000'], 'error': None}
+
+
+def test_vm_recursion_errors():
+    program = """
+func down(n) {
+  if (n == 0) { return missing; }
+  return 1 + down(n - 1);
+}
+
+func main() {
+  print(down(5000));
+}
+"""
+    assert run(program, engine='vm') == {'output': [], 'error': 'NAME_ERROR'}
+
+
+def test_tail_recursion_in_constant_stack():
+    program = """
+func count(n, acc) {
+  if (n == 0) { return acc; }
+  return count(n - 1, acc + 1);
+}
+
+func main() {
+  print(count(20000, 0));
+}
+"""
+    assert run(program, engine='tree') == {'output': ['20000'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_tail_call_in_lambda(engine):
+    program = """
+func main() {
+  f = lambda(n, acc) {
+    if (n == 0) { return acc; }
+    return f(n - 1, acc + n);
+  };
+  print(f(100, 0));
+}
+"""
+    assert run(program, engine=engine) == {'output': ['4950'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_tail_callee_sees_callers_variables(engine):
+    program = """
+func inner() {
+  return secret;
+}
+
+func outer() {
+  secret = 42;
+  return inner();
+}
+
+func show() {
+  return level;
+}
+
+func walk(n) {
+  level = n;
+  if (n == 0) { return show(); }
+  return walk(n - 1);
+}
+
+func main() {
+  print(outer(), " ", walk(5));
+}
+"""
+    assert run(program, engine=engine) == {'output': ['42 0'], 'error': None}
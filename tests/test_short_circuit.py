@@ -0,0 +1,40 @@
+import pytest
+
+from support import ENGINES, EXPECTED, run, run_program
+
+PROGRAM = """
+func side(v) {
+  print("side ", v);
+  return v;
+}
+
+func main() {
+  print(false && side(true));
+  print(true || side(false));
+  print(side(1) && side(0));
+}
+"""
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_right_operand_skipped(engine):
+    assert run(PROGRAM, engine=engine) == {
+        'output': ['false', 'true', 'side 1', 'side 0', 'false'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_both_operands_without_short_circuit(engine):
+    assert run(PROGRAM, engine=engine, short_circuit=False) == {
+        'output': ['side true', 'false', 'side false', 'true', 'side 1', 'side 0', 'false'], 'error': None}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name', ['shortc', 'shortcirc'])
+def test_programs_without_short_circuit(engine, name):
+    assert run_program(name, engine=engine, short_circuit=False) == EXPECTED[name]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_operand_types_still_checked(engine):
+    program = 'func main() { print(false && "s"); print(1 || 1); print("s" || true); }'
+    assert run(program, engine=engine) == {'output': ['false', 'true'], 'error': 'TYPE_ERROR'}
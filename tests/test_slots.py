@@ -0,0 +1,55 @@
+import pytest
+
+from analysis import resolve_slots
+from brewparse import parse_program
+from support import ENGINES, run
+
+
+def test_parameter_reads_resolve_to_their_index():
+    ast = parse_program("func f(a, b) { print(b - a); } func main() { f(1, 2); }")
+    f = ast.functions[0]
+    call = f.statements[0]
+    subtraction = call.args[0]
+    slots = resolve_slots(f)
+    assert slots[id(subtraction.op1)] == 1
+    assert slots[id(subtraction.op2)] == 0
+
+
+def test_other_names_stay_dynamic():
+    ast = parse_program("func f(a) { print(a + b); } func main() { f(1); }")
+    f = ast.functions[0]
+    addition = f.statements[0].args[0]
+    slots = resolve_slots(f)
+    assert id(addition.op1) in slots
+    assert id(addition.op2) not in slots
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_parameters_under_dynamic_scoping(engine):
+    program = """
+func change() {
+  x = x + 100;
+}
+
+func shadow(x) {
+  if (x > 0) {
+    x = x + 1;
+  }
+  change();
+  return x;
+}
+
+func twice(ref x) {
+  x = x * 2;
+}
+
+func main() {
+  a = 3;
+  print(shadow(a));
+  twice(a);
+  print(a);
+  f = lambda(x) { change(); return x; };
+  print(f(1));
+}
+"""
+    assert run(program, engine=engine) == {'output': ['104', '6', '101'], 'error': None}
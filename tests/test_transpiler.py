@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import transpiler
+from support import PROGRAMS, REFERENCE, reference, run, run_program
+
+PROGRAM = """
+func fib(n) {
+  if (n < 2) { return n; }
+  return fib(n - 1) + fib(n - 2);
+}
+
+func main() {
+  print(fib(15));
+}
+"""
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_matches_tree_interpreter(name):
+    assert run_program(name, engine='python') == run_program(name, **REFERENCE)
+
+
+def test_print_takes_each_argument_as_evaluated():
+    program = """
+func bump() {
+  t = t + 1;
+  return t;
+}
+
+func main() {
+  t = 0;
+  print(t, bump(), t);
+}
+"""
+    assert run(program, engine='python') == {'output': ['011'], 'error': None}
+
+
+def test_code_cache(tmp_path):
+    first = run(PROGRAM, engine='python', cache_dir=str(tmp_path))
+    entries = [name for name in os.listdir(tmp_path) if name.endswith('.brewc')]
+    assert len(entries) == 1
+    assert run(PROGRAM, engine='python', cache_dir=str(tmp_path)) == first == reference(PROGRAM)
+
+
+def test_damaged_code_cache_entry_is_a_miss(tmp_path):
+    run(PROGRAM, engine='python', cache_dir=str(tmp_path))
+    for name in os.listdir(tmp_path):
+        if name.endswith('.brewc'):
+            with open(tmp_path / name, 'wb') as file:
+                file.write(b'not code')
+    assert run(PROGRAM, engine='python', cache_dir=str(tmp_path)) == reference(PROGRAM)
+
+
+def test_code_cache_is_keyed_by_the_generating_code(tmp_path, monkeypatch):
+    run(PROGRAM, engine='python', cache_dir=str(tmp_path))
+    monkeypatch.setattr(transpiler, '_signature', ['changed'])
+    run(PROGRAM, engine='python', cache_dir=str(tmp_path))
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.brewc')]) == 2
@@ -0,0 +1,32 @@
+import pytest
+
+from analysis import has_ref_params, infer_types
+from brewparse import parse_program
+from support import ENGINES, reference, run, source
+
+ALIASING = ['ref_alias_types', 'ref_alias_compare', 'ref_alias_params', 'ref_alias_callee']
+
+
+def read_type(ref_params):
+    ast = parse_program("func f() { a = 1; x = 2; print(a + 1); } func main() { f(); }")
+    func = ast.get('functions')[0]
+    read = func.get('statements')[2].get('args')[0].get('op1')
+    return infer_types(func, {'f', 'main'}, ref_params).get(id(read))
+
+
+def test_has_ref_params():
+    assert has_ref_params(parse_program("func f(ref a) { a = 1; } func main() { f(1); }"))
+    assert has_ref_params(parse_program("func main() { g = lambda(ref a) { a = 1; }; }"))
+    assert not has_ref_params(parse_program("func f(a) { a = 1; } func main() { f(1); }"))
+
+
+def test_assignment_forgets_types_with_ref_params():
+    assert read_type(False) == 'int'
+    assert read_type(True) is None
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name', ALIASING)
+def test_aliased_variables(engine, name):
+    program = source(name)
+    assert run(program, engine=engine) == reference(program) == {'output': [], 'error': 'TYPE_ERROR'}
@@ -0,0 +1,93 @@
+import pytest
+
+from analysis import unscoped_blocks
+from brewparse import parse_program
+from support import ENGINES, reference, run
+
+
+def unscoped_kinds(program):
+    # the kinds of the statements opening each block that runs without a scope
+    ast = parse_program(program)
+    unscoped = unscoped_blocks(ast)
+    kinds = []
+
+    def visit(statements):
+        for s in statements or []:
+            for nested in (s.get('statements'), s.get('else_statements')):
+                if s.elem_type in ('if', 'while') and nested is not None:
+                    if id(nested) in unscoped:
+                        kinds.append(nested[0].elem_type)
+                    visit(nested)
+
+    for func in ast.functions:
+        visit(func.statements)
+    return kinds
+
+
+def test_block_assigning_known_variables_is_unscoped():
+    program = "func main() { i = 0; while (i < 3) { print(i); i = i + 1; } }"
+    assert unscoped_kinds(program) == ['fcall']
+
+
+def test_block_creating_a_variable_is_scoped():
+    program = "func main() { i = 0; while (i < 3) { j = i; i = i + 1; } }"
+    assert unscoped_kinds(program) == []
+
+
+def test_parameters_are_known():
+    program = "func f(n) { if (n > 0) { n = 0; } else { m = 1; } } func main() { f(1); }"
+    assert unscoped_kinds(program) == ['=']
+
+
+def test_variable_assigned_in_a_sibling_block_is_not_known():
+    program = "func main() { if (true) { a = 1; } while (false) { a = 2; } }"
+    assert unscoped_kinds(program) == []
+
+
+def test_nested_block_scopes_its_own_variables():
+    program = "func main() { i = 0; while (i < 2) { if (true) { t = i; } i = i + 1; } }"
+    assert unscoped_kinds(program) == ['if']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_unscoped_blocks_keep_dynamic_scoping(engine):
+    program = """
+func bump() {
+  i = i + 1;
+  fresh = 1;
+}
+
+func main() {
+  i = 0;
+  while (i < 3) {
+    bump();
+    if (i == 2) {
+      print(i);
+    }
+  }
+  print(i);
+  print(fresh);
+}
+"""
+    assert run(program, engine=engine) == reference(program) == {'output': ['2', '3'], 'error': 'NAME_ERROR'}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_return_from_unscoped_loop(engine):
+    program = """
+func find(n) {
+  i = 0;
+  while (true) {
+    if (i * i >= n) {
+      return i;
+    }
+    i = i + 1;
+  }
+}
+
+func main() {
+  print(find(50));
+  print(find(0));
+}
+"""
+    assert run(program, engine=engine) == reference(program) == {'output': ['8', '0'], 'error': None}
@@ -0,0 +1,47 @@
+import pytest
+
+from runtime import Value, copy_value
+from support import ENGINES, run
+
+
+def test_primitive_copies():
+    box = Value('int', 3)
+    copy = copy_value(box)
+    assert copy is not box and (copy.t, copy.v) == ('int', 3)
+    assert copy_value(box, fresh=True) is box
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_values_passed_and_returned(engine):
+    program = """
+func bump(n, o) {
+  n = n + 1;
+  o.v = o.v + 1;
+  return o;
+}
+
+func keep(ref n, ref o) {
+  n = n + 1;
+  o.v = o.v + 1;
+}
+
+func same(a, b) {
+  return a == b;
+}
+
+func main() {
+  n = 1;
+  o = @;
+  o.v = 1;
+  r = bump(n, o);
+  print(n, " ", o.v, " ", r.v);
+  keep(n, o);
+  print(n, " ", o.v);
+  print(same(o, o), " ", o == o);
+  s = "x";
+  t = s;
+  t = t + "y";
+  print(s, t);
+}
+"""
+    assert run(program, engine=engine) == {'output': ['1 1 2', '2 2', 'false true', 'xxy'], 'error': None}
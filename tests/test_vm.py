@@ -0,0 +1,28 @@
+import pytest
+
+from support import PROGRAMS, REFERENCE, reference, run, run_program
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_matches_tree_interpreter(name):
+    assert run_program(name, engine='vm') == run_program(name, **REFERENCE)
+
+
+def test_print_takes_each_argument_as_evaluated():
+    program = """
+func bump() {
+  t = t + 1;
+  return t;
+}
+
+func main() {
+  t = 0;
+  print(t, bump(), t);
+}
+"""
+    assert run(program, engine='vm') == {'output': ['011'], 'error': None}
+
+
+def test_print_bools_and_nil():
+    program = "func main() { x = nil; print(true, \" \", 3 > 4, \" \", x == nil); }"
+    assert run(program, engine='vm') == reference(program)
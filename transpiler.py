@@ -0,0 +1,792 @@
+import hashlib
+import marshal
+import os
+from importlib.util import MAGIC_NUMBER
+
+from intbase import InterpreterBase, ErrorType
+from element import INLINE_DEF, INLINE_ARG_DEF, INVARIANT_DEF
+from runtime import Value, Lambda, Object, InlineCache, to_bool, to_int, copy_value
+from closurecompiler import ClosureCompiler
+from analysis import bodies, resolve_slots, infer_types
+from diskcache import DiskCache, DEFAULT_CACHE_DIR, digest
+from brewparse import grammar_signature
+
+# bump whenever the generated code changes, so stale cache entries are ignored
+TRANSPILER_VERSION = 13
+CACHE_MAGIC = MAGIC_NUMBER + b'brew' + TRANSPILER_VERSION.to_bytes(4, 'little')
+
+# kinds of calls whose arguments are being bound, see PythonEngine.begin_call
+FUNCTION = 0
+LAMBDA = 1
+FUNC_METHOD = 2
+
+BUILTINS = ('print', 'inputi', 'inputs')
+INT_OPS = {'+': '+', '-': '-', '*': '*', '/': '//'}
+COMPARISONS = ('<', '<=', '>', '>=')
+
+
+def collect_lambdas(ast):
+    """Every LAMBDA_DEF in the program, in a fixed (depth-first) order."""
+    return [func for func in bodies(ast) if func.elem_type == InterpreterBase.LAMBDA_DEF]
+
+
+def fresh(expr):
+    # whether expr evaluates to a new box that nothing else holds; literals
+    # are module constants shared by every evaluation
+    return expr.elem_type not in (InterpreterBase.VAR_DEF, InterpreterBase.NIL_DEF, InterpreterBase.BOOL_DEF,
+                                  InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, INLINE_ARG_DEF,
+                                  INVARIANT_DEF)
+
+
+def invariant_local(name):
+    # the Python local holding an invariant's value since its loop started
+    return name.lstrip('$')
+
+
+class Transpiler:
+    """
+    Turns a parsed Brewin program into the source of a Python module with one
+    Python function per Brewin function and lambda. Loops, conditions and
+    integer arithmetic become inline Python; scoping, calls and objects go
+    through the helpers PythonEngine puts in the module's globals. Where
+    infer_types proves the operand types, operations and conditions are
+    emitted without their type checks.
+    """
+
+    def __init__(self, functions, short_circuit=True, unscoped=frozenset(), ref_params=True):
+        self.functions = functions
+        self.short_circuit = short_circuit
+        self.unscoped = unscoped  # see analysis.unscoped_blocks
+        self.ref_params = ref_params  # see analysis.has_ref_params
+
+    def transpile(self, ast):
+        self.out = []
+        self.consts = {}
+        self.sites = []
+        self.caches = []
+        self.lambdas = collect_lambdas(ast)
+        self.lambda_index = {id(lam): i for i, lam in enumerate(self.lambdas)}
+        func_names = []
+        for func in ast.get('functions'):
+            name = f"f_{func.get('name')}_{len(func.get('args'))}"
+            self.function(name, func, param_locals=True)
+            func_names.append(name)
+        lambda_names = []
+        for i, lam in enumerate(self.lambdas):
+            # lambda parameters live in the closure, which recursive calls
+            # rebind, so they are always looked up by name
+            self.function(f"lambda_{i}", lam, param_locals=False)
+            lambda_names.append(f"lambda_{i}")
+
+        header = []
+        for (kind, val), name in self.consts.items():
+            header.append(f"{name} = Value({kind!r}, {val!r})")
+        for i, field_name in enumerate(self.caches):
+            header.append(f"C{i} = InlineCache({field_name!r})")
+        for i, site in enumerate(self.sites):
+            header.append(f"S{i} = {site}")
+        footer = [
+            f"FUNCTIONS = [{', '.join(func_names)}]",
+            f"LAMBDAS = [{', '.join(lambda_names)}]",
+        ]
+        return '\n'.join(header + [''] + self.out + footer) + '\n'
+
+    ############################# OUTPUT HELPERS
+
+    def line(self, text):
+        self.out.append('    ' * self.indent + text)
+
+    def temp(self):
+        self.temps += 1
+        return f"t{self.temps}"
+
+    def const(self, kind, val):
+        key = (kind, val)
+        if key not in self.consts:
+            self.consts[key] = f"K{len(self.consts)}"
+        return self.consts[key]
+
+    def site(self, source):
+        self.sites.append(source)
+        return f"S{len(self.sites) - 1}"
+
+    def cache(self, field_name):
+        # each field read and method call site gets its own inline cache
+        self.caches.append(field_name)
+        return f"C{len(self.caches) - 1}"
+
+    ############################# FUNCTIONS AND STATEMENTS
+
+    def function(self, name, func, param_locals):
+        self.indent = 0
+        self.temps = 0
+        self.depth = 0  # block scopes pushed since the start of the body
+        self.slots = resolve_slots(func) if param_locals else {}
+        # lambdas are not typed: their closure holds whatever the last call left
+        self.types = infer_types(func, self.functions, self.ref_params) if func.elem_type == InterpreterBase.FUNC_DEF else {}
+        signature = ', '.join(f"p{i}" for i in range(len(func.get('args')))) if param_locals else ''
+        self.line(f"def {name}({signature}):")
+        self.indent += 1
+        self.block(func.get('statements'))
+        self.line("return Value('nil', None)")
+        self.out.append('')
+
+    def block(self, statements):
+        start = len(self.out)
+        for s in statements:
+            self.statement(s)
+        if len(self.out) == start:
+            self.line("pass")
+
+    def scoped_block(self, statements, scope=None):
+        if id(statements) in self.unscoped:
+            # the block creates no variables, so it needs no scope
+            self.block(statements)
+            return
+        self.line("env_push()" if scope is None else f"env_push_scope({scope})")
+        self.depth += 1
+        self.block(statements)
+        self.depth -= 1
+        self.line("env_pop()")
+
+    def unwind(self):
+        for _ in range(self.depth):
+            self.line("env_pop()")
+
+    def statement(self, statement):
+        kind = statement.elem_type
+        if kind == '=':
+            symbol = statement.get('name')
+            if '.' in symbol:
+                obj_name, field_name = symbol.split('.')
+                target = self.temp()
+                self.line(f"{target} = field_target({obj_name!r})")
+                val = self.expr(statement.get('expression'))
+                self.line(f"store_field({target}, {field_name!r}, {val})")
+            else:
+                val = self.expr(statement.get('expression'))
+                if id(statement) in self.slots:
+                    box = f"p{self.slots[id(statement)]}"
+                    self.line(f"{box}.v = {val}.v")
+                    self.line(f"{box}.t = {val}.t")
+                else:
+                    self.line(f"env_set({symbol!r}, {val}.v, {val}.t)")
+        elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            self.expr(statement)
+        elif kind == InterpreterBase.IF_DEF:
+            cond = self.condition(statement.get('condition'), 'if')
+            else_statements = statement.get('else_statements')
+            self.line(f"if {cond}:")
+            self.indent += 1
+            self.scoped_block(statement.get('statements'))
+            self.indent -= 1
+            if else_statements:
+                self.line("else:")
+                self.indent += 1
+                self.scoped_block(else_statements)
+                self.indent -= 1
+        elif kind == InterpreterBase.WHILE_DEF:
+            # every iteration runs in the same scope dict, emptied in between
+            scoped = id(statement.get('statements')) not in self.unscoped
+            scope = self.temp() if scoped else None
+            if scoped:
+                self.line(f"{scope} = {{}}")
+            for name in statement.get('invariants') or ():
+                self.line(f"{invariant_local(name)} = None")
+            self.line("while True:")
+            self.indent += 1
+            cond = self.condition(statement.get('condition'), 'while')
+            self.line(f"if not {cond}:")
+            self.line("    break")
+            self.scoped_block(statement.get('statements'), scope)
+            if scoped:
+                self.line(f"{scope}.clear()")
+            self.indent -= 1
+        elif kind == InterpreterBase.RETURN_DEF:
+            expr = statement.get('expression')
+            if expr is None:
+                self.unwind()
+                self.line("return Value('nil', None)")
+            else:
+                val = self.expr(expr)
+                result = self.temp()
+                self.line(f"{result} = copy_value({val}, {fresh(expr)})")
+                self.unwind()
+                self.line(f"return {result}")
+        # any other expression statement is never evaluated
+
+    def condition(self, expr, statement):
+        val = self.expr(expr)
+        if self.types.get(id(expr)) == 'bool':
+            return f"{val}.v"
+        cond = self.temp()
+        self.line(f"{cond} = {val}.v if {val}.t == 'bool' else to_bool({val}.v)")
+        self.line(f"if {cond} is None:")
+        self.line(f"    condition_error({statement!r})")
+        return cond
+
+    ############################# EXPRESSIONS
+
+    def expr(self, expr):
+        """Emits code for expr and returns the name of the local holding its Value."""
+        kind = expr.elem_type
+
+        if kind == InterpreterBase.NIL_DEF:
+            return self.const('nil', None)
+        if kind == InterpreterBase.BOOL_DEF:
+            return self.const('nil', expr.get('val'))
+        if kind == InterpreterBase.INT_DEF:
+            return self.const('int', expr.get('val'))
+        if kind == InterpreterBase.STRING_DEF:
+            return self.const('string', expr.get('val'))
+        if kind == InterpreterBase.VAR_DEF:
+            return self.var(expr)
+        if kind == InterpreterBase.FCALL_DEF:
+            return self.fcall(expr)
+        if kind == InterpreterBase.MCALL_DEF:
+            return self.mcall(expr)
+        if kind == INLINE_DEF:
+            return self.inline(expr)
+        if kind == INLINE_ARG_DEF and expr.get('field') is None:
+            return self.inline_args[expr.get('index')]
+        if kind == INVARIANT_DEF:
+            result = invariant_local(expr.get('name'))
+            self.line(f"if {result} is None:")
+            self.indent += 1
+            val = self.expr(expr.get('expression'))
+            self.line(f"{result} = {val}")
+            self.indent -= 1
+            return result
+
+        result = self.temp()
+        if kind == INLINE_ARG_DEF:
+            self.line(f"{result} = read_arg_field({self.inline_args[expr.get('index')]}, {self.cache(expr.get('field'))})")
+        elif kind == InterpreterBase.LAMBDA_DEF:
+            self.line(f"{result} = make_lambda({self.lambda_index[id(expr)]})")
+        elif kind == InterpreterBase.OBJ_DEF:
+            self.line(f"{result} = Value('object', Object())")
+        elif kind == InterpreterBase.NEG_DEF:
+            val = self.expr(expr.get('op1'))
+            if self.types.get(id(expr.get('op1'))) == 'int':
+                self.line(f"{result} = Value('int', -{val}.v)")
+            else:
+                self.line(f"{result} = Value('int', -1 * {val}.v) if {val}.t == 'int' else negate({val})")
+        elif kind == InterpreterBase.NOT_DEF:
+            val = self.expr(expr.get('op1'))
+            self.line(f"{result} = logical_not({val})")
+        elif (kind == '&&' or kind == '||') and self.short_circuit:
+            a = self.expr(expr.get('op1'))
+            x = self.operand(a, kind)
+            self.line(f"if {x}:" if kind == '||' else f"if not {x}:")
+            self.line(f"    {result} = Value('bool', {x})")
+            self.line("else:")
+            self.indent += 1
+            b = self.expr(expr.get('op2'))
+            y = self.operand(b, kind)
+            self.line(f"{result} = Value('bool', {y})")
+            self.indent -= 1
+        else:
+            a = self.expr(expr.get('op1'))
+            b = self.expr(expr.get('op2'))
+            ints = self.types.get(id(expr.get('op1'))) == 'int' and self.types.get(id(expr.get('op2'))) == 'int'
+            if ints and kind in INT_OPS:
+                self.line(f"{result} = Value('int', {a}.v {INT_OPS[kind]} {b}.v)")
+            elif ints and (kind in COMPARISONS or kind == '==' or kind == '!='):
+                self.line(f"{result} = Value('bool', {a}.v {kind} {b}.v)")
+            elif kind in INT_OPS:
+                self.line(f"if {a}.t == 'int' and {b}.t == 'int':")
+                self.line(f"    {result} = Value('int', {a}.v {INT_OPS[kind]} {b}.v)")
+                self.line("else:")
+                self.line(f"    {result} = arithmetic({kind!r}, {a}, {b})")
+            elif kind in COMPARISONS:
+                self.line(f"if {a}.t != 'int' or {b}.t != 'int':")
+                self.line(f"    operand_error({kind!r})")
+                self.line(f"{result} = Value('bool', {a}.v {kind} {b}.v)")
+            elif kind == '==' or kind == '!=':
+                self.line(f"{result} = equality({kind!r}, {a}, {b})")
+            else:
+                self.line(f"{result} = logical({kind!r}, {a}, {b})")
+        return result
+
+    def inline(self, expr):
+        # a call the optimizer replaced by the callee's return expression,
+        # whose parameters become the locals holding the arguments
+        args = [self.expr(a) for a in expr.get('args')]
+        body = expr.get('expression')
+        if body is None:
+            return self.const('nil', None)
+        self.inline_args = args
+        val = self.expr(body)
+        result = self.temp()
+        self.line(f"{result} = copy_value({val}, {fresh(body)})")
+        return result
+
+    def operand(self, val, op):
+        # the bool value of an operand of && or ||
+        x = self.temp()
+        self.line(f"{x} = {val}.v if {val}.t == 'bool' else to_bool({val}.v)")
+        self.line(f"if {x} is None:")
+        self.line(f"    logical_error({op!r})")
+        return x
+
+    def var(self, expr):
+        name = expr.get('name')
+        if '.' in name:
+            result = self.temp()
+            obj_name, field_name = name.split('.')
+            self.line(f"{result} = load_field({obj_name!r}, {self.cache(field_name)})")
+            return result
+        # function names shadow variables
+        if name in self.functions:
+            result = self.temp()
+            self.line(f"{result} = load_func({name!r})")
+            return result
+        if id(expr) in self.slots:
+            return f"p{self.slots[id(expr)]}"
+        result = self.temp()
+        self.line(f"{result} = env_get({name!r})")
+        self.line(f"if {result} is None:")
+        self.line(f"    name_error({name!r})")
+        return result
+
+    def fcall(self, expr):
+        name = expr.get('name')
+        args = expr.get('args')
+        result = self.temp()
+        if name in BUILTINS:
+            if (name == 'inputi' or name == 'inputs') and len(args) > 1:
+                self.line(f"input_arity_error({name!r})")
+            if name == 'print':
+                # each argument's text is taken before later arguments can change it
+                texts = []
+                for a in args:
+                    val = self.expr(a)
+                    texts.append(self.temp())
+                    self.line(f"{texts[-1]} = print_text({val})")
+                self.line(f"{result} = builtin_print({', '.join(texts)})")
+                return result
+            vals = [self.expr(a) for a in args[:1]]
+            self.line(f"{result} = builtin_input({name!r}, {', '.join(vals) or 'None'})")
+            return result
+
+        site = self.site(repr((name, len(args))))
+        call = self.temp()
+        target = self.functions.get(name, {}).get(len(args))
+        if target is None:
+            # no function matches, so only a variable holding a callable can
+            self.line(f"{call} = begin_call({site})")
+            self.args(call, args, None)
+            self.line(f"{result} = end_call({call})")
+            return result
+
+        # statically known target: unless a variable of the same name is in
+        # scope, push its frame and pass the parameter boxes straight in
+        params = [(p.get('name'), p.elem_type == InterpreterBase.REFARG_DEF) for p in target.get('args')]
+        self.line(f"{call} = begin_call({site}) if env_get({name!r}) is not None else None")
+        self.line(f"if {call} is None:")
+        self.line("    env_push()")
+        boxes = self.args(call, args, params)
+        self.line(f"if {call} is None:")
+        self.line(f"    {result} = f_{name}_{len(args)}({', '.join(boxes)})")
+        self.line("    env_pop()")
+        self.line("else:")
+        self.line(f"    {result} = end_call({call})")
+        return result
+
+    def args(self, call, args, params):
+        boxes = []
+        for i, a in enumerate(args):
+            val = self.expr(a)
+            is_var = a.elem_type == InterpreterBase.VAR_DEF
+            if params is None:
+                self.line(f"bind({call}, {i}, {val}, {is_var}, {fresh(a)})")
+                continue
+            box = self.temp()
+            param_name, is_ref = params[i]
+            self.line(f"if {call} is None:")
+            self.line(f"    {box} = {val}" if is_ref and is_var else f"    {box} = copy_value({val}, {fresh(a)})")
+            self.line(f"    env_create({param_name!r}, {box})")
+            self.line("else:")
+            self.line(f"    bind({call}, {i}, {val}, {is_var}, {fresh(a)})")
+            boxes.append(box)
+        return boxes
+
+    def mcall(self, expr):
+        args = expr.get('args')
+        cache = self.cache(expr.get('name'))
+        site = self.site(f"({expr.get('objref')!r}, {len(args)}, {cache})")
+        call = self.temp()
+        result = self.temp()
+        self.line(f"{call} = begin_method({site})")
+        # a plain function stored in a field never evaluates these arguments
+        self.line(f"if {call}[0] != {FUNC_METHOD}:")
+        self.indent += 1
+        start = len(self.out)
+        self.args(call, args, None)
+        if len(self.out) == start:
+            self.line("pass")
+        self.indent -= 1
+        self.line(f"{result} = end_call({call})")
+        return result
+
+
+_signature = []
+
+
+def code_signature():
+    """
+    A hash of the parser and the modules that decide what code a program is
+    transpiled to, the optimizer and the analyses included, so a change to
+    any of them makes cached code stale; None if they can't be read.
+    """
+    if not _signature:
+        grammar = grammar_signature()
+        h = hashlib.sha256((grammar or '').encode('ascii'))
+        try:
+            for module in ('transpiler.py', 'optimizer.py', 'analysis.py', 'runtime.py', 'element.py'):
+                with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as file:
+                    h.update(file.read())
+            _signature.append(h.hexdigest() if grammar is not None else None)
+        except OSError:
+            _signature.append(None)
+    return _signature[0]
+
+
+class PythonEngine:
+    """
+    Runs a program through Python code generated by Transpiler. Code objects
+    are cached on disk, keyed by a hash of the program source and of the
+    code that generates them (see code_signature), so the same program is
+    only transpiled and compiled once; an engine also keeps its code for
+    running the program again.
+    """
+
+    def __init__(self, interpreter, functions, cache_dir=DEFAULT_CACHE_DIR):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.functions = functions
+        self.cache_dir = cache_dir
+        self.code = None
+        self.fallback = None
+
+    def run(self, program, ast, main):
+        # the code is loaded on the first run and kept for the next ones
+        if self.code is None and self.fallback is None:
+            try:
+                self.code = self.load(program, ast)
+            except (SyntaxError, RecursionError):
+                # Python refuses code nested too deeply; such programs run on
+                # the closure compiler instead
+                self.fallback = ClosureCompiler(self.interpreter, self.functions)
+            # generated bodies are matched back to elements by their position
+            self.lambdas = collect_lambdas(ast)
+            self.captures = [self.interpreter.captures[id(lam)] for lam in self.lambdas]
+        if self.code is None:
+            self.fallback.run(main)
+            return
+        namespace = self.namespace()
+        exec(self.code, namespace)
+        self.bodies = {}
+        for func, body in zip(ast.get('functions'), namespace['FUNCTIONS']):
+            if id(func) in self.interpreter.pure:
+                # generated code calls functions through the module globals,
+                # so replacing the global memoizes every call
+                namespace[body.__name__] = body = self.memoized(func, body)
+            self.bodies[id(func)] = body
+        for lam, body in zip(self.lambdas, namespace['LAMBDAS']):
+            self.bodies[id(lam)] = body
+        self.bodies[id(main)]()
+
+    def memoized(self, func, body):
+        memo = self.interpreter.memo
+
+        def call(*boxes):
+            key = memo.key(func, boxes)
+            if key is None:
+                return body(*boxes)
+            result = memo.get(key)
+            if result is None:
+                result = body(*boxes)
+                memo.put(key, result)
+            return result
+        return call
+
+    ############################# CODE CACHE
+
+    def load(self, program, ast):
+        cache = key = None
+        signature = code_signature()
+        if self.cache_dir is not None and signature is not None:
+            # the generated code also depends on the evaluation mode and the
+            # optimizations that shaped the AST
+            cache = DiskCache(self.cache_dir, '.brewc')
+            key = digest(signature, program, f"short_circuit={self.interpreter.short_circuit}",
+                         f"passes={','.join(self.interpreter.passes)}")
+            code = self.read_cache(cache, key)
+            if code is not None:
+                return code
+        source = Transpiler(self.functions, self.interpreter.short_circuit, self.interpreter.unscoped,
+                            self.interpreter.ref_params).transpile(ast)
+        code = compile(source, '<brewin>', 'exec')
+        if cache is not None:
+            cache.put(key, CACHE_MAGIC + marshal.dumps(code))
+        return code
+
+    def read_cache(self, cache, key):
+        data = cache.get(key)
+        if data is None or not data.startswith(CACHE_MAGIC):
+            return None
+        try:
+            return marshal.loads(data[len(CACHE_MAGIC):])
+        except Exception:
+            return None  # a damaged entry is just a miss
+
+    ############################# RUNTIME HELPERS
+
+    def namespace(self):
+        env = self.env
+        return {
+            'Value': Value,
+            'Object': Object,
+            'InlineCache': InlineCache,
+            'copy_value': copy_value,
+            'to_bool': to_bool,
+            'env_get': env.get,
+            'env_set': env.set,
+            'env_create': env.create,
+            'env_push': env.push,
+            'env_push_scope': env.push_scope,
+            'env_pop': env.pop,
+            'name_error': self.name_error,
+            'condition_error': self.condition_error,
+            'operand_error': self.operand_error,
+            'logical_error': self.logical_error,
+            'input_arity_error': self.input_arity_error,
+            'negate': self.negate,
+            'logical_not': self.logical_not,
+            'arithmetic': self.arithmetic,
+            'equality': self.equality,
+            'logical': self.logical,
+            'load_field': self.load_field,
+            'load_func': self.load_func,
+            'field_target': self.field_target,
+            'store_field': self.store_field,
+            'make_lambda': self.make_lambda,
+            'begin_call': self.begin_call,
+            'begin_method': self.begin_method,
+            'bind': self.bind,
+            'end_call': self.end_call,
+            'print_text': self.print_text,
+            'builtin_print': self.builtin_print,
+            'read_arg_field': self.read_arg_field,
+            'builtin_input': self.builtin_input,
+        }
+
+    def error(self, error_type, description):
+        self.interpreter.error(error_type, description)
+
+    def name_error(self, name):
+        self.error(ErrorType.NAME_ERROR, f"Variable {name} was not found.")
+
+    def condition_error(self, statement):
+        self.error(ErrorType.TYPE_ERROR, f"Incorrect condition type for '{statement}' statement.")
+
+    def operand_error(self, op):
+        self.error(ErrorType.TYPE_ERROR, f"Incompatible types for '{op}' operation.")
+
+    def logical_error(self, op):
+        self.error(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation.")
+
+    def input_arity_error(self, name):
+        self.error(ErrorType.NAME_ERROR, f"Invalid number of arguments provided for '{name}' function.")
+
+    def negate(self, val):
+        self.error(ErrorType.TYPE_ERROR, f"Non-integer value cannot be negated with '-'.")
+
+    def logical_not(self, val):
+        val = to_bool(val.v)
+        if val is None:
+            self.error(ErrorType.TYPE_ERROR, f"Non-integer or non-boolean value cannot be negated with '!'.")
+        return Value('bool', not val)
+
+    def arithmetic(self, op, a, b):
+        if op == '+' and a.t == 'string' and b.t == 'string':
+            return Value('string', a.v + b.v)
+        x = to_int(a.v)
+        y = to_int(b.v)
+        if x is None or y is None:
+            self.operand_error(op)
+        if op == '+':
+            return Value('int', x + y)
+        if op == '-':
+            return Value('int', x - y)
+        if op == '*':
+            return Value('int', x * y)
+        return Value('int', x // y)
+
+    def equality(self, op, a, b):
+        if a.t == b.t:
+            result = a.v == b.v
+        else:
+            x = to_bool(a.v)
+            y = to_bool(b.v)
+            result = x == y if x is not None and y is not None else False
+        return Value('bool', result if op == '==' else not result)
+
+    def logical(self, op, a, b):
+        x = to_bool(a.v)
+        y = to_bool(b.v)
+        if x is None or y is None:
+            self.logical_error(op)
+        return Value('bool', (x or y) if op == '||' else (x and y))
+
+    def load_field(self, obj_name, cache):
+        obj = self.env.get(obj_name)
+        if obj is None or obj.type() != 'object':
+            self.error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
+        field = cache.get(obj.v)
+        if field is None:
+            self.error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
+        return field
+
+    def read_arg_field(self, obj, cache):
+        if obj.t != 'object':
+            self.error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
+        field = cache.get(obj.v)
+        if field is None:
+            self.error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
+        return field
+
+    def load_func(self, name):
+        overloads = self.functions[name]
+        if len(overloads) > 1:
+            self.error(ErrorType.NAME_ERROR, "Cannot return or assign overloaded function name.")
+        return Value('func', list(overloads.values())[0])
+
+    def field_target(self, obj_name):
+        obj = self.env.get(obj_name)
+        if obj is None:
+            self.error(ErrorType.NAME_ERROR, "Object not found.")
+        if obj.type() != 'object':
+            self.error(ErrorType.TYPE_ERROR, "Attempting to assign a field to a non-object.")
+        return obj
+
+    def store_field(self, obj, field_name, val):
+        obj = obj.v
+        if field_name == 'proto':
+            if val.t == 'nil':
+                return
+            if val.t != 'object':
+                self.error(ErrorType.TYPE_ERROR, "Attempting to specify non-object as prototype.")
+            obj.set_proto(val.v)
+            return
+        obj.set(field_name, val.t, val.v)
+
+    def make_lambda(self, index):
+        return Value('lambda', Lambda(self.env.get_closure(self.captures[index]), self.lambdas[index]))
+
+    ############################# CALLS
+
+    def get_function(self, func_name, num_args):
+        if func_name not in self.functions:
+            self.error(ErrorType.NAME_ERROR, f"Function {func_name} was not found.")
+        if num_args not in self.functions[func_name]:
+            self.error(ErrorType.NAME_ERROR, f"Function {func_name} taking {num_args} arguments was not found.")
+        return self.functions[func_name][num_args]
+
+    def params(self, func):
+        return [(p.get('name'), p.elem_type == InterpreterBase.REFARG_DEF) for p in func.get('args')]
+
+    def begin_call(self, site):
+        # returns [kind, callee, parameters, bound boxes, closure, object]
+        name, num_args = site
+        alias = self.env.get(name)
+        if alias:
+            if alias.t == 'func':
+                func = self.get_function(alias.v.get('name'), len(alias.v.get('args')))
+            elif alias.t == 'lambda':
+                return self.begin_lambda(alias, num_args)
+            else:
+                self.error(ErrorType.TYPE_ERROR, f"Variable is not callable.")
+        else:
+            func = self.get_function(name, num_args)
+        params = self.params(func)
+        if len(params) != num_args:
+            self.error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to function.")
+        self.env.push()
+        return [FUNCTION, func, params, [], None, None]
+
+    def begin_lambda(self, lambda_val, num_args, obj=None):
+        func = lambda_val.v.func
+        params = self.params(func)
+        if len(params) != num_args:
+            self.error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to lambda function.")
+        return [LAMBDA, func, params, None, lambda_val.v.closure, obj]
+
+    def begin_method(self, site):
+        obj_name, num_args, cache = site
+        obj = self.env.get(obj_name)
+        if obj is None:
+            self.error(ErrorType.NAME_ERROR, "Object name not found.")
+        if obj.type() != 'object':
+            self.error(ErrorType.TYPE_ERROR, "Attempting to call method from a non-object.")
+        method = cache.get(obj.v)
+        if method is None:
+            self.error(ErrorType.NAME_ERROR, "Attempting to call a method that does not exist in an object.")
+        if method.type() == 'lambda':
+            if num_args != len(method.v.func.get('args')):
+                self.error(ErrorType.NAME_ERROR, "Attempting to call a method with incorrect number of arguments.")
+            return self.begin_lambda(method, num_args, obj)
+        if method.type() == 'func':
+            return [FUNC_METHOD, method.v, None, None, None, obj]
+        self.error(ErrorType.TYPE_ERROR, "Attempting to call a method in an object which is not a function.")
+
+    def bind(self, call, index, val, is_var, fresh):
+        name, is_ref = call[2][index]
+        if not (is_ref and is_var):
+            val = copy_value(val, fresh)
+        if call[0] == FUNCTION:
+            self.env.create(name, val)
+            call[3].append(val)
+        else:
+            self.env.bind(call[4], name, val)
+
+    def end_call(self, call):
+        kind, func, _, boxes, closure, obj = call
+        if kind == FUNCTION:
+            result = self.bodies[id(func)](*boxes)
+            self.env.pop()
+            return result
+        if kind == LAMBDA:
+            self.env.push_closure(closure)
+            if obj is not None:
+                self.env.create('this', obj)
+            result = self.bodies[id(func)]()
+            self.env.pop()
+            return result
+        # a plain function stored in a field is called with its own definition
+        # as the call node; that rare path runs on the closure compiler
+        if self.fallback is None:
+            self.fallback = ClosureCompiler(self.interpreter, self.functions)
+        return self.fallback.call_func_method(func, obj)
+
+    ############################# BUILT-INS
+
+    def print_text(self, val):
+        msg = val.v
+        if msg == True or msg == False:
+            msg = str(msg).lower()
+        return str(msg)
+
+    def builtin_print(self, *texts):
+        self.interpreter.output(''.join(texts))
+        return Value('nil', None)
+
+    def builtin_input(self, name, prompt):
+        if prompt is not None:
+            if prompt.t != 'string':
+                self.error(ErrorType.TYPE_ERROR, f"Invalid argument type provided for '{name}' function.")
+            self.interpreter.output(prompt.v)
+        if name == 'inputi':
+            return Value('int', int(self.interpreter.get_input()))
+        return Value('string', self.interpreter.get_input())
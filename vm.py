@@ -0,0 +1,461 @@
+import operator
+from intbase import ErrorType
+from runtime import Value, Lambda, Object, to_bool, to_int, copy_value
+from bytecode import *
+
+# kinds of calls whose arguments are being bound
+FUNCTION = 0
+LAMBDA = 1
+FUNC_METHOD = 2
+
+# what the quickened int instructions compute
+INT_ARITHMETIC = {
+    ADD_INT: operator.add, SUB_INT: operator.sub,
+    MUL_INT: operator.mul, DIV_INT: operator.floordiv,
+}
+INT_COMPARISON = {
+    EQ_INT: operator.eq, NE_INT: operator.ne, LT_INT: operator.lt,
+    LE_INT: operator.le, GT_INT: operator.gt, GE_INT: operator.ge,
+}
+
+
+def quicken(ops, pc, op, a, b):
+    # the first run of a generic arithmetic or comparison instruction
+    # rewrites it into its int form if both operands are ints, or else marks
+    # it to stay generic
+    if a.t == 'int' and b.t == 'int':
+        ops[pc - 2] = INT_OPS[op]
+    else:
+        ops[pc - 1] = 1
+
+
+class VM:
+    """
+    Stack-based virtual machine for the CodeObjects produced by
+    BytecodeCompiler. Function and lambda bodies are compiled the first time
+    they are called, then run by a single dispatch loop over their opcodes.
+    Calls don't recurse into the loop: the caller's state is saved on a list
+    of frames, so Brewin recursion is only limited by memory.
+    """
+
+    def __init__(self, interpreter, functions):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.functions = functions
+        self.compiler = BytecodeCompiler(functions, interpreter.captures, interpreter.short_circuit,
+                                         interpreter.unscoped)
+        self.code = {}  # id(func or lambda element) -> (element, CodeObject)
+
+    def run(self, main):
+        self.execute(self.code_for(main))
+
+    def code_for(self, func):
+        # the element is kept in the entry so its id can't be reused
+        entry = self.code.get(id(func))
+        if entry is None:
+            entry = (func, self.compiler.compile_function(func))
+            self.code[id(func)] = entry
+        return entry[1]
+
+    def error(self, error_type, description):
+        self.interpreter.error(error_type, description)
+
+    def get_function(self, func_name, num_args):
+        if func_name not in self.functions:
+            self.error(ErrorType.NAME_ERROR, f"Function {func_name} was not found.")
+        if num_args not in self.functions[func_name]:
+            self.error(ErrorType.NAME_ERROR, f"Function {func_name} taking {num_args} arguments was not found.")
+        return self.functions[func_name][num_args]
+
+    def begin_lambda(self, lambda_val, num_args, obj=None):
+        callee = self.code_for(lambda_val.v.func)
+        if len(callee.params) != num_args:
+            self.error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to lambda function.")
+        return (LAMBDA, callee, lambda_val.v.closure, obj)
+
+    def execute(self, code):
+        env = self.env
+        env_get = env.get
+        error = self.error
+        ops = code.code
+        consts = code.consts
+        names = code.names
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pending = []  # calls whose arguments are being bound, innermost last
+        frames = []   # suspended callers: (code, pc, stack, pending, scopes to pop on return, memo key)
+        memo = self.interpreter.memo
+        inline_args = None
+        pure = self.interpreter.pure
+        pc = 0
+
+        while True:
+            op = ops[pc]
+            arg = ops[pc + 1]
+            pc += 2
+
+            if op == LOAD_VAR:
+                name = names[arg]
+                val = env_get(name)
+                if val is None:
+                    error(ErrorType.NAME_ERROR, f"Variable {name} was not found.")
+                push(val)
+
+            elif op == LOAD_CONST:
+                push(consts[arg])
+
+            elif op == STORE_VAR:
+                val = pop()
+                env.set(names[arg], val.v, val.t)
+
+            elif op >= ADD_INT and op <= GE_INT:
+                b = pop()
+                a = pop()
+                if a.t != 'int' or b.t != 'int':
+                    # the guess was wrong: go back to the generic instruction
+                    # for good and run it on the same operands
+                    ops[pc - 2] = GENERIC_OPS[op]
+                    ops[pc - 1] = 1
+                    push(a)
+                    push(b)
+                    pc -= 2
+                    continue
+                if op <= DIV_INT:
+                    push(Value('int', INT_ARITHMETIC[op](a.v, b.v)))
+                else:
+                    push(Value('bool', INT_COMPARISON[op](a.v, b.v)))
+
+            elif op == ADD:
+                b = pop()
+                a = pop()
+                if not arg:
+                    quicken(ops, pc, op, a, b)
+                if a.t == 'string' and b.t == 'string':
+                    push(Value('string', a.v + b.v))
+                else:
+                    x = to_int(a.v)
+                    y = to_int(b.v)
+                    if x is None or y is None:
+                        error(ErrorType.TYPE_ERROR, f"Incompatible types for '+' operation.")
+                    push(Value('int', x + y))
+
+            elif op <= DIV and op >= SUB:
+                b = pop()
+                a = pop()
+                if not arg:
+                    quicken(ops, pc, op, a, b)
+                x = to_int(a.v)
+                y = to_int(b.v)
+                if x is None or y is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for '{OPSYMBOLS[op]}' operation.")
+                if op == SUB:
+                    push(Value('int', x - y))
+                elif op == MUL:
+                    push(Value('int', x * y))
+                else:
+                    push(Value('int', x // y))
+
+            elif op <= GE and op >= LT:
+                b = pop()
+                a = pop()
+                if not arg:
+                    quicken(ops, pc, op, a, b)
+                if a.t != 'int' or b.t != 'int':
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for '{OPSYMBOLS[op]}' operation.")
+                if op == LT:
+                    push(Value('bool', a.v < b.v))
+                elif op == LE:
+                    push(Value('bool', a.v <= b.v))
+                elif op == GT:
+                    push(Value('bool', a.v > b.v))
+                else:
+                    push(Value('bool', a.v >= b.v))
+
+            elif op == EQ or op == NE:
+                b = pop()
+                a = pop()
+                if not arg:
+                    quicken(ops, pc, op, a, b)
+                if a.t == b.t:
+                    result = a.v == b.v
+                else:
+                    x = to_bool(a.v)
+                    y = to_bool(b.v)
+                    result = x == y if x is not None and y is not None else False
+                push(Value('bool', result if op == EQ else not result))
+
+            elif op == AND or op == OR:
+                y = to_bool(pop().v)
+                x = to_bool(pop().v)
+                if x is None or y is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for {OPSYMBOLS[op]} operation.")
+                push(Value('bool', (x and y) if op == AND else (x or y)))
+
+            elif op == AND_JUMP or op == OR_JUMP:
+                x = to_bool(pop().v)
+                if x is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for {'&&' if op == AND_JUMP else '||'} operation.")
+                if x == (op == OR_JUMP):
+                    push(Value('bool', x))
+                    pc = arg
+
+            elif op == TO_BOOL:
+                y = to_bool(pop().v)
+                if y is None:
+                    error(ErrorType.TYPE_ERROR, f"Incompatible types for {OPSYMBOLS[arg]} operation.")
+                push(Value('bool', y))
+
+            elif op == IF_FALSE_JUMP or op == WHILE_FALSE_JUMP:
+                cond = to_bool(pop().v)
+                if cond is None:
+                    statement = 'if' if op == IF_FALSE_JUMP else 'while'
+                    error(ErrorType.TYPE_ERROR, f"Incorrect condition type for '{statement}' statement.")
+                if not cond:
+                    pc = arg
+
+            elif op == JUMP:
+                pc = arg
+
+            elif op == PUSH_SCOPE:
+                env.push()
+
+            elif op == POP_SCOPE:
+                env.pop()
+
+            elif op == CALL_BEGIN:
+                site = consts[arg]
+                obj = pop() if site.with_obj else None
+                alias = env_get(site.name)
+                func = None
+                if alias:
+                    if alias.t == 'func':
+                        func = self.get_function(alias.v.get('name'), len(alias.v.get('args')))
+                    elif alias.t == 'lambda':
+                        pending.append(self.begin_lambda(alias, site.num_args))
+                    else:
+                        error(ErrorType.TYPE_ERROR, f"Variable is not callable.")
+                else:
+                    overloads = site.overloads
+                    func = overloads.get(site.num_args) if overloads is not None else None
+                    if func is None:
+                        self.get_function(site.name, site.num_args)
+                if func is not None:
+                    callee = self.code_for(func)
+                    if len(callee.params) != site.num_args:
+                        error(ErrorType.TYPE_ERROR, f"Invalid number of arguments provided to function.")
+                    env.push()
+                    if obj is not None:
+                        env.create('this', obj)
+                    # a function call's last entry is the function if its
+                    # results can be memoized
+                    pending.append((FUNCTION, callee, None, func if obj is None and id(func) in pure else None))
+
+            elif op == BIND_ARG:
+                call = pending[-1]
+                name, is_ref = call[1].params[arg >> 2]
+                val = pop()
+                if not (is_ref and arg & 1):
+                    val = copy_value(val, arg & 2)
+                if call[2] is None:
+                    env.create(name, val)
+                else:
+                    env.bind(call[2], name, val)
+
+            elif op == CALL_END:
+                kind, callee, closure, obj = pending.pop()
+                key = None
+                if kind == FUNCTION and obj is not None:
+                    # obj is the pure function called, see CALL_BEGIN
+                    key = memo.key(obj, env.env[-1].values())
+                    result = memo.get(key) if key is not None else None
+                    if result is not None:
+                        env.pop()
+                        push(result)
+                        continue
+                frames.append((code, pc, stack, pending, 0 if kind == FUNC_METHOD else 1, key))
+                stack = []
+                if kind == LAMBDA:
+                    env.push_closure(closure)
+                    if obj is not None:
+                        env.create('this', obj)
+                elif kind == FUNC_METHOD:
+                    stack.append(obj)
+                    callee = self.compiler.compile_call_node(callee)
+                code = callee
+                ops = code.code
+                consts = code.consts
+                names = code.names
+                push = stack.append
+                pop = stack.pop
+                pending = []
+                pc = 0
+
+            elif op == POP_TOP:
+                pop()
+
+            elif op == RETURN_VALUE or op == RETURN_NIL or op == RETURN_TOP:
+                if op == RETURN_VALUE:
+                    result = copy_value(pop(), arg & 1)
+                    arg >>= 1
+                elif op == RETURN_NIL:
+                    result = Value('nil', None)
+                else:
+                    result = pop()
+                for _ in range(arg):
+                    env.pop()
+                if not frames:
+                    return result
+                code, pc, stack, pending, scopes, key = frames.pop()
+                if scopes:
+                    env.pop()
+                if key is not None:
+                    memo.put(key, result)
+                ops = code.code
+                consts = code.consts
+                names = code.names
+                push = stack.append
+                pop = stack.pop
+                push(result)
+
+            elif op == INLINE_ARGS:
+                # inlined bodies make no calls, so one set of arguments is
+                # live at a time
+                inline_args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+
+            elif op == LOAD_INLINE_ARG:
+                push(inline_args[arg])
+
+            elif op == LOAD_INLINE_FIELD:
+                index, cache = consts[arg]
+                obj = inline_args[index]
+                if obj.t != 'object':
+                    error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
+                field = cache.get(obj.v)
+                if field is None:
+                    error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
+                push(field)
+
+            elif op == COPY_VALUE:
+                push(copy_value(pop(), arg))
+
+            elif op == LOAD_INVARIANT:
+                cell = consts[arg]
+                if cell[0] is not None:
+                    push(cell[0])
+                    pc = cell[1]
+
+            elif op == STORE_INVARIANT:
+                consts[arg][0] = stack[-1]
+
+            elif op == RESET_INVARIANT:
+                consts[arg][0] = None
+
+            elif op == LOAD_FIELD:
+                obj_name, cache = consts[arg]
+                obj = env_get(obj_name)
+                if obj is None or obj.type() != 'object':
+                    error(ErrorType.TYPE_ERROR, "Attempting to access a field on a non-object.")
+                field = cache.get(obj.v)
+                if field is None:
+                    error(ErrorType.NAME_ERROR, "Attempting to access a field that does not exist.")
+                push(field)
+
+            elif op == FIELD_TARGET:
+                obj = env_get(names[arg])
+                if obj is None:
+                    error(ErrorType.NAME_ERROR, "Object not found.")
+                if obj.type() != 'object':
+                    error(ErrorType.TYPE_ERROR, "Attempting to assign a field to a non-object.")
+                push(obj)
+
+            elif op == STORE_FIELD:
+                val = pop()
+                obj = pop().v
+                field_name = names[arg]
+                if field_name == 'proto':
+                    if val.t == 'nil':
+                        continue
+                    if val.t != 'object':
+                        error(ErrorType.TYPE_ERROR, "Attempting to specify non-object as prototype.")
+                    obj.set_proto(val.v)
+                else:
+                    obj.set(field_name, val.t, val.v)
+
+            elif op == MCALL_BEGIN:
+                site = consts[arg]
+                obj = env_get(site.obj_name)
+                if obj is None:
+                    error(ErrorType.NAME_ERROR, "Object name not found.")
+                if obj.type() != 'object':
+                    error(ErrorType.TYPE_ERROR, "Attempting to call method from a non-object.")
+                method = site.cache.get(obj.v)
+                if method is None:
+                    error(ErrorType.NAME_ERROR, "Attempting to call a method that does not exist in an object.")
+                if method.type() == 'lambda':
+                    if site.num_args != len(method.v.func.get('args')):
+                        error(ErrorType.NAME_ERROR, "Attempting to call a method with incorrect number of arguments.")
+                    pending.append(self.begin_lambda(method, site.num_args, obj))
+                elif method.type() == 'func':
+                    # the call node is the function's own definition, so the
+                    # arguments at this site are never evaluated
+                    pending.append((FUNC_METHOD, method.v, None, obj))
+                    pc = site.call_end
+                else:
+                    error(ErrorType.TYPE_ERROR, "Attempting to call a method in an object which is not a function.")
+
+            elif op == LOAD_FUNC:
+                overloads = consts[arg]
+                if len(overloads) > 1:
+                    error(ErrorType.NAME_ERROR, "Cannot return or assign overloaded function name.")
+                push(Value('func', list(overloads.values())[0]))
+
+            elif op == MAKE_LAMBDA:
+                func, captures = consts[arg]
+                push(Value('lambda', Lambda(env.get_closure(captures), func)))
+
+            elif op == MAKE_OBJECT:
+                push(Value('object', Object()))
+
+            elif op == NEG:
+                val = pop()
+                if val.t != 'int':
+                    error(ErrorType.TYPE_ERROR, f"Non-integer value cannot be negated with '-'.")
+                push(Value('int', -1 * val.v))
+
+            elif op == NOT:
+                val = to_bool(pop().v)
+                if val is None:
+                    error(ErrorType.TYPE_ERROR, f"Non-integer or non-boolean value cannot be negated with '!'.")
+                push(Value('bool', not val))
+
+            elif op == PRINT_ARG:
+                msg = stack[-1].v
+                if msg == True or msg == False:
+                    msg = str(msg).lower()
+                stack[-1] = str(msg)
+
+            elif op == PRINT:
+                result = ''.join(stack[len(stack) - arg:])
+                del stack[len(stack) - arg:]
+                self.interpreter.output(result)
+                push(Value('nil', None))
+
+            elif op == INPUT:
+                name, has_prompt = consts[arg]
+                if has_prompt:
+                    prompt = pop()
+                    if prompt.t != 'string':
+                        error(ErrorType.TYPE_ERROR, f"Invalid argument type provided for '{name}' function.")
+                    self.interpreter.output(prompt.v)
+                if name == 'inputi':
+                    push(Value('int', int(self.interpreter.get_input())))
+                else:
+                    push(Value('string', self.interpreter.get_input()))
+
+            elif op == RAISE:
+                error(*consts[arg])
+
+            else:
+                raise RuntimeError(f"Unknown opcode {op} at {pc - 2} in {code.name}")